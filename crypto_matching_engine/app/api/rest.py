@@ -1,10 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse
 from typing import List, Dict, Any, Optional
 
 from app.core.matching_engine import MatchingEngine
-from app.models.order import Order, OrderSubmission, OrderResponse, OrderType, OrderSide
-from app.models.trade import Trade
-from app.models.market_data import BBO, OrderBookUpdate
+from app.core.sequencer import Sequencer
+from app.core.clock import monotonic_ns
+from app.core.id_generator import MAX_ID, is_valid_id
+from app.core.latency import LatencyRecorder, api_latency
+from app.core.profiler import MATCHING_THREAD, profiler
+from app.models.instrument import Instrument
+from app.models.order import Order, OrderSubmission, OrderResponse, OrderView, OrderType, OrderSide
+from app.models.trade import TradeView
+from app.models.market_data import BBO, BBOView, OrderBookUpdate, OrderBookView, QuoteView
 
 # Create FastAPI app
 app = FastAPI(
@@ -13,160 +20,319 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Create matching engine instance
-matching_engine = MatchingEngine()
+# Matching engine for this app when it is served on its own, with a sequencer running every call that
+# reads or changes its state. Both are created on first use, so importing the module starts no engine
+# or thread; main.py serves these routes with its own engine through dependency overrides.
+matching_engine: Optional[MatchingEngine] = None
+sequencer: Optional[Sequencer] = None
 
 
-# Dependency to get the matching engine
-def get_matching_engine():
+# Dependency to get the matching engine (async, so it runs on the event loop and creates a single engine)
+async def get_matching_engine():
+    global matching_engine
+    if matching_engine is None:
+        matching_engine = MatchingEngine()
     return matching_engine
 
 
-@app.post("/orders", response_model=OrderResponse)
-async def create_order(
-    order_submission: OrderSubmission,
-    engine: MatchingEngine = Depends(get_matching_engine)
-):
+# Dependency to get the sequencer
+async def get_sequencer():
+    global sequencer
+    if sequencer is None:
+        sequencer = Sequencer(await get_matching_engine())
+    return sequencer
+
+
+# Maximum number of orders accepted in one batch request
+MAX_BATCH_SIZE = 1000
+
+# Most trades returned by one recent trades request, including trades read from the database
+MAX_TRADES_LIMIT = 50000
+
+# Longest profiler run accepted, in seconds
+MAX_PROFILE_SECONDS = 600
+
+
+def _submission_to_order(order_submission: OrderSubmission, instrument: Instrument, order_id: int) -> Order:
     """
-    Submit a new order to the matching engine.
+    Validate an order submission and convert its decimal prices and quantities
+    to ticks and lots of its instrument. Raises ValueError if the submission is invalid.
     """
     # Validate price for limit orders
     if order_submission.order_type in [OrderType.LIMIT, OrderType.IOC, OrderType.FOK] and order_submission.price is None:
-        raise HTTPException(status_code=400, detail="Price is required for limit orders")
+        raise ValueError("Price is required for limit orders")
     
     # Validate stop price for stop orders
     if order_submission.order_type in [OrderType.STOP_LOSS, OrderType.STOP_LIMIT, OrderType.TAKE_PROFIT] and order_submission.stop_price is None:
-        raise HTTPException(status_code=400, detail="Stop price is required for stop orders")
+        raise ValueError("Stop price is required for stop orders")
     
     # Validate limit price for stop-limit orders
     if order_submission.order_type == OrderType.STOP_LIMIT and order_submission.limit_price is None:
-        raise HTTPException(status_code=400, detail="Limit price is required for stop-limit orders")
+        raise ValueError("Limit price is required for stop-limit orders")
     
-    # Create order object
-    order = Order(
+    # Convert decimal prices and quantities to ticks and lots
+    return Order(
+        order_id=order_id,
         symbol=order_submission.symbol,
         order_type=order_submission.order_type,
         side=order_submission.side,
-        quantity=order_submission.quantity,
-        price=order_submission.price,
-        stop_price=order_submission.stop_price,
-        limit_price=order_submission.limit_price
+        quantity=instrument.quantity_to_lots(order_submission.quantity),
+        price=instrument.price_to_ticks(order_submission.price) if order_submission.price is not None else None,
+        stop_price=instrument.price_to_ticks(order_submission.stop_price) if order_submission.stop_price is not None else None,
+        limit_price=instrument.price_to_ticks(order_submission.limit_price) if order_submission.limit_price is not None else None
     )
-    
-    # Process the order
-    trades, updated_order = engine.process_order(order)
-    
-    # Create response
+
+
+def _order_response(updated_order: Order, instrument: Instrument) -> OrderResponse:
+    """Build the submission response for a processed order."""
     if updated_order.status == "rejected":
         return OrderResponse(
-            order_id=updated_order.order_id,
+            order_id=str(updated_order.order_id),
             status="rejected",
             message="Order validation failed"
         )
     
-    # Return success response
-    message = f"Order processed successfully. Filled: {updated_order.filled_quantity}, Remaining: {updated_order.remaining_quantity}"
+    filled = instrument.lots_to_quantity(updated_order.filled_quantity)
+    remaining = instrument.lots_to_quantity(updated_order.remaining_quantity)
+    message = f"Order processed successfully. Filled: {filled}, Remaining: {remaining}"
     if updated_order.status == "pending_trigger":
-        message = f"Stop order accepted and waiting for trigger price: {updated_order.stop_price}"
+        message = f"Stop order accepted and waiting for trigger price: {instrument.ticks_to_price(updated_order.stop_price)}"
     
     return OrderResponse(
-        order_id=updated_order.order_id,
+        order_id=str(updated_order.order_id),
         status=updated_order.status,
         message=message
     )
 
 
+@app.post("/orders", response_model=OrderResponse)
+async def create_order(
+    order_submission: OrderSubmission,
+    engine: MatchingEngine = Depends(get_matching_engine),
+    sequencer: Sequencer = Depends(get_sequencer)
+):
+    """
+    Submit a new order to the matching engine.
+    """
+    start_ns = monotonic_ns()
+    # Engine state is only read through the sequencer; issuing an order ID is safe from any thread
+    instrument = await sequencer.submit("get_instrument", order_submission.symbol)
+    try:
+        order = _submission_to_order(order_submission, instrument, engine.next_order_id(order_submission.symbol))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stage_ns = api_latency.lap("rest.convert", order.symbol, start_ns)
+    
+    # Process the order
+    trades, updated_order = await sequencer.submit("process_order", order)
+    stage_ns = api_latency.lap("rest.engine", order.symbol, stage_ns)
+    
+    response = _order_response(updated_order, instrument)
+    api_latency.lap("rest.response", order.symbol, stage_ns)
+    api_latency.lap("rest.create_order", order.symbol, start_ns)
+    return response
+
+
+@app.post("/orders/batch", response_model=List[OrderResponse])
+async def create_orders(
+    order_submissions: List[OrderSubmission],
+    engine: MatchingEngine = Depends(get_matching_engine),
+    sequencer: Sequencer = Depends(get_sequencer)
+):
+    """
+    Submit a batch of orders, processed in sequence.
+    The whole batch is rejected if any submission is invalid.
+    """
+    if len(order_submissions) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size cannot exceed {MAX_BATCH_SIZE} orders")
+    
+    start_ns = monotonic_ns()
+    
+    # Validate every submission before processing any of them
+    instruments: Dict[str, Instrument] = {}
+    for order_submission in order_submissions:
+        if order_submission.symbol not in instruments:
+            instruments[order_submission.symbol] = await sequencer.submit("get_instrument", order_submission.symbol)
+    orders = []
+    for i, order_submission in enumerate(order_submissions):
+        try:
+            orders.append(_submission_to_order(order_submission, instruments[order_submission.symbol],
+                                               engine.next_order_id(order_submission.symbol)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Order {i}: {e}")
+    
+    stage_ns = api_latency.lap("rest.convert", "*", start_ns)
+    
+    # Process the batch
+    results = await sequencer.submit("process_orders", orders)
+    stage_ns = api_latency.lap("rest.engine", "*", stage_ns)
+    
+    responses = [_order_response(updated_order, instruments[updated_order.symbol]) for trades, updated_order in results]
+    api_latency.lap("rest.response", "*", stage_ns)
+    api_latency.lap("rest.create_orders", "*", start_ns)
+    return responses
+
+
+def _parse_order_id(order_id: str) -> int:
+    """Convert an order ID from its string form at the API to the engine's integer ID."""
+    # Anything that is not a Snowflake ID cannot name an order, and must not reach SQLite
+    if not (order_id.isascii() and order_id.isdigit() and len(order_id) <= len(str(MAX_ID))):
+        raise HTTPException(status_code=404, detail="Order not found")
+    parsed_id = int(order_id)
+    if not is_valid_id(parsed_id):
+        raise HTTPException(status_code=404, detail="Order not found")
+    return parsed_id
+
+
 @app.delete("/orders/{order_id}", response_model=OrderResponse)
 async def cancel_order(
     order_id: str,
-    engine: MatchingEngine = Depends(get_matching_engine)
+    sequencer: Sequencer = Depends(get_sequencer)
 ):
     """
     Cancel an existing order.
     """
-    canceled_order = engine.cancel_order(order_id)
+    start_ns = monotonic_ns()
+    canceled_order = await sequencer.submit("cancel_order", _parse_order_id(order_id))
     
     if not canceled_order:
         raise HTTPException(status_code=404, detail="Order not found")
+    api_latency.lap("rest.cancel_order", canceled_order.symbol, start_ns)
     
     return OrderResponse(
-        order_id=canceled_order.order_id,
+        order_id=str(canceled_order.order_id),
         status=canceled_order.status,
         message="Order canceled successfully"
     )
 
 
-@app.get("/orders/{order_id}", response_model=Order)
+@app.get("/orders/{order_id}", response_model=OrderView)
 async def get_order(
     order_id: str,
-    engine: MatchingEngine = Depends(get_matching_engine)
+    sequencer: Sequencer = Depends(get_sequencer)
 ):
     """
     Get details of an existing order.
     """
-    order = engine.get_order(order_id)
+    order = await sequencer.submit("get_order", _parse_order_id(order_id))
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    return order
+    return OrderView.from_order(order, await sequencer.submit("get_instrument", order.symbol))
 
 
-@app.get("/market-data/{symbol}/bbo", response_model=BBO)
+@app.get("/market-data/{symbol}/bbo", response_model=BBOView)
 async def get_bbo(
     symbol: str,
-    engine: MatchingEngine = Depends(get_matching_engine)
+    sequencer: Sequencer = Depends(get_sequencer)
 ):
     """
     Get the current Best Bid and Offer (BBO) for a symbol.
     """
-    bbo = engine.get_bbo(symbol)
+    bbo = await sequencer.submit("get_bbo", symbol)
     
     if not bbo:
         # If no BBO exists, create an empty one
         bbo = BBO(symbol=symbol)
     
-    return bbo
+    return BBOView.from_bbo(bbo, await sequencer.submit("get_instrument", symbol))
 
 
-@app.get("/market-data/{symbol}/order-book", response_model=OrderBookUpdate)
+@app.get("/market-data/{symbol}/order-book", response_model=OrderBookView)
 async def get_order_book(
     symbol: str,
     depth: int = 10,
-    engine: MatchingEngine = Depends(get_matching_engine)
+    sequencer: Sequencer = Depends(get_sequencer)
 ):
     """
     Get the current order book for a symbol.
     """
-    order_book = engine.get_order_book_snapshot(symbol, depth)
+    order_book = await sequencer.submit("get_order_book_snapshot", symbol, depth)
     
     if not order_book:
         # If no order book exists, create an empty one
         order_book = OrderBookUpdate(symbol=symbol)
     
-    return order_book
+    return OrderBookView.from_update(order_book, await sequencer.submit("get_instrument", symbol))
 
 
-@app.get("/market-data/{symbol}/trades", response_model=List[Trade])
+@app.get("/market-data/{symbol}/quote", response_model=QuoteView)
+async def get_quote(
+    symbol: str,
+    side: OrderSide,
+    quantity: float,
+    sequencer: Sequencer = Depends(get_sequencer)
+):
+    """
+    Estimate the average and worst fill price of a market order
+    of the given side and quantity, without executing it.
+    """
+    instrument = await sequencer.submit("get_instrument", symbol)
+    try:
+        lots = instrument.quantity_to_lots(quantity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    quote = await sequencer.submit("get_quote", symbol, side, lots)
+    return QuoteView.from_quote(symbol, side.value, lots, quote, instrument)
+
+
+@app.get("/market-data/{symbol}/trades", response_model=List[TradeView])
 async def get_trades(
     symbol: str,
-    limit: int = 100,
-    engine: MatchingEngine = Depends(get_matching_engine)
+    limit: int = Query(100, ge=1, le=MAX_TRADES_LIMIT),
+    include_history: bool = False,
+    sequencer: Sequencer = Depends(get_sequencer)
 ):
     """
     Get recent trades for a symbol.
+    Set include_history to read trades older than the in-memory history from the database.
+    """
+    trades = await sequencer.submit("get_recent_trades", symbol, limit, include_history)
+    instrument = await sequencer.submit("get_instrument", symbol)
+    return [TradeView.from_trade(trade, instrument) for trade in trades]
+
+
+@app.get("/instruments/{symbol}", response_model=Dict[str, Any])
+async def get_instrument(
+    symbol: str,
+    sequencer: Sequencer = Depends(get_sequencer)
+):
+    """
+    Get the tick and lot size for a symbol.
     """
-    trades = engine.get_recent_trades(symbol, limit)
-    return trades
+    instrument = await sequencer.submit("get_instrument", symbol)
+    return instrument.dict()
+
+
+@app.post("/instruments/{symbol}", response_model=Dict[str, Any])
+async def set_instrument(
+    symbol: str,
+    tick_size: str,
+    lot_size: str,
+    sequencer: Sequencer = Depends(get_sequencer)
+):
+    """
+    Set the tick and lot size for a symbol.
+    """
+    try:
+        instrument = await sequencer.submit("set_instrument", symbol, tick_size, lot_size)
+    except (ValueError, ArithmeticError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return instrument.dict()
+
+
 @app.get("/fee-schedules/{symbol}", response_model=Dict[str, Any])
 async def get_fee_schedule(
     symbol: str,
-    engine: MatchingEngine = Depends(get_matching_engine)
+    sequencer: Sequencer = Depends(get_sequencer)
 ):
     """
     Get the fee schedule for a symbol.
     """
-    return engine.get_fee_schedule(symbol)
+    return await sequencer.submit("get_fee_schedule", symbol)
 
 
 @app.post("/fee-schedules/{symbol}", response_model=Dict[str, Any])
@@ -174,7 +340,7 @@ async def set_fee_schedule(
     symbol: str,
     maker_rate: float,
     taker_rate: float,
-    engine: MatchingEngine = Depends(get_matching_engine)
+    sequencer: Sequencer = Depends(get_sequencer)
 ):
     """
     Set a custom fee schedule for a symbol.
@@ -182,15 +348,15 @@ async def set_fee_schedule(
     if maker_rate < 0 or taker_rate < 0:
         raise HTTPException(status_code=400, detail="Fee rates cannot be negative")
     
-    engine.set_fee_schedule(symbol, maker_rate, taker_rate)
-    return engine.get_fee_schedule(symbol)
+    await sequencer.submit("set_fee_schedule", symbol, maker_rate, taker_rate)
+    return await sequencer.submit("get_fee_schedule", symbol)
 
 
 @app.post("/fee-schedules/default", response_model=Dict[str, Any])
 async def set_default_fee_rates(
     maker_rate: float,
     taker_rate: float,
-    engine: MatchingEngine = Depends(get_matching_engine)
+    sequencer: Sequencer = Depends(get_sequencer)
 ):
     """
     Set the default fee rates.
@@ -198,5 +364,74 @@ async def set_default_fee_rates(
     if maker_rate < 0 or taker_rate < 0:
         raise HTTPException(status_code=400, detail="Fee rates cannot be negative")
     
-    engine.set_default_fee_rates(maker_rate, taker_rate)
+    await sequencer.submit("set_default_fee_rates", maker_rate, taker_rate)
     return {"maker_rate": maker_rate, "taker_rate": taker_rate}
+
+
+@app.get("/admin/latency", response_model=Dict[str, Any])
+async def get_latency(
+    sequencer: Sequencer = Depends(get_sequencer)
+):
+    """
+    Get latency percentiles in nanoseconds by stage and symbol, for the
+    matching engine's stages and the REST and WebSocket layers.
+    """
+    recorder = LatencyRecorder()
+    recorder.merge(await sequencer.submit("get_latency_histograms"))
+    recorder.merge(api_latency.histograms)
+    return recorder.summary()
+
+
+@app.post("/admin/profiler/start", response_model=Dict[str, Any])
+async def start_profiler(
+    seconds: float = 30,
+    interval_ms: float = 10,
+    thread: Optional[List[str]] = Query(None),
+    matching_only: bool = False
+):
+    """
+    Start sampling thread stacks every interval_ms milliseconds for the given
+    number of seconds. Pass thread names to sample only those threads, or
+    matching_only to sample only the thread that runs the matching engine.
+    """
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+    if interval_ms < 1:
+        raise HTTPException(status_code=400, detail="interval_ms must be at least 1")
+    
+    thread_names = set(thread or ())
+    if matching_only:
+        thread_names.add(MATCHING_THREAD)
+    try:
+        profiler.start(seconds, interval_ms / 1000, thread_names)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.status()
+
+
+@app.post("/admin/profiler/stop", response_model=Dict[str, Any])
+async def stop_profiler():
+    """
+    Stop the profiler before its run is up. Returns the samples by category
+    and thread and the most sampled functions.
+    """
+    profiler.stop()
+    return profiler.status()
+
+
+@app.get("/admin/profiler", response_model=Dict[str, Any])
+async def get_profiler_status():
+    """
+    Get the state of the current or last profiler run, with the samples by
+    category (matching, pydantic, logging, sqlite, idle, other) and thread.
+    """
+    return profiler.status()
+
+
+@app.get("/admin/profiler/collapsed", response_class=PlainTextResponse)
+async def get_collapsed_stacks():
+    """
+    Get the samples of the current or last profiler run as collapsed stacks,
+    one "thread;outer;...;inner count" line per stack, for flamegraph tools.
+    """
+    return PlainTextResponse(profiler.collapsed())
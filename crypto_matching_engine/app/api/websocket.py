@@ -1,12 +1,20 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Set, List, Any
+from collections import deque
+from typing import Deque, Dict, Set, List, Any, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 
 from app.core.matching_engine import MatchingEngine
-from app.models.market_data import BBO, OrderBookUpdate
-from app.models.trade import Trade
+from app.core.sequencer import Sequencer
+from app.core.clock import monotonic_ns
+from app.core.latency import api_latency
+from app.core.metrics import PrometheusText
+from app.core.order_book import LevelChange
+from app.core.publisher import BBO_EVENT, BOOK_EVENT, TRADES_EVENT, SNAPSHOT_EVENT, INSTRUMENT_EVENT, MarketDataPublisher
+from app.models.instrument import Instrument
+from app.models.market_data import BBO, BBOView, OrderBookUpdate, OrderBookView, OrderBookDeltaView
+from app.models.trade import Trade, TradeView
 
 # Configure logging
 logging.basicConfig(
@@ -16,21 +24,142 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class ClientConnection:
+    """
+    Outbound side of a client connection: a bounded queue of messages drained
+    by the client's own writer task, so a slow client only delays itself.
+
+    Up to max_queue broadcast messages are queued; replies to the client's
+    own requests are queued whatever the length. When the queue is full, a
+    conflatable message (the latest BBO of a symbol) replaces the one already
+    queued for its symbol instead of being added.
+    """
+    __slots__ = ("websocket", "channel", "max_queue", "queue", "size", "latest", "stale", "ready",
+                 "writer", "over_limit_since")
+
+    def __init__(self, websocket: WebSocket, channel: str, max_queue: int):
+        self.websocket = websocket
+        self.channel = channel
+        self.max_queue = max_queue
+        self.queue: Deque[list] = deque()  # [symbol, text, is broadcast] entries; text is None once discarded
+        self.size = 0  # Entries not discarded
+        self.latest: Dict[str, list] = {}  # Symbol -> its queued conflatable entry
+        self.stale: Set[str] = set()  # Symbols whose messages were dropped, to resend once the queue drains
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.over_limit_since: Optional[float] = None  # Loop time the queue first overflowed, until it drains
+
+    def push(self, text: str, symbol: Optional[str] = None, conflate: bool = False, broadcast: bool = True) -> bool:
+        """Queue a message. Returns False if the queue is full and it could not be conflated."""
+        if broadcast and self.size >= self.max_queue:
+            entry = self.latest.get(symbol) if conflate else None
+            if entry is None:
+                return False
+            entry[1] = text
+            return True
+        entry = [symbol, text, broadcast]
+        self.queue.append(entry)
+        self.size += 1
+        if conflate:
+            self.latest[symbol] = entry
+        self.ready.set()
+        return True
+
+    def pop(self) -> Optional[list]:
+        """Take the oldest queued entry, or None if the queue is empty."""
+        while self.queue:
+            entry = self.queue.popleft()
+            if entry[1] is None:
+                continue
+            self.size -= 1
+            if self.latest.get(entry[0]) is entry:
+                del self.latest[entry[0]]
+            return entry
+        return None
+
+    def discard(self, symbol: str) -> None:
+        """Drop the queued broadcast messages of a symbol."""
+        for entry in self.queue:
+            if entry[0] == symbol and entry[1] is not None and entry[2]:
+                entry[1] = None
+                self.size -= 1
+        self.latest.pop(symbol, None)
+
+
 class ConnectionManager:
     """
-    Manages WebSocket connections and broadcasts market data.
+    Manages WebSocket connections and pushes market data to them as it happens.
+
+    The engine publishes trades, BBO changes and order book changes on a
+    MarketDataPublisher at the end of each call that makes them. A background
+    task reads them in publication order and sends each update to the clients
+    subscribed to its symbol straight away, so idle symbols send nothing and
+    cost nothing. A channel can be conflated instead: its updates are merged
+    per symbol (the latest BBO, the combined level changes or all trades) and
+    sent at most once per conflation interval.
+
+    New bbo and order_book clients are sent the current state of each symbol,
+    which the engine publishes in order with its other events: the BBO, or a
+    full-depth order book snapshot tagged with its sequence number, after
+    which order book clients get order_book_delta messages.
+
+    Broadcasts only queue messages on each client's ClientConnection; the
+    client's writer task sends them. A client whose queue overflows loses the
+    queued messages of that symbol and is sent the symbol's latest state once
+    it catches up. Trades cannot be replayed, so a trades client that overflows
+    is disconnected, as is any client whose queue stays full for
+    slow_client_timeout seconds or whose send fails or takes longer than
+    send_timeout seconds (e.g. after the server's pings went unanswered).
     """
     
-    def __init__(self, matching_engine: MatchingEngine):
+    def __init__(
+        self,
+        matching_engine: MatchingEngine,
+        sequencer: Optional[Sequencer] = None,
+        publisher: Optional[MarketDataPublisher] = None,
+        conflation: Optional[Dict[str, float]] = None,
+        max_queue: int = 1000,
+        slow_client_timeout: float = 5.0,
+        send_timeout: float = 10.0
+    ):
         self.matching_engine = matching_engine
+        self.sequencer = sequencer  # Runs engine calls in order with matching, if set
+        if publisher is None:
+            publisher = MarketDataPublisher()
+            matching_engine.publisher = publisher
+        self.publisher = publisher
         self.active_connections: Dict[str, Set[WebSocket]] = {
             "bbo": set(),
             "order_book": set(),
             "trades": set()
         }
         self.symbol_subscriptions: Dict[WebSocket, Set[str]] = {}
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.max_queue = max_queue  # Broadcast messages queued per client
+        self.slow_client_timeout = slow_client_timeout
+        self.send_timeout = send_timeout
+        # Symbols each client has been sent the state of, with the sequence number
+        # of the order book it holds (0 for bbo clients)
+        self.synced: Dict[WebSocket, Dict[str, int]] = {}
+        self.snapshot_requests: Set[str] = set()  # Symbols whose snapshot has been requested from the engine
+        # Tick and lot sizes by symbol, kept up to date by the engine's instrument events
+        self.instruments: Dict[str, Instrument] = {}
+        # Conflated channels: seconds between sends, updates not sent yet by symbol, and when to send them
+        for channel in conflation or {}:
+            if channel not in self.active_connections:
+                raise ValueError(f"Unknown channel: {channel}")
+        self.conflation: Dict[str, float] = {channel: seconds for channel, seconds in (conflation or {}).items() if seconds > 0}
+        self.pending: Dict[str, Dict[str, Any]] = {channel: {} for channel in self.active_connections}
+        self.flush_deadlines: Dict[str, float] = {}
+        # Broadcast messages encoded, sent and dropped (failed sends) by channel
+        self.messages_encoded: Dict[str, int] = {channel: 0 for channel in self.active_connections}
+        self.messages_sent: Dict[str, int] = {channel: 0 for channel in self.active_connections}
+        self.messages_dropped: Dict[str, int] = {channel: 0 for channel in self.active_connections}
+        self.clients_dropped: Dict[str, int] = {"queue_full": 0, "slow": 0, "send_failed": 0}  # By reason
+        self._closing: Set[asyncio.Task] = set()
         self.running = False
         self.broadcast_task = None
+        self.queue: Optional[asyncio.Queue] = None
     
     async def connect(self, websocket: WebSocket, channel: str):
         """Connect a client to a specific channel."""
@@ -42,31 +171,75 @@ class ConnectionManager:
         
         self.active_connections[channel].add(websocket)
         self.symbol_subscriptions[websocket] = set()
-        
+        self.synced[websocket] = {}
+        client = self.clients[websocket] = ClientConnection(websocket, channel, self.max_queue)
+        client.writer = asyncio.create_task(self._write_loop(client))
         logger.info(f"Client connected to {channel} channel")
+        
+        # Start pushing updates, and have the engine publish the state of every symbol for the new client
+        await self.start_broadcasting()
+        if channel != "trades":
+            await self._query("publish_snapshots", None)
         return True
     
     async def disconnect(self, websocket: WebSocket):
         """Disconnect a client from all channels."""
+        if self._remove(websocket):
+            logger.info("Client disconnected")
+    
+    def _remove(self, websocket: WebSocket) -> bool:
+        """Forget a client and stop its writer task. Returns False if it was already gone."""
         for channel in self.active_connections:
             if websocket in self.active_connections[channel]:
                 self.active_connections[channel].remove(websocket)
         
         if websocket in self.symbol_subscriptions:
             del self.symbol_subscriptions[websocket]
+        self.synced.pop(websocket, None)
         
-        logger.info("Client disconnected")
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return False
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        return True
+    
+    def _drop_client(self, client: ClientConnection, reason: str):
+        """Disconnect a client the server gave up on, removing it from every channel at once."""
+        if not self._remove(client.websocket):
+            return
+        self.clients_dropped[reason] += 1
+        logger.warning(f"Dropped {client.channel} client ({reason}) with {client.size} messages queued")
+        
+        # Close in the background; a stalled client may never complete the close handshake
+        task = asyncio.create_task(self._close(client.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+    
+    async def _close(self, websocket: WebSocket):
+        """Close a dropped client's connection, giving up after send_timeout."""
+        try:
+            await asyncio.wait_for(websocket.close(code=1008, reason="Client too slow"), self.send_timeout)
+        except Exception:
+            pass
+    
+    def reply(self, websocket: WebSocket, message: Dict[str, Any]):
+        """Queue a reply to a client's request behind the messages already queued for it."""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.push(json.dumps(message), broadcast=False)
     
     async def subscribe(self, websocket: WebSocket, symbol: str):
         """Subscribe a client to a specific symbol."""
         if websocket in self.symbol_subscriptions:
             self.symbol_subscriptions[websocket].add(symbol)
-            await websocket.send_text(json.dumps({
+            self.reply(websocket, {
                 "type": "subscription",
                 "status": "success",
                 "symbol": symbol
-            }))
+            })
             logger.info(f"Client subscribed to {symbol}")
+            await self._resync(websocket, [symbol])
         else:
             await websocket.send_text(json.dumps({
                 "type": "subscription",
@@ -78,107 +251,313 @@ class ConnectionManager:
         """Unsubscribe a client from a specific symbol."""
         if websocket in self.symbol_subscriptions and symbol in self.symbol_subscriptions[websocket]:
             self.symbol_subscriptions[websocket].remove(symbol)
-            await websocket.send_text(json.dumps({
+            self.reply(websocket, {
                 "type": "unsubscription",
                 "status": "success",
                 "symbol": symbol
-            }))
+            })
             logger.info(f"Client unsubscribed from {symbol}")
+            # No subscriptions left means every symbol again
+            await self._resync(websocket, None if not self.symbol_subscriptions[websocket] else [])
+    
+    async def _resync(self, websocket: WebSocket, symbols: Optional[List[str]]):
+        """
+        After a subscription change, forget the symbols a client no longer gets
+        and request the state of the given symbols (all if None) for it.
+        """
+        synced = self.synced.get(websocket)
+        if synced is None:
+            return
+        for symbol in list(synced):
+            if not self._is_subscribed(websocket, symbol):
+                del synced[symbol]
+        if websocket not in self.active_connections["trades"] and (symbols is None or symbols):
+            await self._query("publish_snapshots", symbols)
+    
+    async def _query(self, method: str, *args) -> Any:
+        """Call an engine method, through the sequencer if there is one."""
+        if self.sequencer:
+            return await self.sequencer.submit(method, *args)
+        return getattr(self.matching_engine, method)(*args)
+    
+    async def _instrument(self, symbol: str) -> Instrument:
+        """
+        Get the instrument of a symbol. The engine publishes it before a symbol's
+        first update and whenever it changes; it is only asked for, through the
+        sequencer, if an event arrived without it, e.g. after broadcasting restarted.
+        """
+        instrument = self.instruments.get(symbol)
+        if instrument is None:
+            instrument = self.instruments[symbol] = await self._query("get_instrument", symbol)
+        return instrument
+    
+    def _is_subscribed(self, websocket: WebSocket, symbol: str) -> bool:
+        """Check if a client gets updates for a symbol; no subscriptions means all symbols."""
+        subscriptions = self.symbol_subscriptions.get(websocket)
+        return subscriptions is not None and (not subscriptions or symbol in subscriptions)
+    
+    def _subscribers(self, channel: str, symbol: str) -> List[WebSocket]:
+        """Get the clients of a channel that get updates for a symbol."""
+        return [websocket for websocket in self.active_connections[channel] if self._is_subscribed(websocket, symbol)]
+    
+    def _encode(self, channel: str, message_type: str, data: Any) -> str:
+        """
+        Serialize a broadcast message. Each update is encoded once and the same
+        text sent to every client that gets it, so encoding work grows with
+        the number of updates rather than updates times clients.
+        """
+        self.messages_encoded[channel] += 1
+        return json.dumps({"type": message_type, "data": data})
+    
+    def _send(self, websocket: WebSocket, channel: str, text: str, symbol: str) -> bool:
+        """
+        Queue a broadcast message for a client. Returns False if the client's
+        queue had no room for it, in which case it is counted as dropped.
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return False
+        if client.push(text, symbol, conflate=channel == "bbo"):
+            if client.stale:
+                client.stale.discard(symbol)
+            return True
+        self.messages_dropped[channel] += 1
+        self._overflow(client, symbol)
+        return False
+    
+    def _overflow(self, client: ClientConnection, symbol: str):
+        """
+        Handle a message that did not fit in a client's queue. A trades client is
+        disconnected, since the trades it would miss cannot be sent again. A bbo or
+        order_book client drops the symbol's queued messages, which a later
+        snapshot replaces, unless its queue has been full for too long.
+        """
+        if client.channel == "trades":
+            self._drop_client(client, "queue_full")
+            return
+        now = asyncio.get_running_loop().time()
+        if client.over_limit_since is None:
+            client.over_limit_since = now
+        elif now - client.over_limit_since >= self.slow_client_timeout:
+            self._drop_client(client, "slow")
+            return
+        client.discard(symbol)
+        client.stale.add(symbol)
+        synced = self.synced.get(client.websocket)
+        if synced is not None:
+            synced.pop(symbol, None)
+    
+    async def _write_loop(self, client: ClientConnection):
+        """
+        A client's writer task: send its queued messages in order, and once the
+        queue is empty, request the latest state of the symbols it fell behind on.
+        """
+        try:
+            while True:
+                entry = client.pop()
+                if entry is None:
+                    if client.stale:
+                        symbols = sorted(client.stale)
+                        client.stale.clear()
+                        await self._query("publish_snapshots", symbols)
+                        continue
+                    client.ready.clear()
+                    await client.ready.wait()
+                    continue
+                
+                await asyncio.wait_for(client.websocket.send_text(entry[1]), self.send_timeout)
+                if entry[2]:
+                    self.messages_sent[client.channel] += 1
+                if client.over_limit_since is not None and client.size < client.max_queue:
+                    client.over_limit_since = None
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Error sending to {client.channel} client: {e!r}")
+            self._drop_client(client, "send_failed")
     
-    async def broadcast_bbo(self):
-        """Broadcast BBO updates to subscribed clients."""
-        if not self.active_connections["bbo"]:
+    async def broadcast_bbo(self, bbo: BBO):
+        """Send a symbol's BBO to the clients subscribed to it."""
+        clients = self._subscribers("bbo", bbo.symbol)
+        if not clients:
             return
+        start_ns = monotonic_ns()
         
-        # Get all symbols with active order books
-        symbols = list(self.matching_engine.order_books.keys())
+        # Convert to decimal prices and quantities for JSON serialization
+        instrument = await self._instrument(bbo.symbol)
+        text = self._encode("bbo", "bbo", BBOView.json_from_bbo(bbo, instrument))
         
-        for symbol in symbols:
-            bbo = self.matching_engine.get_bbo(symbol)
-            if not bbo:
-                continue
-            
-            # Convert to dict for JSON serialization
-            bbo_dict = bbo.dict()
-            message = {
-                "type": "bbo",
-                "data": bbo_dict
-            }
-            
-            # Send to all clients subscribed to this symbol
-            for websocket in list(self.active_connections["bbo"]):
-                if websocket in self.symbol_subscriptions and (
-                    not self.symbol_subscriptions[websocket] or  # No subscriptions means all symbols
-                    symbol in self.symbol_subscriptions[websocket]
-                ):
-                    try:
-                        await websocket.send_text(json.dumps(message))
-                    except Exception as e:
-                        logger.error(f"Error sending BBO update: {e}")
-                        # Will be removed on next receive error
-    
-    async def broadcast_order_book(self):
-        """Broadcast order book updates to subscribed clients."""
-        if not self.active_connections["order_book"]:
+        for websocket in clients:
+            synced = self.synced.get(websocket)
+            if self._send(websocket, "bbo", text, bbo.symbol) and synced is not None:
+                synced[bbo.symbol] = 0
+        api_latency.lap("ws.bbo", bbo.symbol, start_ns)
+    
+    async def broadcast_order_book(self, symbol: str, changes: List[LevelChange]):
+        """
+        Send price level changes to the clients subscribed to a symbol, as an
+        order_book_delta on top of the snapshot or delta each client got last,
+        with the new quantity of each level that changed. The message is built
+        once for all clients at the same sequence number. Clients with no
+        snapshot of the symbol yet, or that missed changes, get a snapshot
+        instead, requested from the engine.
+        """
+        clients = self._subscribers("order_book", symbol)
+        if not clients or not changes:
             return
+        start_ns = monotonic_ns()
         
-        # Get all symbols with active order books
-        symbols = list(self.matching_engine.order_books.keys())
-        
-        for symbol in symbols:
-            order_book = self.matching_engine.get_order_book_snapshot(symbol)
-            if not order_book:
+        instrument = await self._instrument(symbol)
+        first_sequence, last_sequence = changes[0][0], changes[-1][0]
+        texts: Dict[int, str] = {}  # Client's sequence number -> delta message
+        needs_snapshot = False
+        for websocket in clients:
+            synced = self.synced.get(websocket)
+            if synced is None:
                 continue
+            sequence = synced.get(symbol)
+            if sequence is None or sequence < first_sequence - 1:
+                synced.pop(symbol, None)
+                # Clients that overflowed ask for the snapshot themselves once they catch up
+                needs_snapshot = needs_snapshot or symbol not in self.clients[websocket].stale
+                continue
+            if sequence >= last_sequence:
+                continue  # Its snapshot already has these changes
             
-            # Convert to dict for JSON serialization
-            order_book_dict = order_book.dict()
-            message = {
-                "type": "order_book",
-                "data": order_book_dict
-            }
-            
-            # Send to all clients subscribed to this symbol
-            for websocket in list(self.active_connections["order_book"]):
-                if websocket in self.symbol_subscriptions and (
-                    not self.symbol_subscriptions[websocket] or  # No subscriptions means all symbols
-                    symbol in self.symbol_subscriptions[websocket]
-                ):
-                    try:
-                        await websocket.send_text(json.dumps(message))
-                    except Exception as e:
-                        logger.error(f"Error sending order book update: {e}")
-                        # Will be removed on next receive error
+            text = texts.get(sequence)
+            if text is None:
+                delta = OrderBookDeltaView.json_from_changes(
+                    symbol, sequence, [change for change in changes if change[0] > sequence], instrument)
+                text = texts[sequence] = self._encode("order_book", "order_book_delta", delta)
+            if self._send(websocket, "order_book", text, symbol):
+                synced[symbol] = last_sequence
+        
+        if needs_snapshot and symbol not in self.snapshot_requests:
+            self.snapshot_requests.add(symbol)
+            await self._query("publish_snapshots", [symbol])
+        api_latency.lap("ws.order_book", symbol, start_ns)
     
     async def broadcast_trades(self, trades: List[Trade], symbol: str):
         """Broadcast trade updates to subscribed clients."""
-        if not self.active_connections["trades"] or not trades:
+        clients = self._subscribers("trades", symbol)
+        if not clients or not trades:
             return
         
-        # Convert trades to dict for JSON serialization
-        trades_dict = [trade.dict() for trade in trades]
-        message = {
-            "type": "trades",
-            "data": trades_dict
-        }
+        start_ns = monotonic_ns()
+        
+        # Convert to decimal prices and quantities for JSON serialization
+        instrument = await self._instrument(symbol)
+        text = self._encode("trades", "trades", [TradeView.json_from_trade(trade, instrument) for trade in trades])
         
         # Send to all clients subscribed to this symbol
-        for websocket in list(self.active_connections["trades"]):
-            if websocket in self.symbol_subscriptions and (
-                not self.symbol_subscriptions[websocket] or  # No subscriptions means all symbols
-                symbol in self.symbol_subscriptions[websocket]
-            ):
-                try:
-                    await websocket.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error sending trade update: {e}")
-                    # Will be removed on next receive error
+        for websocket in clients:
+            self._send(websocket, "trades", text, symbol)
+        api_latency.lap("ws.trades", symbol, start_ns)
+    
+    async def send_snapshot(self, symbol: str, bbo: BBO, snapshot: OrderBookUpdate):
+        """
+        Send the state of a symbol to the clients that need it: the BBO to bbo
+        clients that have none yet, and the full order book to order_book
+        clients whose book is not at the snapshot's sequence number.
+        """
+        self.snapshot_requests.discard(symbol)
+        start_ns = monotonic_ns()
+        instrument = await self._instrument(symbol)
+        
+        text = None
+        for websocket in self._subscribers("bbo", symbol):
+            synced = self.synced.get(websocket)
+            if synced is not None and symbol not in synced:
+                if text is None:
+                    text = self._encode("bbo", "bbo", BBOView.json_from_bbo(bbo, instrument))
+                if self._send(websocket, "bbo", text, symbol):
+                    synced[symbol] = 0
+        
+        text = None
+        for websocket in self._subscribers("order_book", symbol):
+            synced = self.synced.get(websocket)
+            if synced is not None and synced.get(symbol) != snapshot.sequence:
+                if text is None:
+                    text = self._encode("order_book", "order_book", OrderBookView.json_from_update(snapshot, instrument))
+                if self._send(websocket, "order_book", text, symbol):
+                    synced[symbol] = snapshot.sequence
+        api_latency.lap("ws.snapshot", symbol, start_ns)
+    
+    async def _dispatch(self, kind: str, symbol: str, payload: Any):
+        """Send a published event, or add it to its channel's pending updates if the channel is conflated."""
+        if kind == SNAPSHOT_EVENT or kind == INSTRUMENT_EVENT:
+            # Updates held back for the symbol go first, so clients see them in order and in the old units
+            for channel in self.conflation:
+                if symbol in self.pending[channel]:
+                    await self._send_update(channel, symbol, self.pending[channel].pop(symbol))
+            if kind == INSTRUMENT_EVENT:
+                self.instruments[symbol] = payload
+            else:
+                await self.send_snapshot(symbol, *payload)
+            return
+        
+        if not self.active_connections[kind]:
+            return
+        if kind not in self.conflation:
+            await self._send_update(kind, symbol, payload)
+            return
+        
+        pending = self.pending[kind]
+        if kind == BBO_EVENT:
+            pending[symbol] = payload
+        elif symbol in pending:
+            pending[symbol].extend(payload)
+        else:
+            pending[symbol] = list(payload)
+        if kind not in self.flush_deadlines:
+            self.flush_deadlines[kind] = asyncio.get_running_loop().time() + self.conflation[kind]
+    
+    async def _send_update(self, channel: str, symbol: str, payload: Any):
+        """Send an update of one of the channels."""
+        if channel == BBO_EVENT:
+            await self.broadcast_bbo(payload)
+        elif channel == BOOK_EVENT:
+            await self.broadcast_order_book(symbol, payload)
+        elif channel == TRADES_EVENT:
+            await self.broadcast_trades(payload, symbol)
+    
+    async def _flush_due(self, now: float):
+        """Send the pending updates of conflated channels whose interval is up."""
+        for channel, deadline in list(self.flush_deadlines.items()):
+            if deadline <= now:
+                del self.flush_deadlines[channel]
+                pending, self.pending[channel] = self.pending[channel], {}
+                for symbol, payload in pending.items():
+                    await self._send_update(channel, symbol, payload)
+    
+    def write_metrics(self, text: PrometheusText):
+        """Add connection and message counts by channel to a scrape response."""
+        text.metric("websocket_connections", "gauge", "Connected WebSocket clients, by channel.",
+                    (({"channel": channel}, len(connections)) for channel, connections in self.active_connections.items()))
+        text.metric("websocket_messages_encoded_total", "counter",
+                    "Broadcast messages serialized, by channel; each is sent to every client that gets it.",
+                    (({"channel": channel}, count) for channel, count in self.messages_encoded.items()))
+        text.metric("websocket_messages_sent_total", "counter", "Broadcast messages sent, by channel.",
+                    (({"channel": channel}, count) for channel, count in self.messages_sent.items()))
+        text.metric("websocket_messages_dropped_total", "counter",
+                    "Broadcast messages dropped because a client's send queue was full, by channel.",
+                    (({"channel": channel}, count) for channel, count in self.messages_dropped.items()))
+        queued = {channel: 0 for channel in self.active_connections}
+        for client in self.clients.values():
+            queued[client.channel] += client.size
+        text.metric("websocket_send_queue_messages", "gauge", "Messages waiting in client send queues, by channel.",
+                    (({"channel": channel}, count) for channel, count in queued.items()))
+        text.metric("websocket_clients_dropped_total", "counter",
+                    "Clients disconnected by the server, by reason (queue_full, slow or send_failed).",
+                    (({"reason": reason}, count) for reason, count in self.clients_dropped.items()))
     
     async def start_broadcasting(self):
-        """Start the background broadcasting task."""
+        """Start receiving the engine's market data events and the task that sends them."""
         if self.running:
             return
         
         self.running = True
+        self.queue = self.publisher.attach(asyncio.get_running_loop())
         self.broadcast_task = asyncio.create_task(self._broadcast_loop())
         logger.info("Started broadcasting market data")
     
@@ -188,6 +567,7 @@ class ConnectionManager:
             return
         
         self.running = False
+        self.publisher.detach()
         if self.broadcast_task:
             self.broadcast_task.cancel()
             try:
@@ -195,21 +575,51 @@ class ConnectionManager:
             except asyncio.CancelledError:
                 pass
             self.broadcast_task = None
+        for pending in self.pending.values():
+            pending.clear()
+        self.flush_deadlines.clear()
+        # Instrument events still queued are dropped with the queue; look them up again after a restart
+        self.instruments.clear()
         
         logger.info("Stopped broadcasting market data")
     
     async def _broadcast_loop(self):
-        """Background task to periodically broadcast market data."""
+        """
+        Background task that sends the engine's market data events as they
+        arrive, and the pending updates of conflated channels when they are due.
+        """
+        loop = asyncio.get_running_loop()
+        queue = self.queue
         try:
             while self.running:
-                await self.broadcast_bbo()
-                await self.broadcast_order_book()
-                await asyncio.sleep(1)  # Broadcast every second
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    if self.flush_deadlines:
+                        timeout = max(0.0, min(self.flush_deadlines.values()) - loop.time())
+                        try:
+                            item = await asyncio.wait_for(queue.get(), timeout)
+                        except asyncio.TimeoutError:
+                            item = None
+                    else:
+                        item = await queue.get()
+                
+                if item is not None:
+                    published_ns, events = item
+                    api_latency.record("ws.publish_delay", "*", monotonic_ns() - published_ns)
+                    for kind, symbol, payload in events:
+                        try:
+                            await self._dispatch(kind, symbol, payload)
+                        except Exception as e:
+                            logger.error(f"Error broadcasting {kind} update for {symbol}: {e}")
+                if self.flush_deadlines:
+                    await self._flush_due(loop.time())
         except asyncio.CancelledError:
             logger.info("Broadcast loop cancelled")
         except Exception as e:
             logger.error(f"Error in broadcast loop: {e}")
             self.running = False
+            self.publisher.detach()
 
 
 async def handle_websocket(
@@ -224,10 +634,6 @@ async def handle_websocket(
         return
     
     try:
-        # Start broadcasting if not already running
-        if not connection_manager.running:
-            await connection_manager.start_broadcasting()
-        
         # Handle client messages
         while True:
             data = await websocket.receive_text()
@@ -241,28 +647,28 @@ async def handle_websocket(
                     elif message["action"] == "unsubscribe" and "symbol" in message:
                         await connection_manager.unsubscribe(websocket, message["symbol"])
                     else:
-                        await websocket.send_text(json.dumps({
+                        connection_manager.reply(websocket, {
                             "type": "error",
                             "message": "Invalid action or missing symbol"
-                        }))
+                        })
                 else:
-                    await websocket.send_text(json.dumps({
+                    connection_manager.reply(websocket, {
                         "type": "error",
                         "message": "Invalid message format"
-                    }))
+                    })
             
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+                connection_manager.reply(websocket, {
                     "type": "error",
                     "message": "Invalid JSON"
-                }))
+                })
             
             except Exception as e:
                 logger.error(f"Error handling message: {e}")
-                await websocket.send_text(json.dumps({
+                connection_manager.reply(websocket, {
                     "type": "error",
                     "message": "Internal server error"
-                }))
+                })
     
     except WebSocketDisconnect:
         await connection_manager.disconnect(websocket)
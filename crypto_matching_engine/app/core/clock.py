@@ -0,0 +1,17 @@
+import time
+from datetime import datetime, timedelta
+
+# Engine timestamps are integer nanoseconds since the Unix epoch (UTC)
+now_ns = time.time_ns
+
+# Monotonic clock for latencies and ages, unaffected by wall clock adjustments
+monotonic_ns = time.monotonic_ns
+
+NANOS_PER_SECOND = 1_000_000_000
+
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def ns_to_datetime(timestamp_ns: int) -> datetime:
+    """Convert a nanosecond timestamp to a naive UTC datetime (microsecond precision) for the API."""
+    return _UNIX_EPOCH + timedelta(microseconds=timestamp_ns // 1000)
@@ -0,0 +1,142 @@
+from typing import Callable, Iterator, List, Optional, Tuple
+import logging
+from sortedcontainers import SortedList
+
+from app.models.order import OrderBookEntry
+from app.core.order_book import OrderBook
+from app.core.id_generator import SnowflakeIdGenerator
+
+logger = logging.getLogger(__name__)
+
+
+class PriceLadder(dict):
+    """
+    Price level map for one side of a dense order book.
+
+    Levels are stored in a dict keyed by price, like SortedDict, so lookups run
+    at C speed. Ordering comes from a preallocated byte array indexed by tick
+    offset from a base price: the next best level is found with a C-level scan
+    instead of a key function call per comparison. The window always holds the
+    best price; levels that fall behind it are kept in a small sorted overflow
+    list. When the market moves past the front of the window, the ladder
+    recenters on the new best.
+
+    Implements the subset of the SortedDict interface used by OrderBook, with
+    keys iterated best price first.
+    """
+
+    def __init__(self, is_bid: bool, size: int = 4096):
+        super().__init__()
+        if size < 2:
+            raise ValueError("Ladder size must be at least 2")
+        # Work in keys where lower is always better: -price for bids, price for asks
+        self._sign = -1 if is_bid else 1
+        self._size = size
+        self._occupied = bytearray(size)
+        self._base = 0  # Key stored in slot 0
+        self._best = -1  # Slot of the best level, -1 when the window is empty
+        # Keys of levels behind the window (best first)
+        self._overflow = SortedList()
+
+    def __setitem__(self, price: int, entry: OrderBookEntry) -> None:
+        if price not in self:
+            key = self._sign * price
+            slot = key - self._base
+            if self._best < 0:
+                # Empty window; keep it if the level lands in its front half
+                if not 0 <= slot < self._size // 2:
+                    self._recenter(key)
+                    slot = key - self._base
+            elif slot < 0:
+                # The market moved past the front of the window
+                self._recenter(key)
+                slot = key - self._base
+            elif slot >= self._size:
+                self._overflow.add(key)
+                dict.__setitem__(self, price, entry)
+                return
+
+            self._occupied[slot] = 1
+            if self._best < 0 or slot < self._best:
+                self._best = slot
+        dict.__setitem__(self, price, entry)
+
+    def __delitem__(self, price: int) -> None:
+        dict.__delitem__(self, price)
+        key = self._sign * price
+        slot = key - self._base
+        if not 0 <= slot < self._size:
+            self._overflow.remove(key)
+            return
+
+        self._occupied[slot] = 0
+        if slot == self._best:
+            self._best = self._occupied.find(1, slot)
+            if self._best < 0 and self._overflow:
+                # Window is empty; pull the levels behind it forward
+                self._recenter(self._overflow[0])
+
+    def __iter__(self) -> Iterator[int]:
+        sign = self._sign
+        base = self._base
+        occupied = self._occupied
+        slot = self._best
+        while slot >= 0:
+            yield sign * (base + slot)
+            slot = occupied.find(1, slot + 1)
+        for key in self._overflow:
+            yield sign * key
+
+    def keys(self) -> List[int]:
+        """Prices in priority order (best first)."""
+        return list(self)
+
+    def values(self) -> List[OrderBookEntry]:
+        """Price levels in priority order (best first)."""
+        return [self[price] for price in self]
+
+    def items(self) -> Iterator[Tuple[int, OrderBookEntry]]:
+        """Iterate (price, level) pairs in priority order (best first)."""
+        for price in self:
+            yield price, self[price]
+
+    def _recenter(self, best_key: int) -> None:
+        """
+        Move the window so that best_key sits near its front, leaving some room
+        for the market to improve. Levels that no longer fit move to overflow
+        and overflow levels that now fit move into the window.
+        """
+        keys = [self._sign * price for price in dict.keys(self)]
+        self._base = best_key - self._size // 4
+        self._occupied = bytearray(self._size)
+        self._best = -1
+        self._overflow = SortedList()
+
+        for key in keys:
+            slot = key - self._base
+            if slot < self._size:
+                self._occupied[slot] = 1
+                if self._best < 0 or slot < self._best:
+                    self._best = slot
+            else:
+                self._overflow.add(key)
+
+        logger.debug("Price ladder recentered at %s", self._sign * best_key)
+
+
+class DenseOrderBook(OrderBook):
+    """
+    Order book that keeps price levels in preallocated arrays indexed by tick
+    offset instead of sorted dictionaries. Suited to liquid pairs whose book
+    sits in a narrow band of ticks around the mid price.
+    """
+
+    def __init__(self, symbol: str, trade_history_size: int = 10000,
+                 id_generator: Optional[SnowflakeIdGenerator] = None,
+                 clock: Optional[Callable[[], int]] = None, ladder_size: int = 4096):
+        self.ladder_size = ladder_size
+        super().__init__(symbol, trade_history_size, id_generator, clock)
+
+    def _create_sides(self) -> Tuple[PriceLadder, PriceLadder]:
+        """Create the bid and ask price ladders."""
+        return PriceLadder(is_bid=True, size=self.ladder_size), PriceLadder(is_bid=False, size=self.ladder_size)
@@ -0,0 +1,132 @@
+from typing import Dict, Optional, Tuple
+
+
+class DepthIndex:
+    """
+    Cumulative depth index for one side of an order book.
+
+    A Fenwick (binary indexed) tree over prices in ticks holds the resting
+    quantity and notional (price * quantity) at each price, so the book can
+    answer "how much is available up to price P" and "what price does
+    consuming Q reach" in O(log P) instead of walking the price levels.
+
+    Tree nodes are stored sparsely in dicts, so memory follows the number of
+    occupied levels rather than the price range, and the tree doubles its
+    span when a higher price arrives.
+    """
+    __slots__ = ("is_bid", "total_quantity", "total_notional", "_quantity", "_notional", "_span")
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self.total_quantity = 0
+        self.total_notional = 0
+        self._quantity: Dict[int, int] = {}
+        self._notional: Dict[int, int] = {}
+        self._span = 1  # Power of two covering every indexed price
+
+    def update(self, price: int, quantity: int) -> None:
+        """Add (or with a negative quantity, remove) resting quantity at a price."""
+        if price > self._span:
+            self._grow(price)
+
+        notional = price * quantity
+        quantities = self._quantity
+        notionals = self._notional
+        span = self._span
+        i = price
+        while i <= span:
+            remaining = quantities.get(i, 0) + quantity
+            if remaining:
+                quantities[i] = remaining
+                notionals[i] = notionals.get(i, 0) + notional
+            else:
+                # Keep the dicts small as levels empty out
+                del quantities[i]
+                del notionals[i]
+            i += i & -i
+
+        self.total_quantity += quantity
+        self.total_notional += notional
+
+    def available(self, limit_price: Optional[int] = None) -> int:
+        """
+        Quantity resting at prices at or better than limit_price
+        (at or below it for asks, at or above it for bids).
+        """
+        if limit_price is None:
+            return self.total_quantity
+        if self.is_bid:
+            return self.total_quantity - self._prefix(limit_price - 1)[0]
+        return self._prefix(limit_price)[0]
+
+    def sweep(self, quantity: int) -> Tuple[int, int, Optional[int]]:
+        """
+        Simulate consuming quantity from the best price outward.
+        Returns (filled quantity, filled notional in ticks * lots, worst price reached).
+        The filled quantity is less than requested when the side is too thin.
+        """
+        if quantity <= 0 or self.total_quantity == 0:
+            return 0, 0, None
+
+        if quantity >= self.total_quantity:
+            # The whole side is consumed; the worst price is the far end
+            if self.is_bid:
+                worst_price = self._search(0, inclusive=True)[0] + 1
+            else:
+                worst_price = self._search(self.total_quantity, inclusive=False)[0] + 1
+            return self.total_quantity, self.total_notional, worst_price
+
+        if self.is_bid:
+            # Worst price P is the lowest price whose quantity at or above it covers the order
+            worst_price = self._search(self.total_quantity - quantity, inclusive=True)[0] + 1
+            below_quantity, below_notional = self._prefix(worst_price)
+            better_quantity = self.total_quantity - below_quantity
+            better_notional = self.total_notional - below_notional
+        else:
+            # Worst price P is the lowest price whose quantity at or below it covers the order
+            index, better_quantity, better_notional = self._search(quantity, inclusive=False)
+            worst_price = index + 1
+
+        notional = better_notional + (quantity - better_quantity) * worst_price
+        return quantity, notional, worst_price
+
+    def _prefix(self, price: int) -> Tuple[int, int]:
+        """Quantity and notional resting at prices up to and including price."""
+        quantities = self._quantity
+        notionals = self._notional
+        quantity = notional = 0
+        i = min(price, self._span)
+        while i > 0:
+            quantity += quantities.get(i, 0)
+            notional += notionals.get(i, 0)
+            i -= i & -i
+        return quantity, notional
+
+    def _search(self, target: int, inclusive: bool) -> Tuple[int, int, int]:
+        """
+        Find the highest price index whose prefix quantity is below target
+        (or at most target when inclusive), by binary lifting.
+        Returns (index, prefix quantity, prefix notional).
+        """
+        quantities = self._quantity
+        notionals = self._notional
+        index = quantity = notional = 0
+        step = self._span
+        while step:
+            node = index + step
+            node_quantity = quantities.get(node, 0)
+            if node <= self._span and (quantity + node_quantity < target or
+                                       (inclusive and quantity + node_quantity == target)):
+                index = node
+                quantity += node_quantity
+                notional += notionals.get(node, 0)
+            step >>= 1
+        return index, quantity, notional
+
+    def _grow(self, price: int) -> None:
+        """Double the span until it covers price; each new root covers everything below it."""
+        while self._span < price:
+            self._span *= 2
+            if self.total_quantity:
+                self._quantity[self._span] = self.total_quantity
+                self._notional[self._span] = self.total_notional
@@ -0,0 +1,140 @@
+from typing import Any, Dict, List, Tuple
+
+from app.core.clock import monotonic_ns
+
+# Log-linear buckets: exact below 64 ns, then 32 buckets per power of two (about 3% precision)
+SUB_BUCKET_BITS = 5
+MAX_VALUE_BITS = 40  # Values are clamped to 2**40 ns, about 18 minutes
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+BUCKET_COUNT = (MAX_VALUE_BITS - SUB_BUCKET_BITS + 1) << SUB_BUCKET_BITS
+
+# Percentiles reported by summaries
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of latencies in nanoseconds.
+
+    Values are counted in a fixed array of log-linear buckets, so recording is
+    one index calculation and one increment whatever the value, memory stays
+    constant, and histograms from different threads or processes can be merged
+    by adding their counts. Percentiles are reported as the upper bound of the
+    bucket they fall in.
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value_ns: int) -> None:
+        """Count one latency."""
+        if value_ns < 0:
+            value_ns = 0
+        elif value_ns > MAX_VALUE:
+            value_ns = MAX_VALUE
+        shift = value_ns.bit_length() - SUB_BUCKET_BITS - 1
+        if shift < 0:
+            shift = 0
+        self.counts[(shift << SUB_BUCKET_BITS) + (value_ns >> shift)] += 1
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Add another histogram's counts to this one."""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percentile: float) -> int:
+        """Get the latency below which the given percentage of values fall."""
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * percentile // 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(_bucket_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, int]:
+        """Count, mean, percentiles and maximum in nanoseconds."""
+        result = {"count": self.count, "mean_ns": self.total // self.count if self.count else 0}
+        for percentile in PERCENTILES:
+            result[f"p{percentile:g}_ns".replace(".", "")] = self.percentile(percentile)
+        result["max_ns"] = self.max
+        return result
+
+
+def _bucket_upper_bound(index: int) -> int:
+    """Get the largest value counted in a bucket."""
+    shift = max(0, (index >> SUB_BUCKET_BITS) - 1)
+    mantissa = index - (shift << SUB_BUCKET_BITS)
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyRecorder:
+    """
+    Latency histograms keyed by (stage, symbol), timed with the monotonic clock.
+    Stages that cover several symbols at once are recorded under the symbol "*".
+    Each recorder should be written by one thread.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+
+    def record(self, stage: str, symbol: str, value_ns: int) -> None:
+        """Count one latency for a stage and symbol."""
+        histogram = self.histograms.get((stage, symbol))
+        if histogram is None:
+            histogram = self.histograms[(stage, symbol)] = LatencyHistogram()
+        histogram.record(value_ns)
+
+    def lap(self, stage: str, symbol: str, start_ns: int) -> int:
+        """Record the time since start_ns for a stage and return the current time, to start the next stage."""
+        now = monotonic_ns()
+        self.record(stage, symbol, now - start_ns)
+        return now
+
+    def merge(self, histograms: Dict[Tuple[str, str], LatencyHistogram]) -> None:
+        """Add histograms, e.g. from another recorder, to this recorder's."""
+        for key, histogram in histograms.items():
+            if key not in self.histograms:
+                self.histograms[key] = LatencyHistogram()
+            self.histograms[key].merge(histogram)
+
+    def copy(self) -> Dict[Tuple[str, str], LatencyHistogram]:
+        """Copy the histograms, e.g. to send them to another thread or process."""
+        copied = LatencyRecorder()
+        copied.merge(self.histograms)
+        return copied.histograms
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Summaries by stage, then symbol."""
+        result: Dict[str, Dict[str, Any]] = {}
+        for stage, symbol in sorted(self.histograms):
+            result.setdefault(stage, {})[symbol] = self.histograms[(stage, symbol)].summary()
+        return result
+
+
+def format_summary(summary: Dict[str, Dict[str, Dict[str, int]]]) -> str:
+    """Format a recorder summary as a table, one line per stage and symbol, in microseconds."""
+    lines: List[str] = [f"{'stage':<24} {'symbol':<12} {'count':>10} {'p50':>10} {'p99':>10} {'p99.9':>10} {'max':>10}"]
+    for stage, symbols in summary.items():
+        for symbol, stats in symbols.items():
+            lines.append(
+                f"{stage:<24} {symbol:<12} {stats['count']:>10} {stats['p50_ns'] / 1000:>10.1f} "
+                f"{stats['p99_ns'] / 1000:>10.1f} {stats['p999_ns'] / 1000:>10.1f} {stats['max_ns'] / 1000:>10.1f}"
+            )
+    return "\n".join(lines)
+
+
+# Recorder for the REST and WebSocket layers, which run on the event loop
+api_latency = LatencyRecorder()
@@ -1,12 +1,22 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
 import logging
-from datetime import datetime
+from collections import OrderedDict, deque
+from itertools import islice
 
 from app.models.order import Order, OrderType, OrderSide, OrderStatus
 from app.models.trade import Trade
 from app.models.market_data import BBO, OrderBookUpdate
 from app.models.fee import FeeModel
-from app.core.order_book import OrderBook
+from app.models.instrument import Instrument, InstrumentRegistry, Number
+from app.core.order_book import OrderBook, LevelChange
+from app.core.dense_order_book import DenseOrderBook
+from app.core.trigger_index import TriggerIndex
+from app.core.id_generator import SnowflakeIdGenerator, default_id_generator
+from app.core.clock import NANOS_PER_SECOND, monotonic_ns, now_ns
+from app.core.latency import LatencyHistogram, LatencyRecorder
+from app.core.metrics import EngineMetrics
+from app.core.publisher import BBO_EVENT, BOOK_EVENT, TRADES_EVENT, SNAPSHOT_EVENT, INSTRUMENT_EVENT, MarketDataEvent
+from app.logging_setup import audit, audit_enabled
 
 # configuring logging
 logging.basicConfig(
@@ -15,99 +25,399 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Order book implementations selectable per symbol
+ORDER_BOOK_BACKENDS = {
+    "sorted": OrderBook,  # SortedDict price levels, any price range
+    "dense": DenseOrderBook,  # Array-backed price ladder for liquid pairs
+}
+
 
 class MatchingEngine:
     """
     Main matching engine that manages multiple order books for different trading pairs.
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        trade_history_size: int = 10000,
+        terminal_order_cache_size: int = 10000,
+        terminal_order_max_age: Optional[float] = None,
+        id_generator: Optional[SnowflakeIdGenerator] = None,
+        clock: Optional[Callable[[], int]] = None,
+        record_latency: bool = False
+    ):
         self.order_books: Dict[str, OrderBook] = {}
-        self.all_orders: Dict[str, Order] = {}
-        self.all_trades: List[Trade] = []
-        self.pending_trigger_orders: Dict[str, List[Order]] = {}  # Symbol -> List of pending trigger orders
+        self.id_generator = id_generator or default_id_generator  # Issues order and trade IDs
+        self.clock = clock or now_ns  # Timestamps in nanoseconds since the epoch
+        self.all_orders: Dict[int, Order] = {}  # Live orders (resting or pending trigger) by ID
+        # Recently finished orders (order ID -> (order, last access monotonic_ns)), least recently used first.
+        # Older ones are evicted and looked up in the database.
+        self.terminal_orders: "OrderedDict[int, Tuple[Order, float]]" = OrderedDict()
+        self.terminal_order_cache_size = terminal_order_cache_size
+        self.terminal_order_max_age = terminal_order_max_age  # seconds, None to evict by count only
+        self.trade_history_size = trade_history_size  # recent trades kept in memory per symbol
+        self.all_trades: Deque[Trade] = deque(maxlen=trade_history_size)  # most recent trades across symbols
+        self.pending_trigger_orders: Dict[str, TriggerIndex] = {}  # Symbol -> pending trigger orders by stop price
         self.fee_model = FeeModel()  # initializing the fee model
+        self.instruments = InstrumentRegistry()  # tick and lot sizes per symbol
+        self.default_order_book_backend = "sorted"
+        self.order_book_backends: Dict[str, str] = {}  # Symbol -> order book backend name
         self.persistence_manager = None  # will be set by main.py
+        # Per-stage latency histograms by symbol, if enabled
+        self.latency: Optional[LatencyRecorder] = LatencyRecorder() if record_latency else None
+        self.metrics = EngineMetrics()  # Order, cancel and trade counters for /metrics
+        self.publisher = None  # Market data publisher for the WebSocket feeds, set by main.py
+        # Book sequence number and BBO (bid price, bid quantity, ask price, ask quantity) last published per symbol
+        self.published_sequences: Dict[str, int] = {}
+        self.published_bbos: Dict[str, Tuple[Optional[int], ...]] = {}
+        # Instrument last published per symbol, so consumers convert ticks and lots without calling the engine
+        self.published_instruments: Dict[str, Instrument] = {}
         logger.info("Matching engine initialized")
     
-    def get_or_create_order_book(self, symbol: str) -> OrderBook:
-        """Get an existing order book or create a new one if it doesn't exist."""
+    def get_or_create_order_book(self, symbol: str, backend: Optional[str] = None) -> OrderBook:
+        """
+        Get an existing order book or create a new one if it doesn't exist.
+        New books use the given backend, the backend configured for the symbol,
+        or the default backend, in that order.
+        """
         if symbol not in self.order_books:
-            self.order_books[symbol] = OrderBook(symbol)
+            backend = backend or self.order_book_backends.get(symbol, self.default_order_book_backend)
+            if backend not in ORDER_BOOK_BACKENDS:
+                raise ValueError(f"Unknown order book backend: {backend}")
+            self.order_books[symbol] = ORDER_BOOK_BACKENDS[backend](
+                symbol, self.trade_history_size, self.id_generator, self.clock
+            )
+            # Symbols with a book keep their increments, so they are saved with the rest of the state
+            self.instruments.register_instrument(symbol)
+            logger.info(f"Created {backend} order book for {symbol}")
         return self.order_books[symbol]
     
+    def set_order_book_backend(self, symbol: str, backend: str) -> None:
+        """
+        Select the order book backend for a symbol.
+        Takes effect when the symbol's order book is created.
+        """
+        if backend not in ORDER_BOOK_BACKENDS:
+            raise ValueError(f"Unknown order book backend: {backend}")
+        if symbol in self.order_books and type(self.order_books[symbol]) is not ORDER_BOOK_BACKENDS[backend]:
+            raise ValueError(f"Order book for {symbol} already exists with a different backend")
+        self.order_book_backends[symbol] = backend
+    
+    def next_order_id(self, symbol: str) -> int:
+        """Issue the ID for a new order on a symbol. Safe to call from any thread, since the generator is locked."""
+        return self.id_generator.next_id()
+    
+    def get_symbols(self) -> List[str]:
+        """Get the symbols that have an order book."""
+        return list(self.order_books.keys())
+    
     def process_order(self, order: Order) -> Tuple[List[Trade], Order]:
         """
         Process a new order.
         Returns a list of trades executed and the updated order.
         """
-        # Validate order
-        if not self._validate_order(order):
-            order.status = OrderStatus.REJECTED
-            return [], order
-        
-        # Get the appropriate order book
-        order_book = self.get_or_create_order_book(order.symbol)
-        
-        # Handle stop and take-profit orders
-        if order.order_type in [OrderType.STOP_LOSS, OrderType.STOP_LIMIT, OrderType.TAKE_PROFIT]:
-            # Store the order in pending triggers
-            if order.symbol not in self.pending_trigger_orders:
-                self.pending_trigger_orders[order.symbol] = []
-            
-            self.pending_trigger_orders[order.symbol].append(order)
-            self.all_orders[order.order_id] = order
+        return self.process_orders([order])[0]
+    
+    def process_orders(self, orders: List[Order]) -> List[Tuple[List[Trade], Order]]:
+        """
+        Process a batch of orders in sequence.
+        BBO refresh, fee calculation, persistence and trigger evaluation run once
+        per batch instead of once per order, so pending trigger orders activated
+        by the batch's trades are processed after the whole batch. A trigger order
+        submitted in the batch is only checked against the trades after it, as if
+        the orders had been submitted one at a time.
+        With latency recording enabled, validation, matching, fees, persistence,
+        trigger handling and the journal commit are timed per symbol; stages run
+        once per batch are recorded under the symbol of a single-order batch, or "*".
+        Returns a (trades, updated order) pair for each order, in submission order.
+        """
+        latency = self.latency
+        if latency:
+            start_ns = monotonic_ns()
+            batch_symbol = orders[0].symbol if len(orders) == 1 else "*"
+        
+        # Journal the orders as submitted before processing them
+        if self.persistence_manager:
+            self.persistence_manager.record_order_commands(orders)
+        
+        results = []
+        touched_books: Dict[str, OrderBook] = {}
+        trades_by_symbol: Dict[str, List[Trade]] = {}
+        orders_to_save: List[Order] = []
+        # Trigger orders submitted in the batch, with the number of their symbol's trades before them
+        new_triggers: Dict[str, List[Tuple[int, Order]]] = {}
+        
+        for order in orders:
+            # Validate order
+            if latency:
+                stage_ns = monotonic_ns()
+            valid = self._validate_order(order)
+            if latency:
+                stage_ns = latency.lap("validate", order.symbol, stage_ns)
+            if not valid:
+                order.status = OrderStatus.REJECTED
+                results.append(([], order))
+                continue
             
-            logger.info(f"Added pending trigger order: {order.order_id} - {order.order_type} at {order.stop_price}")
+            # Get the appropriate order book
+            order_book = self.get_or_create_order_book(order.symbol)
             
-            # saving state if persistence manager is available
-            if self.persistence_manager:
-                self.persistence_manager.order_repository.save_order(order)
+            # Handle stop and take-profit orders
+            if order.order_type in [OrderType.STOP_LOSS, OrderType.STOP_LIMIT, OrderType.TAKE_PROFIT]:
+                # Store the order in pending triggers once the trades before it have been checked
+                position = len(trades_by_symbol.get(order.symbol, ()))
+                new_triggers.setdefault(order.symbol, []).append((position, order))
+                self.all_orders[order.order_id] = order
+                orders_to_save.append(order)
                 
-            return [], order
+                logger.debug("Added pending trigger order: %s - %s at %s", order.order_id, order.order_type, order.stop_price)
+                results.append(([], order))
+                if latency:
+                    latency.lap("match", order.symbol, stage_ns)
+                continue
+            
+            # Process regular order, deferring the BBO refresh to the end of the batch
+            trades, updated_order = order_book.add_order(order, update_bbo=False)
+            if latency:
+                latency.lap("match", order.symbol, stage_ns)
+            touched_books[order.symbol] = order_book
+            
+            if updated_order.status != OrderStatus.REJECTED:
+                self.all_orders[updated_order.order_id] = updated_order
+                orders_to_save.append(updated_order)
+            
+            if trades:
+                trades_by_symbol.setdefault(order.symbol, []).extend(trades)
+            
+            results.append((trades, updated_order))
+        
+        # Count the batch's orders by type and status
+        order_counts = self.metrics.orders
+        for _, order in results:
+            key = (order.order_type, order.status)
+            order_counts[key] = order_counts.get(key, 0) + 1
+        
+        # Refresh the BBO of each book the batch touched
+        for order_book in touched_books.values():
+            order_book._update_bbo()
+        
+        batch_trades = []
+        for symbol, trades in trades_by_symbol.items():
+            if latency:
+                stage_ns = monotonic_ns()
+            self._apply_fees(symbol, trades)
+            if latency:
+                latency.lap("fees", symbol, stage_ns)
+            batch_trades.extend(trades)
+        self.all_trades.extend(batch_trades)
+        
+        # save orders and trades in one transaction each if persistence manager is available
+        touched_orders = self._touched_orders(orders_to_save, batch_trades)
+        if self.persistence_manager:
+            if latency:
+                stage_ns = monotonic_ns()
+            self.persistence_manager.save_batch(touched_orders, batch_trades)
+            if latency:
+                latency.lap("persist", batch_symbol, stage_ns)
+        
+        # Write the batch to the audit log if one is configured
+        if audit_enabled():
+            for order in touched_orders:
+                audit("order", order)
+            for trade in batch_trades:
+                audit("trade", trade)
+        
+        # Move finished orders out of the live set
+        self._retire_finished_orders(touched_orders)
+        
+        # checking if any pending trigger orders should be activated
+        triggered_trades: Dict[str, List[Trade]] = {}
+        for symbol, trades in trades_by_symbol.items():
+            if latency:
+                stage_ns = monotonic_ns()
+            triggered = self._check_batch_triggers(symbol, trades, new_triggers.pop(symbol, []))
+            if triggered:
+                triggered_trades[symbol] = triggered
+            if latency:
+                latency.lap("triggers", symbol, stage_ns)
+        for symbol, new_orders in new_triggers.items():
+            index = self._trigger_index(symbol)
+            for _, order in new_orders:
+                index.add(order)
+        
+        # Commit the batch's journal records
+        if self.persistence_manager:
+            if latency:
+                stage_ns = monotonic_ns()
+            self.persistence_manager.commit()
+            if latency:
+                latency.lap("commit", batch_symbol, stage_ns)
         
-        # Process regular order
-        trades, updated_order = order_book.add_order(order)
+        # Publish the batch's trades and book changes to the market data feeds
+        if self.publisher is not None and self.publisher.active:
+            for symbol, trades in triggered_trades.items():
+                trades_by_symbol[symbol] = trades_by_symbol[symbol] + trades
+            self._publish_market_data(touched_books, trades_by_symbol)
         
-        if updated_order.status != OrderStatus.REJECTED:
-            self.all_orders[updated_order.order_id] = updated_order
+        if latency:
+            latency.lap("process", batch_symbol, start_ns)
+        return results
+    
+    def _publish_market_data(self, symbols: Iterable[str], trades_by_symbol: Dict[str, List[Trade]]) -> None:
+        """
+        Publish the trades of an engine call, then the price level changes and
+        BBO of each book it touched that changed since they were last published.
+        """
+        events: List[MarketDataEvent] = []
+        for symbol in symbols:
+            order_book = self.order_books.get(symbol)
+            if order_book is None:
+                continue
+            self._publish_instrument(symbol, events)
+            trades = trades_by_symbol.get(symbol)
+            if trades:
+                events.append((TRADES_EVENT, symbol, trades))
             
-            # save order if persistence manager is available
-            if self.persistence_manager:
-                self.persistence_manager.order_repository.save_order(updated_order)
+            published_sequence = self.published_sequences.get(symbol, 0)
+            if order_book.sequence != published_sequence:
+                # A book that restarted its sequence numbers, e.g. after a reload, counts as missed changes
+                changes = order_book.get_level_changes(published_sequence) \
+                    if order_book.sequence > published_sequence else None
+                if changes is None:
+                    # Too many changes to replay; consumers start again from the whole book
+                    events.append((SNAPSHOT_EVENT, symbol, (order_book.bbo.copy(),
+                                                            order_book.get_order_book_snapshot(None))))
+                else:
+                    events.append((BOOK_EVENT, symbol, changes))
+                self.published_sequences[symbol] = order_book.sequence
+            
+            bbo = order_book.bbo
+            top = (bbo.bid_price, bbo.bid_quantity, bbo.ask_price, bbo.ask_quantity)
+            if top != self.published_bbos.get(symbol):
+                self.published_bbos[symbol] = top
+                events.append((BBO_EVENT, symbol, bbo.copy()))
+        self.publisher.publish(events)
+    
+    def publish_snapshots(self, symbols: Optional[List[str]] = None) -> None:
+        """
+        Publish the BBO and full order book of the given symbols, or of every
+        symbol, in order with their other market data events, so that clients
+        that just subscribed can pick up the feed from there.
+        """
+        if self.publisher is None or not self.publisher.active:
+            return
+        events: List[MarketDataEvent] = []
+        for symbol in (self.order_books if symbols is None else symbols):
+            order_book = self.order_books.get(symbol)
+            if order_book is not None:
+                self._publish_instrument(symbol, events)
+                events.append((SNAPSHOT_EVENT, symbol, (order_book.bbo.copy(),
+                                                        order_book.get_order_book_snapshot(None))))
+        self.publisher.publish(events)
+    
+    def _publish_instrument(self, symbol: str, events: List[MarketDataEvent]) -> None:
+        """Add the symbol's instrument to a list of events if it was not published yet or has changed since."""
+        instrument = self.instruments.get_instrument(symbol)
+        # Instruments are replaced rather than changed, so a different object means a new tick or lot size
+        if self.published_instruments.get(symbol) is not instrument:
+            self.published_instruments[symbol] = instrument
+            events.append((INSTRUMENT_EVENT, symbol, instrument))
+    
+    def _apply_fees(self, symbol: str, trades: List[Trade]) -> None:
+        """Calculate and add maker and taker fees to trades of a symbol."""
+        instrument = self.instruments.get_instrument(symbol)
+        fee_schedule = self.fee_model.get_fee_schedule(symbol)
         
-        if trades:
-            for trade in trades:
-                trade_value = trade.price * trade.quantity
-                fee_schedule = self.fee_model.get_fee_schedule(order.symbol)
-                
-                # calculate fees
-                maker_fee = fee_schedule.calculate_maker_fee(trade_value)
-                taker_fee = fee_schedule.calculate_taker_fee(trade_value)
-                
-                # adding fees to the trade
-                trade.maker_fee = maker_fee
-                trade.taker_fee = taker_fee
-                trade.maker_fee_rate = fee_schedule.maker_rate
-                trade.taker_fee_rate = fee_schedule.taker_rate
-                
-                logger.info(f"Fees calculated for trade {trade.trade_id}: maker={maker_fee}, taker={taker_fee}")
-                
-                # Save trade if persistence manager is available
-                if self.persistence_manager:
-                    self.persistence_manager.trade_repository.save_trade(trade)
+        notional = 0.0
+        for trade in trades:
+            trade_value = instrument.notional(trade.price, trade.quantity)
+            notional += trade_value
+            
+            # calculate fees
+            maker_fee = fee_schedule.calculate_maker_fee(trade_value)
+            taker_fee = fee_schedule.calculate_taker_fee(trade_value)
             
-            self.all_trades.extend(trades)
-            # checking if any pending trigger orders should be activated
-            self._check_triggers(order.symbol, trades[-1].price)
+            # adding fees to the trade
+            trade.maker_fee = maker_fee
+            trade.taker_fee = taker_fee
+            trade.maker_fee_rate = fee_schedule.maker_rate
+            trade.taker_fee_rate = fee_schedule.taker_rate
+            
+            logger.debug("Fees calculated for trade %s: maker=%s, taker=%s", trade.trade_id, maker_fee, taker_fee)
+        
+        # Count the trades and their value
+        metrics = self.metrics
+        metrics.trades[symbol] = metrics.trades.get(symbol, 0) + len(trades)
+        metrics.notional[symbol] = metrics.notional.get(symbol, 0.0) + notional
+    
+    def _touched_orders(self, orders: List[Order], trades: List[Trade]) -> List[Order]:
+        """Get the orders of a batch together with the resting orders its trades filled against."""
+        orders_by_id = {order.order_id: order for order in orders}
+        for trade in trades:
+            maker_order = self.all_orders.get(trade.maker_order_id)
+            if maker_order is not None:
+                orders_by_id[maker_order.order_id] = maker_order
+        return list(orders_by_id.values())
+    
+    def _is_live(self, order: Order) -> bool:
+        """Check if an order is still resting in its book or waiting for its trigger."""
+        if order.status == OrderStatus.PENDING_TRIGGER:
+            return True
+        order_book = self.order_books.get(order.symbol)
+        return order_book is not None and order_book.get_order(order.order_id) is not None
+    
+    def _retire_finished_orders(self, orders: List[Order]) -> None:
+        """Move orders that are no longer live to the terminal order cache."""
+        for order in orders:
+            if not self._is_live(order):
+                self._retire_order(order)
+    
+    def _retire_order(self, order: Order) -> None:
+        """Move an order to the most recently used end of the terminal order cache."""
+        self.all_orders.pop(order.order_id, None)
+        self.terminal_orders[order.order_id] = (order, monotonic_ns())
+        self.terminal_orders.move_to_end(order.order_id)
+        self._evict_terminal_orders()
+    
+    def _evict_terminal_orders(self) -> None:
+        """Evict the least recently used terminal orders beyond the cache size or age."""
+        while len(self.terminal_orders) > self.terminal_order_cache_size:
+            self.terminal_orders.popitem(last=False)
         
-        return trades, updated_order
+        if self.terminal_order_max_age is not None:
+            cutoff = monotonic_ns() - int(self.terminal_order_max_age * NANOS_PER_SECOND)
+            while self.terminal_orders and next(iter(self.terminal_orders.values()))[1] < cutoff:
+                self.terminal_orders.popitem(last=False)
     
-    def cancel_order(self, order_id: str) -> Optional[Order]:
+    def cancel_order(self, order_id: int) -> Optional[Order]:
         """
         Cancel an order by ID.
         Returns the canceled order or None if not found.
         """
+        if self.latency:
+            start_ns = monotonic_ns()
+        
+        # Journal the cancel request before processing it
+        if self.persistence_manager:
+            self.persistence_manager.record_cancel_command(order_id)
+        
+        canceled_order = self._cancel_order(order_id)
+        
+        if self.persistence_manager:
+            self.persistence_manager.commit()
+        
+        result = "canceled" if canceled_order else "not_found"
+        self.metrics.cancels[result] = self.metrics.cancels.get(result, 0) + 1
+        
+        if canceled_order and self.publisher is not None and self.publisher.active:
+            self._publish_market_data([canceled_order.symbol], {})
+        
+        if self.latency:
+            self.latency.lap("cancel", canceled_order.symbol if canceled_order else "*", start_ns)
+        return canceled_order
+    
+    def _cancel_order(self, order_id: int) -> Optional[Order]:
+        """Cancel a live order, saving its new status."""
         if order_id not in self.all_orders:
             return None
         
@@ -116,19 +426,21 @@ class MatchingEngine:
         # check if it's a pending trigger order
         if order.status == OrderStatus.PENDING_TRIGGER:
             if order.symbol in self.pending_trigger_orders:
-                # find and remove from pending trigger orders
-                for i, pending_order in enumerate(self.pending_trigger_orders[order.symbol]):
-                    if pending_order.order_id == order_id:
-                        removed_order = self.pending_trigger_orders[order.symbol].pop(i)
-                        removed_order.status = OrderStatus.CANCELED
-                        self.all_orders[order_id] = removed_order
+                # remove from pending trigger orders
+                removed_order = self.pending_trigger_orders[order.symbol].remove(order_id)
+                if removed_order:
+                    removed_order.status = OrderStatus.CANCELED
+                    self._retire_order(removed_order)
+                    
+                    # updating order in database if persistence manager is available
+                    if self.persistence_manager:
+                        self.persistence_manager.save_batch([removed_order], [])
+                    
+                    if audit_enabled():
+                        audit("cancel", removed_order)
                         
-                        # updating order in database if persistence manager is available
-                        if self.persistence_manager:
-                            self.persistence_manager.order_repository.save_order(removed_order)
-                            
-                        logger.info(f"Canceled pending trigger order: {order_id}")
-                        return removed_order
+                    logger.debug("Canceled pending trigger order: %s", order_id)
+                    return removed_order
             
             # If we get here, the order wasn't found in pending_trigger_orders
             return None
@@ -141,17 +453,39 @@ class MatchingEngine:
         canceled_order = order_book.cancel_order(order_id)
         
         if canceled_order:
-            self.all_orders[order_id] = canceled_order
+            self._retire_order(canceled_order)
             
             # Update order in database if persistence manager is available
             if self.persistence_manager:
-                self.persistence_manager.order_repository.save_order(canceled_order)
+                self.persistence_manager.save_batch([canceled_order], [])
+            
+            if audit_enabled():
+                audit("cancel", canceled_order)
         
         return canceled_order
     
-    def get_order(self, order_id: str) -> Optional[Order]:
-        """Get an order by ID."""
-        return self.all_orders.get(order_id)
+    def get_order(self, order_id: int) -> Optional[Order]:
+        """
+        Get an order by ID.
+        Looks in the live orders, then the terminal order cache, then the database.
+        """
+        order = self.all_orders.get(order_id)
+        if order is not None:
+            return order
+        
+        if order_id in self.terminal_orders:
+            order = self.terminal_orders[order_id][0]
+            self._retire_order(order)  # refresh its position in the cache
+            return order
+        
+        # Evicted orders are read back from the database if persistence manager is available
+        if self.persistence_manager:
+            order = self.persistence_manager.get_order(order_id)
+            if order is not None:
+                self._retire_order(order)
+            return order
+        
+        return None
     
     def get_bbo(self, symbol: str) -> Optional[BBO]:
         """Get the current Best Bid and Offer for a symbol."""
@@ -159,23 +493,66 @@ class MatchingEngine:
             return None
         return self.order_books[symbol].get_bbo()
     
-    def get_order_book_snapshot(self, symbol: str, depth: int = 10) -> Optional[OrderBookUpdate]:
-        """Get a snapshot of the order book for a symbol."""
+    def get_order_book_snapshot(self, symbol: str, depth: Optional[int] = 10) -> Optional[OrderBookUpdate]:
+        """Get a snapshot of the order book for a symbol, with every level if depth is None."""
         if symbol not in self.order_books:
             return None
         return self.order_books[symbol].get_order_book_snapshot(depth)
     
-    def get_recent_trades(self, symbol: str, limit: int = 100) -> List[Trade]:
-        """Get recent trades for a symbol."""
+    def get_order_book_changes(
+        self,
+        symbol: str,
+        after_sequence: int,
+        with_snapshot: bool = False
+    ) -> Tuple[Optional[List[LevelChange]], Optional[OrderBookUpdate]]:
+        """
+        Get the price level changes of a symbol's book made after a sequence number,
+        and a full-depth snapshot if asked for. If some of the changes are no longer
+        kept, returns no changes and a snapshot instead.
+        Returns (None, None) if the symbol has no order book.
+        """
         if symbol not in self.order_books:
-            return []
+            return None, None
+        order_book = self.order_books[symbol]
+        changes = order_book.get_level_changes(after_sequence)
+        if changes is None or with_snapshot:
+            return changes, order_book.get_order_book_snapshot(None)
+        return changes, None
+    
+    def get_quote(self, symbol: str, side: OrderSide, quantity: int) -> Tuple[int, int, Optional[int]]:
+        """
+        Estimate the cost of a market order for a symbol without executing it.
+        Returns (fillable quantity, notional in ticks * lots, worst price reached).
+        """
+        if symbol not in self.order_books:
+            return 0, 0, None
+        return self.order_books[symbol].get_quote(side, quantity)
+    
+    def get_recent_trades(self, symbol: str, limit: int = 100, include_history: bool = False) -> List[Trade]:
+        """
+        Get recent trades for a symbol, most recent first.
+        Trades are served from the in-memory history; with include_history, requests
+        for more trades than it holds are served from the database instead.
+        """
+        if limit < 1:
+            raise ValueError("Limit must be at least 1")
+        
+        trades = self.order_books[symbol].trades if symbol in self.order_books else ()
         
-        # Get trades from the order book, most recent first
-        trades = self.order_books[symbol].trades
-        return sorted(trades, key=lambda t: t.timestamp, reverse=True)[:limit]
+        if include_history and limit > len(trades) and self.persistence_manager:
+            return self.persistence_manager.get_trades_by_symbol(symbol, limit)
+        
+        # Trades are appended in time order, so the newest are at the end
+        return list(islice(reversed(trades), limit))
     
     def _validate_order(self, order: Order) -> bool:
         """Validate an order."""
+        # Check that prices and quantities are whole ticks and lots
+        for value in (order.quantity, order.price, order.stop_price, order.limit_price):
+            if value is not None and not isinstance(value, int):
+                logger.warning(f"Invalid order: prices and quantities must be integer ticks and lots")
+                return False
+        
         # Check required fields
         if not order.symbol or not order.order_type or not order.side or order.quantity <= 0:
             logger.warning(f"Invalid order: missing required fields or invalid quantity")
@@ -198,32 +575,53 @@ class MatchingEngine:
         
         return True
     
-    def _check_triggers(self, symbol: str, last_price: float) -> None:
+    def _trigger_index(self, symbol: str) -> TriggerIndex:
+        """Get the pending trigger orders of a symbol, creating the index if needed."""
+        if symbol not in self.pending_trigger_orders:
+            self.pending_trigger_orders[symbol] = TriggerIndex()
+        return self.pending_trigger_orders[symbol]
+    
+    def _check_batch_triggers(self, symbol: str, trades: List[Trade],
+                              new_orders: List[Tuple[int, Order]]) -> List[Trade]:
+        """
+        Check the pending trigger orders of a symbol against a batch's trades, then
+        add the trigger orders submitted in the batch, checking each only against
+        the trades that executed after it was submitted.
+        Returns the trades of the triggered orders.
+        """
+        prices = [trade.price for trade in trades]
+        triggered_trades = self._check_triggers(symbol, min(prices), max(prices))
+        
+        index = self._trigger_index(symbol)
+        for i, (position, order) in enumerate(new_orders):
+            index.add(order)
+            # Check once per position, after adding every order submitted there
+            if position < len(prices) and (i + 1 == len(new_orders) or new_orders[i + 1][0] != position):
+                later_prices = prices[position:]
+                triggered_trades.extend(self._check_triggers(symbol, min(later_prices), max(later_prices)))
+        return triggered_trades
+    
+    def _check_triggers(self, symbol: str, low_price: int, high_price: int) -> List[Trade]:
         """
-        Check if any pending trigger orders should be activated based on the last trade price.
+        Check if any pending trigger orders should be activated by a batch of trades
+        whose prices ranged from low_price to high_price.
+        Returns the trades of the triggered orders.
         """
         if symbol not in self.pending_trigger_orders or not self.pending_trigger_orders[symbol]:
-            return
+            return []
             
         # Get the order book
         order_book = self.get_or_create_order_book(symbol)
         
-        # Check each pending trigger order
-        triggered_orders = []
-        remaining_orders = []
-        
-        for order in self.pending_trigger_orders[symbol]:
-            if order.is_triggered(last_price):
-                triggered_orders.append(order)
-                logger.info(f"Triggered order: {order.order_id} - {order.order_type} at {order.stop_price}")
-            else:
-                remaining_orders.append(order)
-                
-        # Update the list of pending trigger orders
-        self.pending_trigger_orders[symbol] = remaining_orders
+        # Pop the triggered orders from the stop price index
+        triggered_orders = self.pending_trigger_orders[symbol].pop_triggered(low_price, high_price)
+        if not triggered_orders:
+            return []
         
-        # Process each triggered order
+        triggered_trades = []
         for order in triggered_orders:
+            logger.debug("Triggered order: %s - %s at %s", order.order_id, order.order_type, order.stop_price)
+            
             # Convert to appropriate order type
             if order.order_type == OrderType.STOP_LOSS:
                 # Convert to market order
@@ -240,39 +638,27 @@ class MatchingEngine:
                 order.status = OrderStatus.OPEN
                 
             # Process the converted order
-            trades, updated_order = order_book.add_order(order)
-            
-            # Calculate and add fees to each trade
-            for trade in trades:
-                trade_value = trade.price * trade.quantity
-                fee_schedule = self.fee_model.get_fee_schedule(order.symbol)
-                
-                # Calculate fees
-                maker_fee = fee_schedule.calculate_maker_fee(trade_value)
-                taker_fee = fee_schedule.calculate_taker_fee(trade_value)
-                
-                # Add fees to the trade
-                trade.maker_fee = maker_fee
-                trade.taker_fee = taker_fee
-                trade.maker_fee_rate = fee_schedule.maker_rate
-                trade.taker_fee_rate = fee_schedule.taker_rate
-                
-                logger.info(f"Fees calculated for trade {trade.trade_id}: maker={maker_fee}, taker={taker_fee}")
-                
-                # Save trade if persistence manager is available
-                if self.persistence_manager:
-                    self.persistence_manager.trade_repository.save_trade(trade)
+            trades, updated_order = order_book.add_order(order, update_bbo=False)
             
             # Update the order in all_orders
             self.all_orders[order.order_id] = updated_order
-            
-            # Update order in database if persistence manager is available
-            if self.persistence_manager:
-                self.persistence_manager.order_repository.save_order(updated_order)
-            
-            # Add trades to the list
-            if trades:
-                self.all_trades.extend(trades)
+            triggered_trades.extend(trades)
+        
+        # Refresh the BBO once for all triggered orders
+        order_book._update_bbo()
+        
+        # Calculate and add fees to each trade
+        self._apply_fees(symbol, triggered_trades)
+        self.all_trades.extend(triggered_trades)
+        
+        # Update orders and trades in database if persistence manager is available
+        touched_orders = self._touched_orders(triggered_orders, triggered_trades)
+        if self.persistence_manager:
+            self.persistence_manager.save_batch(touched_orders, triggered_trades)
+        
+        # Move finished orders out of the live set
+        self._retire_finished_orders(touched_orders)
+        return triggered_trades
     
     def set_fee_schedule(self, symbol: str, maker_rate: float, taker_rate: float) -> None:
         """Set a custom fee schedule for a symbol."""
@@ -301,6 +687,47 @@ class MatchingEngine:
             "taker_rate": fee_schedule.taker_rate
         }
     
+    def get_instrument(self, symbol: str) -> Instrument:
+        """Get the tick and lot size for a symbol, or the default ones if it has none."""
+        return self.instruments.get_instrument(symbol)
+    
+    def set_instrument(self, symbol: str, tick_size: Number, lot_size: Number) -> Instrument:
+        """
+        Set the tick and lot size for a symbol.
+        Raises ValueError if the symbol already has resting or pending orders,
+        since their integer prices and quantities would change meaning.
+        """
+        order_book = self.order_books.get(symbol)
+        if (order_book and order_book.orders_by_id) or self.pending_trigger_orders.get(symbol):
+            raise ValueError(f"Cannot change tick or lot size for {symbol} while it has open orders")
+        
+        instrument = self.instruments.set_instrument(symbol, tick_size, lot_size)
+        logger.info(f"Instrument set for {symbol}: tick_size={instrument.tick_size}, lot_size={instrument.lot_size}")
+        
+        # Save instrument if persistence manager is available
+        if self.persistence_manager:
+            self.persistence_manager.instrument_repository.save_instrument(instrument)
+        
+        return instrument
+    
+    def get_latency_histograms(self) -> Dict[Tuple[str, str], LatencyHistogram]:
+        """Get a copy of the per-stage latency histograms, keyed by (stage, symbol)."""
+        return self.latency.copy() if self.latency else {}
+    
+    def get_metrics(self) -> EngineMetrics:
+        """
+        Get a copy of the engine's counters, with the size of each book, the
+        pending trigger orders and the persistence queues filled in.
+        """
+        metrics = self.metrics.copy()
+        for symbol, order_book in self.order_books.items():
+            metrics.books[symbol] = (len(order_book.orders_by_id), len(order_book.bids), len(order_book.asks))
+        for symbol, trigger_orders in self.pending_trigger_orders.items():
+            metrics.pending_triggers[symbol] = len(trigger_orders)
+        if self.persistence_manager:
+            self.persistence_manager.write_metrics(metrics)
+        return metrics
+    
     def save_state(self) -> None:
         """Save the current state to the database."""
         if self.persistence_manager:
@@ -312,3 +739,4 @@ class MatchingEngine:
         if self.persistence_manager:
             self.persistence_manager.load_engine_state(self)
             logger.info("Engine state loaded from database")
+
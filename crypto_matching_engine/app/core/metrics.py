@@ -0,0 +1,132 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.latency import LatencyHistogram
+
+# Quantiles reported for latency summaries
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette adds the charset
+
+Sample = Tuple[Dict[str, str], float]  # (labels, value)
+
+
+class EngineMetrics:
+    """
+    Counters kept by the matching engine as it processes orders, plus gauges of
+    its books and persistence read when a copy is taken for a scrape.
+
+    Counters are plain dict increments on the matching thread, so scrapes never
+    walk the engine's orders. Copies from several shards can be merged.
+    """
+    __slots__ = ("orders", "cancels", "trades", "notional", "books", "pending_triggers",
+                 "journal_pending", "apply_queue", "commit_latency")
+
+    def __init__(self):
+        # Counters
+        self.orders: Dict[Tuple[str, str], int] = {}  # (order type, status after matching) -> orders submitted
+        self.cancels: Dict[str, int] = {}  # "canceled" or "not_found" -> cancel requests
+        self.trades: Dict[str, int] = {}  # Symbol -> trades executed
+        self.notional: Dict[str, float] = {}  # Symbol -> traded value in quote currency
+        # Gauges, filled in by MatchingEngine.get_metrics
+        self.books: Dict[str, Tuple[int, int, int]] = {}  # Symbol -> (resting orders, bid levels, ask levels)
+        self.pending_triggers: Dict[str, int] = {}  # Symbol -> pending trigger orders
+        self.journal_pending = 0  # Journal records waiting to be written
+        self.apply_queue = 0  # Written journal groups waiting to be copied to the database
+        self.commit_latency: Optional[LatencyHistogram] = None  # Journal group writes or database batch commits
+
+    def copy(self) -> "EngineMetrics":
+        """Copy the counters and gauges, e.g. to send them to another thread or process."""
+        copied = EngineMetrics()
+        copied.merge(self)
+        return copied
+
+    def merge(self, other: "EngineMetrics") -> None:
+        """Add another engine's counters and gauges to this one's."""
+        for name in ("orders", "cancels", "trades", "notional", "pending_triggers"):
+            counts = getattr(self, name)
+            for key, value in getattr(other, name).items():
+                counts[key] = counts.get(key, 0) + value
+        self.books.update(other.books)
+        self.journal_pending += other.journal_pending
+        self.apply_queue += other.apply_queue
+        if other.commit_latency is not None:
+            if self.commit_latency is None:
+                self.commit_latency = LatencyHistogram()
+            self.commit_latency.merge(other.commit_latency)
+
+    def write(self, text: "PrometheusText") -> None:
+        """Add the engine and persistence metrics to a scrape response."""
+        text.metric("matching_engine_orders_total", "counter",
+                    "Orders submitted, by order type and status after matching.",
+                    (({"type": order_type.value, "status": status.value}, count)
+                     for (order_type, status), count in sorted(self.orders.items())))
+        text.metric("matching_engine_cancels_total", "counter", "Cancel requests, by result.",
+                    (({"result": result}, count) for result, count in sorted(self.cancels.items())))
+        text.metric("matching_engine_trades_total", "counter", "Trades executed, by symbol.",
+                    (({"symbol": symbol}, count) for symbol, count in sorted(self.trades.items())))
+        text.metric("matching_engine_notional_total", "counter", "Traded value in quote currency, by symbol.",
+                    (({"symbol": symbol}, value) for symbol, value in sorted(self.notional.items())))
+        books = sorted(self.books.items())
+        text.metric("matching_engine_resting_orders", "gauge", "Orders resting in the book, by symbol.",
+                    (({"symbol": symbol}, resting) for symbol, (resting, _, _) in books))
+        text.metric("matching_engine_price_levels", "gauge", "Price levels in the book, by symbol and side.",
+                    (({"symbol": symbol, "side": side}, levels)
+                     for symbol, (_, bid_levels, ask_levels) in books
+                     for side, levels in (("bid", bid_levels), ("ask", ask_levels))))
+        text.metric("matching_engine_pending_trigger_orders", "gauge",
+                    "Stop and take-profit orders waiting for their trigger price, by symbol.",
+                    (({"symbol": symbol}, count) for symbol, count in sorted(self.pending_triggers.items())))
+        text.metric("persistence_journal_pending_records", "gauge", "Journal records waiting to be written.",
+                    [({}, self.journal_pending)])
+        text.metric("persistence_apply_queue_groups", "gauge",
+                    "Written journal groups waiting to be copied to the database.", [({}, self.apply_queue)])
+        if self.commit_latency is not None:
+            text.summary("persistence_commit_latency_seconds",
+                         "Time to write and sync a journal group, or to commit a batch to the database.",
+                         self.commit_latency)
+
+
+class PrometheusText:
+    """Builds a scrape response in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def metric(self, name: str, kind: str, help_text: str, samples: Iterable[Sample]) -> None:
+        """Add a counter or gauge with one sample per label set."""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def summary(self, name: str, help_text: str, histogram: LatencyHistogram) -> None:
+        """Add a latency histogram as a summary in seconds, with its quantiles, sum and count."""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} summary")
+        for quantile in QUANTILES:
+            value = histogram.percentile(quantile * 100) / 1e9
+            self.lines.append(f'{name}{{quantile="{quantile:g}"}} {_format_value(value)}')
+        self.lines.append(f"{name}_sum {_format_value(histogram.total / 1e9)}")
+        self.lines.append(f"{name}_count {histogram.count}")
+
+    def render(self) -> str:
+        """Get the response body."""
+        return "\n".join(self.lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Format labels as {name="value",...}."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    """Escape a label value's backslashes, quotes and newlines."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value; integers without a decimal point."""
+    return str(value) if isinstance(value, int) else repr(float(value))
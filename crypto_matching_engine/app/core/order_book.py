@@ -1,11 +1,15 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 import logging
-from datetime import datetime
+from collections import deque
+from itertools import islice
 from sortedcontainers import SortedDict
 
-from app.models.order import Order, OrderType, OrderSide, OrderStatus, OrderBookEntry
+from app.models.order import Order, OrderType, OrderSide, OrderStatus, OrderBookEntry, OrderNode
 from app.models.trade import Trade
 from app.models.market_data import BBO, OrderBookUpdate
+from app.core.depth_index import DepthIndex
+from app.core.id_generator import SnowflakeIdGenerator, default_id_generator
+from app.core.clock import now_ns
 
 # Configure logging
 logging.basicConfig(
@@ -14,6 +18,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Price level changes kept per book for incremental (delta) market data feeds
+LEVEL_CHANGE_HISTORY = 10000
+
+# A price level's new total quantity after a change: (sequence, side, price, quantity), quantity 0 when the level is gone
+LevelChange = Tuple[int, OrderSide, int, int]
+
 
 class OrderBook:
     """
@@ -21,53 +31,64 @@ class OrderBook:
     Uses sorted dictionaries for efficient price level access.
     """
     
-    def __init__(self, symbol: str):
+    def __init__(self, symbol: str, trade_history_size: int = 10000,
+                 id_generator: Optional[SnowflakeIdGenerator] = None,
+                 clock: Optional[Callable[[], int]] = None):
         self.symbol = symbol
-        # SortedDict with reverse=True for bids (highest price first)
-        self.bids = SortedDict(lambda x: -x)
-        # SortedDict with default sorting for asks (lowest price first)
-        self.asks = SortedDict()
-        # Dictionary to quickly lookup orders by ID
-        self.orders_by_id = {}
+        # Issues trade IDs
+        self.id_generator = id_generator or default_id_generator
+        # Timestamps trades and market data in nanoseconds since the epoch
+        self.clock = clock or now_ns
+        # Price level maps for each side, iterated best price first
+        self.bids, self.asks = self._create_sides()
+        # Cumulative quantity by price for each side (FOK checks and quotes)
+        self.bid_depth = DepthIndex(is_bid=True)
+        self.ask_depth = DepthIndex(is_bid=False)
+        # Dictionary to quickly lookup resting orders by ID (order ID -> queue node)
+        self.orders_by_id: Dict[int, OrderNode] = {}
         # Current BBO
         self.bbo = BBO(symbol=symbol)
-        # Trade history
-        self.trades = []
+        # Most recent trades, oldest first; older trades are only kept in the database
+        self.trades: Deque[Trade] = deque(maxlen=trade_history_size)
+        # Sequence number of the last price level change, and the most recent changes, oldest first
+        self.sequence = 0
+        self.level_changes: Deque[LevelChange] = deque(maxlen=LEVEL_CHANGE_HISTORY)
         
         logger.info(f"Order book initialized for {symbol}")
     
+    def _create_sides(self) -> Tuple[SortedDict, SortedDict]:
+        """Create the bid and ask price level maps."""
+        # SortedDict with reverse=True for bids (highest price first)
+        bids = SortedDict(lambda x: -x)
+        # SortedDict with default sorting for asks (lowest price first)
+        asks = SortedDict()
+        return bids, asks
+    
     def _can_fully_fill(self, order: Order) -> bool:
         """
         Check if an order can be fully filled against the current book.
         Used for FOK orders to determine if they should be executed or canceled.
         """
-        opposite_book = self.asks if order.side == OrderSide.BUY else self.bids
-        remaining = order.quantity
-        
-        # Iterate through price levels
-        for price in list(opposite_book.keys()):
-            # For limit orders, check if the price is still acceptable
-            if order.order_type == OrderType.LIMIT:
-                if (order.side == OrderSide.BUY and price > order.price) or \
-                   (order.side == OrderSide.SELL and price < order.price):
-                    break
-            
-            # Add available quantity at this price level
-            remaining -= opposite_book[price].total_quantity
-            
-            # If we can fill the order, return True
-            if remaining <= 0:
-                return True
-        
-        # If we get here, we can't fully fill the order
-        return False
+        opposite_depth = self.ask_depth if order.side == OrderSide.BUY else self.bid_depth
+        # Priced orders can only fill at their limit price or better
+        return opposite_depth.available(order.price) >= order.remaining_quantity
+    
+    def get_quote(self, side: OrderSide, quantity: int) -> Tuple[int, int, Optional[int]]:
+        """
+        Estimate the cost of a market order of the given side and quantity.
+        Returns (fillable quantity, notional in ticks * lots, worst price reached).
+        """
+        opposite_depth = self.ask_depth if side == OrderSide.BUY else self.bid_depth
+        return opposite_depth.sweep(quantity)
     
-    def add_order(self, order: Order) -> Tuple[List[Trade], Order]:
+    def add_order(self, order: Order, update_bbo: bool = True) -> Tuple[List[Trade], Order]:
         """
         Add a new order to the book. For marketable orders, this will trigger matching.
+        Callers adding several orders at once can pass update_bbo=False and
+        call _update_bbo once afterwards.
         Returns a list of trades executed and the updated order.
         """
-        logger.info(f"Adding order: {order.order_id} - {order.side} {order.order_type} {order.quantity} @ {order.price}")
+        logger.debug("Adding order: %s - %s %s %s @ %s", order.order_id, order.side, order.order_type, order.quantity, order.price)
         
         # Validate order
         if order.order_type == OrderType.LIMIT and order.price is None:
@@ -81,16 +102,15 @@ class OrderBook:
                 order.status = OrderStatus.REJECTED
                 return [], order
         
+        # For FOK orders, check if they can be fully filled
+        if order.order_type == OrderType.FOK and not self._can_fully_fill(order):
+            order.status = OrderStatus.CANCELED
+            return [], order
+        
         # Check if the order is marketable
         trades = []
         
         if self._is_marketable(order):
-            # For FOK orders, check if they can be fully filled
-            if order.order_type == OrderType.FOK:
-                if not self._can_fully_fill(order):
-                    order.status = OrderStatus.CANCELED
-                    return [], order
-            
             # Process marketable order
             trades = self._match_order(order)
             
@@ -103,35 +123,34 @@ class OrderBook:
         # Add any remaining quantity to the book for limit orders
         if order.remaining_quantity > 0 and order.order_type == OrderType.LIMIT:
             self._add_to_book(order)
-            self.orders_by_id[order.order_id] = order
         
         # Update BBO
-        self._update_bbo()
+        if update_bbo:
+            self._update_bbo()
         
         return trades, order
     
-    def cancel_order(self, order_id: str) -> Optional[Order]:
+    def cancel_order(self, order_id: int) -> Optional[Order]:
         """
         Cancel an order by ID.
         Returns the canceled order or None if not found.
         """
-        if order_id not in self.orders_by_id:
+        # Remove from ID lookup
+        node = self.orders_by_id.pop(order_id, None)
+        if node is None:
             return None
         
-        order = self.orders_by_id[order_id]
+        # Unlink from its price level
+        entry = node.level
+        order = entry.remove_node(node)
+        depth = self.bid_depth if order.side == OrderSide.BUY else self.ask_depth
+        depth.update(order.price, -order.remaining_quantity)
         
-        # Remove from price level
-        book = self.bids if order.side == OrderSide.BUY else self.asks
-        if order.price in book:
-            entry = book[order.price]
-            entry.remove_order(order_id)
-            
-            # Remove price level if empty
-            if not entry.orders:
-                del book[order.price]
-        
-        # Remove from ID lookup
-        del self.orders_by_id[order_id]
+        # Remove price level if empty
+        if not entry:
+            book = self.bids if order.side == OrderSide.BUY else self.asks
+            del book[entry.price]
+        self._level_changed(order.side, entry.price, entry.total_quantity)
         
         # Update order status
         order.status = OrderStatus.CANCELED
@@ -139,21 +158,23 @@ class OrderBook:
         # Update BBO
         self._update_bbo()
         
-        logger.info(f"Canceled order: {order_id}")
+        logger.debug("Canceled order: %s", order_id)
         return order
     
-    def get_order(self, order_id: str) -> Optional[Order]:
-        """Get an order by ID."""
-        return self.orders_by_id.get(order_id)
+    def get_order(self, order_id: int) -> Optional[Order]:
+        """Get a resting order by ID."""
+        node = self.orders_by_id.get(order_id)
+        return node.order if node is not None else None
     
     def get_bbo(self) -> BBO:
         """Get the current Best Bid and Offer."""
         return self.bbo
     
-    def get_order_book_snapshot(self, depth: int = 10) -> OrderBookUpdate:
+    def get_order_book_snapshot(self, depth: Optional[int] = 10) -> OrderBookUpdate:
         """
-        Get a snapshot of the order book up to the specified depth.
-        Returns an OrderBookUpdate with bids and asks as [price, quantity] pairs.
+        Get a snapshot of the order book up to the specified depth, or every level if depth is None.
+        Returns an OrderBookUpdate with bids and asks as [price, quantity] pairs,
+        tagged with the sequence number of the last level change it includes.
         """
         bids = []
         asks = []
@@ -161,22 +182,35 @@ class OrderBook:
         # Get top bids (already sorted by price in descending order)
         for price, entry in self.bids.items():
             bids.append((price, entry.total_quantity))
-            if len(bids) >= depth:
+            if depth is not None and len(bids) >= depth:
                 break
         
         # Get top asks (already sorted by price in ascending order)
         for price, entry in self.asks.items():
             asks.append((price, entry.total_quantity))
-            if len(asks) >= depth:
+            if depth is not None and len(asks) >= depth:
                 break
         
         return OrderBookUpdate(
-            timestamp=datetime.utcnow(),
+            timestamp=self.clock(),
             symbol=self.symbol,
+            sequence=self.sequence,
             bids=bids,
             asks=asks
         )
     
+    def get_level_changes(self, after_sequence: int) -> Optional[List[LevelChange]]:
+        """
+        Get the price level changes made after a sequence number, oldest first.
+        Returns None if some of them are no longer kept, in which case a new snapshot is needed.
+        """
+        missed = self.sequence - after_sequence
+        if missed <= 0:
+            return []
+        if missed > len(self.level_changes):
+            return None
+        return list(islice(self.level_changes, len(self.level_changes) - missed, None))
+    
     def _is_marketable(self, order: Order) -> bool:
         """Check if an order is immediately marketable against the current book."""
         if order.order_type == OrderType.MARKET:
@@ -201,13 +235,8 @@ class OrderBook:
         """
         trades = []
         opposite_book = self.asks if order.side == OrderSide.BUY else self.bids
-        
-        # For FOK orders, we need to check if the entire order can be filled
-        if order.order_type == OrderType.FOK:
-            # Check if the order can be fully filled
-            can_fill = self._can_fully_fill(order)
-            if not can_fill:
-                return []
+        opposite_depth = self.ask_depth if order.side == OrderSide.BUY else self.bid_depth
+        resting_side = OrderSide.SELL if order.side == OrderSide.BUY else OrderSide.BUY
         
         # Continue matching until the order is filled or no more matches
         while order.remaining_quantity > 0 and opposite_book:
@@ -215,16 +244,16 @@ class OrderBook:
             best_price = next(iter(opposite_book))
             price_level = opposite_book[best_price]
             
-            # For limit orders, check if the price is still acceptable
-            if order.order_type == OrderType.LIMIT:
+            # For priced orders (limit, IOC, FOK), check if the price is still acceptable
+            if order.price is not None:
                 if (order.side == OrderSide.BUY and best_price > order.price) or \
                    (order.side == OrderSide.SELL and best_price < order.price):
                     break
             
             # Match against orders at this price level (FIFO)
-            i = 0
-            while i < len(price_level.orders) and order.remaining_quantity > 0:
-                resting_order = price_level.orders[i]
+            while price_level.head is not None and order.remaining_quantity > 0:
+                node = price_level.head
+                resting_order = node.order
                 
                 # Calculate fill quantity
                 fill_qty = min(order.remaining_quantity, resting_order.remaining_quantity)
@@ -232,9 +261,13 @@ class OrderBook:
                 # Update both orders
                 order.update_on_fill(fill_qty)
                 resting_order.update_on_fill(fill_qty)
+                price_level.reduce_quantity(fill_qty)
+                opposite_depth.update(best_price, -fill_qty)
                 
                 # Create trade record
                 trade = Trade(
+                    trade_id=self.id_generator.next_id(),
+                    timestamp=self.clock(),
                     symbol=self.symbol,
                     price=best_price,
                     quantity=fill_qty,
@@ -245,38 +278,72 @@ class OrderBook:
                 trades.append(trade)
                 self.trades.append(trade)
                 
-                logger.info(f"Trade executed: {trade.trade_id} - {fill_qty} @ {best_price}")
+                logger.debug("Trade executed: %s - %s @ %s", trade.trade_id, fill_qty, best_price)
                 
-                # If resting order is filled, remove it
+                # If resting order is filled, pop it from the front of the queue
                 if resting_order.status == OrderStatus.FILLED:
-                    price_level.orders.pop(i)
+                    price_level.remove_node(node)
                     del self.orders_by_id[resting_order.order_id]
-                else:
-                    i += 1
-                
-                # Update total quantity at this price level
-                price_level.update_quantity()
             
             # If price level is empty, remove it
-            if not price_level.orders:
+            if not price_level:
                 del opposite_book[best_price]
-            
-            # For FOK orders, we need to check if the entire order can be filled
-            if order.order_type == OrderType.FOK and order.filled_quantity < order.quantity:
-                # We'll handle this in the calling function
-                break
+            self._level_changed(resting_side, best_price, price_level.total_quantity)
         
         return trades
     
     def _add_to_book(self, order: Order) -> None:
-        """Add a non-marketable order to the book."""
+        """Add a non-marketable order to the back of its price level."""
         book = self.bids if order.side == OrderSide.BUY else self.asks
         
         if order.price not in book:
             book[order.price] = OrderBookEntry(price=order.price)
         
-        book[order.price].add_order(order)
-        logger.info(f"Order added to book: {order.order_id} at price {order.price}")
+        entry = book[order.price]
+        self.orders_by_id[order.order_id] = entry.add_order(order)
+        depth = self.bid_depth if order.side == OrderSide.BUY else self.ask_depth
+        depth.update(order.price, order.remaining_quantity)
+        self._level_changed(order.side, order.price, entry.total_quantity)
+        logger.debug("Order added to book: %s at price %s", order.order_id, order.price)
+    
+    def _restore_order(self, order: Order) -> None:
+        """
+        Bring a resting order to a recorded state without matching, e.g. when replaying a journal.
+        An order already in the book keeps its place in the queue; orders that no longer rest are removed.
+        Callers should call _update_bbo once they are done.
+        """
+        resting = (order.order_type == OrderType.LIMIT and order.remaining_quantity > 0 and
+                   order.status in (OrderStatus.OPEN, OrderStatus.PARTIALLY_FILLED))
+        node = self.orders_by_id.get(order.order_id)
+        if node is None:
+            if resting:
+                self._add_to_book(order)
+            return
+        
+        depth = self.bid_depth if order.side == OrderSide.BUY else self.ask_depth
+        entry = node.level
+        if resting:
+            # Swap in the new state and account for the quantity filled since
+            filled = node.order.remaining_quantity - order.remaining_quantity
+            node.order = order
+            entry.reduce_quantity(filled)
+            depth.update(entry.price, -filled)
+            self._level_changed(order.side, entry.price, entry.total_quantity)
+            return
+        
+        # Unlink the order and drop its level if empty
+        del self.orders_by_id[order.order_id]
+        entry.remove_node(node)
+        depth.update(entry.price, -node.order.remaining_quantity)
+        if not entry:
+            book = self.bids if order.side == OrderSide.BUY else self.asks
+            del book[entry.price]
+        self._level_changed(order.side, entry.price, entry.total_quantity)
+    
+    def _level_changed(self, side: OrderSide, price: int, quantity: int) -> None:
+        """Record a price level's new total quantity under the book's next sequence number."""
+        self.sequence += 1
+        self.level_changes.append((self.sequence, side, price, quantity))
     
     def _update_bbo(self) -> None:
         """Update the Best Bid and Offer."""
@@ -300,6 +367,7 @@ class OrderBook:
             self.bbo.ask_price = None
             self.bbo.ask_quantity = None
         
-        self.bbo.timestamp = datetime.utcnow()
+        self.bbo.timestamp = self.clock()
         
-        logger.debug(f"BBO updated: Bid {self.bbo.bid_price}@{self.bbo.bid_quantity}, Ask {self.bbo.ask_price}@{self.bbo.ask_quantity}")
+        logger.debug("BBO updated: Bid %s@%s, Ask %s@%s", self.bbo.bid_price, self.bbo.bid_quantity,
+                     self.bbo.ask_price, self.bbo.ask_quantity)
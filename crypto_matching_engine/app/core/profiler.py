@@ -0,0 +1,208 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+from app.core.clock import monotonic_ns, NANOS_PER_SECOND
+
+logger = logging.getLogger(__name__)
+
+# Name of the sequencer's thread, which runs every engine call
+MATCHING_THREAD = "matching-sequencer"
+
+# Functions that mean a thread is waiting for work when they are the innermost Python frame
+IDLE_FUNCTIONS = {
+    "Sequencer._run",  # Blocked on the command queue
+    "EpollSelector.select", "KqueueSelector.select", "PollSelector.select", "SelectSelector.select",
+    "Condition.wait", "Event.wait", "Thread.join", "Queue.get", "_worker",
+    "QueueListener.dequeue",  # Log records are written by a listener thread
+}
+
+
+def _categorize(code: CodeType, qualname: str) -> Optional[str]:
+    """Get the category of time spent in a function, or None if it has no category of its own."""
+    filename = code.co_filename.replace(os.sep, "/")
+    if qualname in ("OrderBook._match_order", "DenseOrderBook._match_order"):
+        return "matching"
+    if "/pydantic/" in filename or filename.endswith("/fastapi/encoders.py") or qualname == "serialize_response" \
+            or ("/app/models/" in filename and ".from_" in qualname and "View." in qualname):
+        return "pydantic"
+    if "/logging/" in filename or filename.endswith("/app/logging_setup.py"):
+        return "logging"
+    if "/sqlite3/" in filename or filename.endswith("/app/persistence/database.py") \
+            or filename.endswith("_repository.py"):
+        return "sqlite"
+    return None
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the Python stacks of running threads.
+
+    A timer thread reads every thread's current frame with sys._current_frames
+    every interval and counts the stack it finds, so the profiled threads run
+    unmodified and the overhead is one stack walk per thread per sample.
+    Stacks are kept in collapsed form (thread;outer;...;inner count), ready for
+    flamegraph.pl, speedscope or inferno.
+
+    Each sample is also put in a category by its innermost frame that has one:
+    "matching" (_match_order), "pydantic" (model construction and response
+    encoding), "logging", "sqlite" (the database and repositories) or "other",
+    unless the thread was waiting for work ("idle").
+    """
+
+    def __init__(self, output_dir: Optional[str] = None):
+        self.output_dir = output_dir  # Finished runs are written here as collapsed stacks, if set
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[CodeType, Tuple[str, Optional[str]]] = {}  # Code object -> (frame label, category)
+        self._reset(0.0, 0.0, None)
+
+    def _reset(self, duration: float, interval: float, thread_names: Optional[Collection[str]]) -> None:
+        self.duration = duration
+        self.interval = interval
+        self.thread_names = set(thread_names) if thread_names else None
+        self.stacks: Counter = Counter()  # Collapsed stack -> samples
+        self.categories: Counter = Counter()
+        self.threads: Counter = Counter()  # Thread name -> samples
+        self.samples = 0
+        self.started_ns = 0
+        self.elapsed_ns = 0
+        self.output_path: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float, interval: float = 0.01, thread_names: Optional[Collection[str]] = None) -> None:
+        """
+        Start sampling every interval seconds for duration seconds, only the
+        threads with the given names if any. Discards the previous run's samples.
+        Raises RuntimeError if a run is in progress.
+        """
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Profiler is already running")
+            self._reset(duration, interval, thread_names)
+            self._stop.clear()
+            self.started_ns = monotonic_ns()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"Profiler started for {duration}s every {interval * 1000:g}ms")
+
+    def stop(self) -> None:
+        """Stop sampling before the run's duration is up and wait for the samples to be written."""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def collapsed(self) -> str:
+        """Get the samples as collapsed stacks, one "frame;frame;frame count" line per stack."""
+        with self._lock:
+            stacks = list(self.stacks.items())
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks))
+
+    def status(self, top: int = 20) -> Dict[str, Any]:
+        """Get the run's settings, the samples per category and thread, and the most sampled innermost frames."""
+        with self._lock:
+            leaves = Counter()
+            for stack, count in self.stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            elapsed_ns = monotonic_ns() - self.started_ns if self.running else self.elapsed_ns
+            return {
+                "running": self.running,
+                "duration_seconds": self.duration,
+                "interval_ms": self.interval * 1000,
+                "threads_filter": sorted(self.thread_names) if self.thread_names else None,
+                "elapsed_seconds": round(elapsed_ns / NANOS_PER_SECOND, 3),
+                "samples": self.samples,
+                "categories": {name: {"samples": count, "fraction": round(count / self.samples, 4)}
+                               for name, count in self.categories.most_common()},
+                "threads": dict(self.threads.most_common()),
+                "top_frames": [{"frame": frame, "samples": count} for frame, count in leaves.most_common(top)],
+                "output_path": self.output_path,
+            }
+
+    def _run(self) -> None:
+        """Take samples until the run's duration is up or it is stopped."""
+        own_ident = threading.get_ident()
+        deadline_ns = self.started_ns + int(self.duration * NANOS_PER_SECOND)
+        try:
+            while not self._stop.wait(self.interval) and monotonic_ns() < deadline_ns:
+                self._sample(own_ident)
+        except Exception as e:
+            logger.error(f"Profiler stopped after an error: {e}")
+        self.elapsed_ns = monotonic_ns() - self.started_ns
+        logger.info(f"Profiler took {self.samples} samples in {self.elapsed_ns / NANOS_PER_SECOND:.1f}s")
+
+        if self.output_dir:
+            path = os.path.join(self.output_dir, time.strftime("profile-%Y%m%d-%H%M%S.collapsed"))
+            try:
+                with open(path, "w") as f:
+                    f.write(self.collapsed())
+                self.output_path = path
+                logger.info(f"Profile written to {path}")
+            except OSError as e:
+                logger.error(f"Error writing profile: {e}")
+
+    def _sample(self, own_ident: int) -> None:
+        """Count the current stack of every thread except the profiler's own."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, frame in frames.items():
+                if ident == own_ident:
+                    continue
+                name = names.get(ident, f"thread-{ident}")
+                if self.thread_names is not None and name not in self.thread_names:
+                    continue
+
+                # Walk from the innermost frame out, noting the innermost frame with a category
+                labels: List[str] = []
+                category = None
+                while frame is not None:
+                    label, frame_category = self._label(frame.f_code)
+                    if category is None and frame_category is not None:
+                        category = frame_category
+                    labels.append(label)
+                    frame = frame.f_back
+                if labels and labels[0].split(" (", 1)[0] in IDLE_FUNCTIONS:
+                    category = "idle"
+                elif category is None:
+                    category = "other"
+
+                labels.append(name)
+                labels.reverse()
+                self.stacks[";".join(labels)] += 1
+                self.categories[category] += 1
+                self.threads[name] += 1
+                self.samples += 1
+
+    def _label(self, code: CodeType) -> Tuple[str, Optional[str]]:
+        """Get the frame label, "function (path)", and category of a code object, caching them."""
+        cached = self._labels.get(code)
+        if cached is None:
+            qualname = getattr(code, "co_qualname", code.co_name)
+            cached = self._labels[code] = (
+                f"{qualname} ({_short_path(code.co_filename)})".replace(";", ":"),
+                _categorize(code, qualname)
+            )
+        return cached
+
+
+def _short_path(filename: str) -> str:
+    """Get a source path relative to the sys.path entry it was imported from."""
+    for entry in sorted(filter(None, sys.path), key=len, reverse=True):
+        if filename.startswith(entry + os.sep):
+            return filename[len(entry) + 1:]
+    return filename
+
+
+# Profiler for the application process
+profiler = SamplingProfiler()
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import Any, List, Optional, Tuple
+
+from app.core.clock import monotonic_ns
+
+logger = logging.getLogger(__name__)
+
+# Kinds of market data event, named after the WebSocket channels they feed
+BBO_EVENT = "bbo"  # Payload: a BBO copy
+BOOK_EVENT = "order_book"  # Payload: the book's LevelChanges since the previous event
+TRADES_EVENT = "trades"  # Payload: the trades of one engine call
+SNAPSHOT_EVENT = "snapshot"  # Payload: (BBO copy, full-depth OrderBookUpdate)
+INSTRUMENT_EVENT = "instrument"  # Payload: the symbol's Instrument, before its first other event and on changes
+
+MarketDataEvent = Tuple[str, str, Any]  # (kind, symbol, payload)
+
+
+class MarketDataPublisher:
+    """
+    Hands market data events from the matching thread to the event loop.
+
+    The engine publishes the events of each call as one list, in the order it
+    made the changes. Each list is put on an asyncio queue with a single
+    call_soon_threadsafe, together with the monotonic time it was published.
+    Until a consumer attaches, events are dropped and the engine skips
+    building them, so a server without WebSocket clients does no extra work.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+
+    @property
+    def active(self) -> bool:
+        """Whether a consumer is attached."""
+        return self._queue is not None
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> "asyncio.Queue[Tuple[int, List[MarketDataEvent]]]":
+        """Start delivering events to a queue read on a loop, and return the queue."""
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        logger.info("Market data publisher attached")
+        return self._queue
+
+    def detach(self) -> None:
+        """Stop delivering events."""
+        self._queue = None
+        self._loop = None
+
+    def publish(self, events: List[MarketDataEvent]) -> None:
+        """Deliver a list of events to the consumer. Safe to call from any thread."""
+        loop, queue = self._loop, self._queue
+        if queue is None or not events:
+            return
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (monotonic_ns(), events))
+        except RuntimeError:
+            # The loop has been closed, e.g. at shutdown
+            self.detach()
+
+
+class EventBuffer:
+    """
+    Publisher for the engine of a shard worker process. Events are kept until
+    the reply to the router's request takes them, and the router publishes
+    them on its own MarketDataPublisher.
+    """
+    active = True
+
+    def __init__(self):
+        self.events: List[MarketDataEvent] = []
+
+    def publish(self, events: List[MarketDataEvent]) -> None:
+        self.events.extend(events)
+
+    def drain(self) -> List[MarketDataEvent]:
+        """Take the events published since the last drain."""
+        events, self.events = self.events, []
+        return events
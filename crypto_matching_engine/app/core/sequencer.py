@@ -0,0 +1,112 @@
+from concurrent.futures import Future
+from typing import Any
+import asyncio
+import logging
+import queue
+import threading
+
+# configuring logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class Sequencer:
+    """
+    Single writer in front of the matching engine.
+
+    Callers put (method, args) commands on a queue and wait on a future; one
+    dedicated thread drains the queue in strict arrival order, calls the
+    engine method and resolves the future with its result or exception.
+    The asyncio event loop never runs matching or database commits itself,
+    and new orders, cancels and reads are applied in the order they arrived.
+
+    Every call that reads or changes engine state should go through the same
+    sequencer, since the engine itself is not thread-safe.
+    """
+
+    def __init__(self, engine, name: str = "matching-sequencer"):
+        self.engine = engine
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        logger.info("Sequencer started")
+
+    async def submit(self, method: str, *args) -> Any:
+        """Queue a call to an engine method and await its result."""
+        return await asyncio.wrap_future(self._enqueue(method, args))
+
+    def call(self, method: str, *args) -> Any:
+        """Queue a call to an engine method and block until it returns, for code outside the event loop."""
+        return self._enqueue(method, args).result()
+
+    def stop(self) -> None:
+        """Stop the sequencer thread after it has run every queued command."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            logger.info("Sequencer stopped")
+
+    def _enqueue(self, method: str, args: tuple) -> Future:
+        """Put a command on the queue and return the future of its result."""
+        if not self._thread.is_alive():
+            raise RuntimeError("Sequencer is stopped")
+        future = Future()
+        self._queue.put((method, args, future))
+        return future
+
+    def _run(self) -> None:
+        """Run queued commands one at a time until stopped."""
+        while True:
+            command = self._queue.get()
+            if command is None:
+                break
+            method, args, future = command
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(getattr(self.engine, method)(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class ShardedSequencer:
+    """
+    Sequencer for a ShardedMatchingEngine: one Sequencer per shard, plus one
+    for calls that span shards.
+
+    A single sequencer thread would wait on each shard's reply in turn, so
+    single orders for different shards would be matched one after another.
+    Instead, each call goes to the sequencer of the shard the engine routes
+    it to (engine.shard_for_call), keeping arrival order within each shard
+    while shards work in parallel. Calls that may touch several shards
+    (batches across shards, metrics, state saves) run on the cross-shard
+    sequencer; the router's per-shard locks keep each shard's pipe to one
+    call at a time. Arrival order is kept per shard, not between a cross-shard
+    call and the calls for one shard queued at the same time.
+    """
+
+    def __init__(self, engine, name: str = "matching-sequencer"):
+        self.engine = engine
+        self.cross_shard = Sequencer(engine, name)
+        self.shards = [Sequencer(engine, f"{name}-{shard}") for shard in range(engine.num_shards)]
+
+    async def submit(self, method: str, *args) -> Any:
+        """Queue a call on the sequencer of the shard it touches and await its result."""
+        return await self._sequencer_for(method, args).submit(method, *args)
+
+    def call(self, method: str, *args) -> Any:
+        """Queue a call on the sequencer of the shard it touches and block until it returns."""
+        return self._sequencer_for(method, args).call(method, *args)
+
+    def stop(self) -> None:
+        """Stop every sequencer thread after it has run its queued commands."""
+        for sequencer in self.shards:
+            sequencer.stop()
+        self.cross_shard.stop()
+
+    def _sequencer_for(self, method: str, args: tuple) -> Sequencer:
+        shard = self.engine.shard_for_call(method, args)
+        return self.cross_shard if shard is None else self.shards[shard]
@@ -0,0 +1,433 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import zlib
+
+from app.models.order import Order, OrderSide, OrderStatus
+from app.models.trade import Trade
+from app.models.market_data import BBO, OrderBookUpdate
+from app.models.instrument import Instrument, Number
+from app.core.matching_engine import MatchingEngine
+from app.core.order_book import LevelChange
+from app.core.id_generator import MAX_WORKER_ID, SnowflakeIdGenerator, worker_id_of
+from app.core.latency import LatencyHistogram, LatencyRecorder
+from app.core.metrics import EngineMetrics
+from app.core.publisher import EventBuffer
+from app.persistence.persistence_manager import PersistenceManager
+
+# configuring logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# Router methods whose first argument is the symbol whose shard they call
+SYMBOL_METHODS = frozenset({
+    "set_order_book_backend", "get_bbo", "get_order_book_snapshot", "get_order_book_changes", "get_quote",
+    "get_recent_trades", "set_fee_schedule", "get_fee_schedule", "get_instrument", "set_instrument", "next_order_id",
+})
+
+
+def order_worker_id(shard: int) -> int:
+    """
+    Get the Snowflake worker ID of the order IDs the router issues for a shard.
+    Each shard has two worker IDs, an even one for order IDs and the odd one after it for the
+    trade IDs the shard issues, so order and trade IDs never collide across the two processes.
+    """
+    return 2 * shard
+
+
+def trade_worker_id(shard: int) -> int:
+    """Get the Snowflake worker ID of the trade IDs a shard issues."""
+    return 2 * shard + 1
+
+
+def shard_db_path(db_path: str, shard: int) -> str:
+    """Get the database path of a shard, e.g. trading_app.db -> trading_app.shard0.db."""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.shard{shard}{ext}"
+
+
+def _worker_main(shard: int, conn, engine_options: Dict[str, Any], default_order_book_backend: str,
+                 db_path: Optional[str], persistence_options: Dict[str, Any], cpus: Optional[List[int]]) -> None:
+    """
+    Entry point of a shard worker process.
+    Owns a MatchingEngine for the shard's symbols and serves (method, args)
+    requests from the router until it receives None. Each reply carries the
+    market data events the request published.
+    """
+    # The router stops the worker on shutdown; don't let Ctrl+C kill it first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+        logger.info(f"Shard {shard} pinned to CPUs {cpus}")
+
+    # Trade IDs carry the shard number, in a worker ID of their own next to the router's order IDs
+    engine = MatchingEngine(id_generator=SnowflakeIdGenerator(worker_id=trade_worker_id(shard)), **engine_options)
+    engine.default_order_book_backend = default_order_book_backend
+    engine.publisher = EventBuffer()
+    if db_path:
+        # Each shard has its own journal and snapshot files as well
+        shard_options = dict(persistence_options)
+        for option in ("journal_path", "snapshot_path"):
+            if shard_options.get(option):
+                shard_options[option] = shard_db_path(shard_options[option], shard)
+        engine.persistence_manager = PersistenceManager(shard_db_path(db_path, shard), **shard_options)
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            # The router exited without stopping the worker
+            break
+        if request is None:
+            break
+        method, args = request
+        try:
+            if method == "last_id":
+                result = engine.id_generator.last_id
+            else:
+                result = getattr(engine, method)(*args)
+            conn.send((True, result, engine.publisher.drain()))
+        except Exception as e:
+            conn.send((False, e, engine.publisher.drain()))
+
+    if engine.persistence_manager:
+        engine.persistence_manager.close()
+    conn.close()
+    logger.info(f"Shard {shard} stopped")
+
+
+class ShardedMatchingEngine:
+    """
+    Matching engine that spreads trading pairs over worker processes.
+
+    Each symbol is assigned to one shard, by configuration or by a stable hash
+    of its name. Each shard runs in its own process with its own MatchingEngine
+    (order books, trigger orders, fee schedules and, if db_path is set, its own
+    database and journal, opened with persistence_options), so symbols on different shards match in parallel instead of
+    sharing one interpreter lock.
+
+    The router exposes the MatchingEngine methods used by the API and forwards
+    each call over a pipe to the shard owning the symbol. Order IDs are issued
+    by the router with the shard number as their worker ID, so cancels and
+    lookups by order ID are routed without a lookup table. Market data events
+    published by the shards come back with their replies and are published
+    on the router's publisher, if set.
+    """
+
+    def __init__(
+        self,
+        num_shards: int,
+        symbol_shards: Optional[Dict[str, int]] = None,
+        pin_cpus: bool = False,
+        db_path: Optional[str] = None,
+        persistence_options: Optional[Dict[str, Any]] = None,
+        default_order_book_backend: str = "sorted",
+        **engine_options
+    ):
+        if not 1 <= num_shards <= (MAX_WORKER_ID + 1) // 2:
+            raise ValueError(f"Number of shards must be between 1 and {(MAX_WORKER_ID + 1) // 2}")
+        for symbol, shard in (symbol_shards or {}).items():
+            if not 0 <= shard < num_shards:
+                raise ValueError(f"Shard {shard} for {symbol} is out of range")
+
+        self.num_shards = num_shards
+        self.symbol_shards = dict(symbol_shards or {})  # Symbol -> shard, overriding the hash
+        self.id_generators = [SnowflakeIdGenerator(worker_id=order_worker_id(shard)) for shard in range(num_shards)]
+        self.instruments: Dict[str, Instrument] = {}  # Cache of instruments, which only change through the router
+        # Symbols with an order book in their shard, which has registered their instrument; lookups of
+        # other symbols get the default increments from the shard and are not cached
+        self.book_symbols: Set[str] = set()
+        self.publisher = None  # Market data publisher for the WebSocket feeds, set by main.py
+        self._connections = []
+        self._locks = [threading.Lock() for _ in range(num_shards)]
+        self._processes = []
+
+        # Pin shard i to the i-th CPU this process may run on
+        cpus = sorted(os.sched_getaffinity(0)) if pin_cpus and hasattr(os, "sched_setaffinity") else None
+        if pin_cpus and cpus is None:
+            logger.warning("CPU pinning is not supported on this platform")
+
+        # Spawn rather than fork, so workers do not inherit the router's threads and open files
+        context = multiprocessing.get_context("spawn")
+        for shard in range(num_shards):
+            router_conn, worker_conn = context.Pipe()
+            shard_cpus = [cpus[shard % len(cpus)]] if cpus else None
+            process = context.Process(
+                target=_worker_main,
+                args=(shard, worker_conn, engine_options, default_order_book_backend, db_path,
+                  persistence_options or {}, shard_cpus),
+                name=f"matching-shard-{shard}",
+                daemon=True
+            )
+            process.start()
+            worker_conn.close()
+            self._connections.append(router_conn)
+            self._processes.append(process)
+
+        logger.info(f"Sharded matching engine started with {num_shards} shards")
+
+    def shard_for(self, symbol: str) -> int:
+        """Get the shard that owns a symbol."""
+        shard = self.symbol_shards.get(symbol)
+        if shard is None:
+            # crc32 rather than hash(), which differs between processes
+            shard = zlib.crc32(symbol.encode()) % self.num_shards
+        return shard
+
+    def _shard_for_order_id(self, order_id: int) -> Optional[int]:
+        """Get the shard that issued an order ID, or None if no shard did."""
+        shard, is_trade_id = divmod(worker_id_of(order_id), 2)
+        return shard if not is_trade_id and shard < self.num_shards else None
+
+    def _call(self, shard: int, method: str, *args) -> Any:
+        """Call a MatchingEngine method in a shard and return its result, re-raising its exceptions."""
+        with self._locks[shard]:
+            self._connections[shard].send((method, args))
+            return self._receive(shard)
+
+    def _call_all(self, calls: Dict[int, Tuple[str, tuple]]) -> Dict[int, Any]:
+        """
+        Call a method in several shards at once.
+        Every request is sent before any reply is read, so the shards work in parallel.
+        """
+        shards = sorted(calls)  # Lock in shard order to avoid deadlocks
+        for shard in shards:
+            self._locks[shard].acquire()
+        try:
+            for shard in shards:
+                self._connections[shard].send(calls[shard])
+            replies = {}
+            errors = []
+            for shard in shards:
+                try:
+                    replies[shard] = self._receive(shard)
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            for shard in shards:
+                self._locks[shard].release()
+
+        if errors:
+            raise errors[0]
+        return replies
+
+    def _receive(self, shard: int) -> Any:
+        """Read a reply from a shard. The caller must hold the shard's lock."""
+        try:
+            ok, result, events = self._connections[shard].recv()
+        except EOFError:
+            raise RuntimeError(f"Matching engine shard {shard} has stopped")
+        if events and self.publisher is not None:
+            self.publisher.publish(events)
+        if not ok:
+            raise result
+        return result
+
+    def shard_for_call(self, method: str, args: tuple) -> Optional[int]:
+        """
+        Get the only shard a call to one of this class's methods touches, or None
+        if it may touch several, so a ShardedSequencer can queue it behind that
+        shard's calls alone.
+        """
+        if method == "process_order":
+            return self.shard_for(args[0].symbol)
+        if method in ("cancel_order", "get_order"):
+            return self._shard_for_order_id(args[0])
+        if method == "process_orders":
+            shards = {self.shard_for(order.symbol) for order in args[0]}
+        elif method == "publish_snapshots":
+            shards = {self.shard_for(symbol) for symbol in args[0]} if args and args[0] is not None else ()
+        elif method in SYMBOL_METHODS:
+            return self.shard_for(args[0])
+        else:
+            return None
+        return next(iter(shards)) if len(shards) == 1 else None
+
+    def next_order_id(self, symbol: str) -> int:
+        """
+        Issue the ID for a new order on a symbol, tagged with the symbol's shard.
+        Safe to call from any thread, since it only reads the fixed shard assignment and the generators are locked.
+        """
+        return self.id_generators[self.shard_for(symbol)].next_id()
+
+    def get_symbols(self) -> List[str]:
+        """Get the symbols that have an order book in any shard."""
+        replies = self._call_all({shard: ("get_symbols", ()) for shard in range(self.num_shards)})
+        return [symbol for shard in sorted(replies) for symbol in replies[shard]]
+
+    def set_order_book_backend(self, symbol: str, backend: str) -> None:
+        """Select the order book backend for a symbol."""
+        self._call(self.shard_for(symbol), "set_order_book_backend", symbol, backend)
+
+    def process_order(self, order: Order) -> Tuple[List[Trade], Order]:
+        """
+        Process a new order in the shard that owns its symbol.
+        Returns a list of trades executed and the updated order.
+        """
+        trades, updated_order = self._call(self.shard_for(order.symbol), "process_order", order)
+        if updated_order.status != OrderStatus.REJECTED:
+            self.book_symbols.add(order.symbol)
+        return trades, updated_order
+
+    def process_orders(self, orders: List[Order]) -> List[Tuple[List[Trade], Order]]:
+        """
+        Process a batch of orders.
+        The batch is split by shard and the parts are processed in parallel, in
+        submission order within each shard.
+        Returns a (trades, updated order) pair for each order, in submission order.
+        """
+        positions_by_shard: Dict[int, List[int]] = {}
+        for i, order in enumerate(orders):
+            positions_by_shard.setdefault(self.shard_for(order.symbol), []).append(i)
+
+        replies = self._call_all({
+            shard: ("process_orders", ([orders[i] for i in positions],))
+            for shard, positions in positions_by_shard.items()
+        })
+
+        # Put the results back in submission order
+        results = [None] * len(orders)
+        for shard, positions in positions_by_shard.items():
+            for i, result in zip(positions, replies[shard]):
+                results[i] = result
+                if result[1].status != OrderStatus.REJECTED:
+                    self.book_symbols.add(result[1].symbol)
+        return results
+
+    def cancel_order(self, order_id: int) -> Optional[Order]:
+        """
+        Cancel an order by ID.
+        Returns the canceled order or None if not found.
+        """
+        shard = self._shard_for_order_id(order_id)
+        if shard is None:
+            return None
+        return self._call(shard, "cancel_order", order_id)
+
+    def get_order(self, order_id: int) -> Optional[Order]:
+        """Get an order by ID."""
+        shard = self._shard_for_order_id(order_id)
+        if shard is None:
+            return None
+        return self._call(shard, "get_order", order_id)
+
+    def get_bbo(self, symbol: str) -> Optional[BBO]:
+        """Get the best bid and offer for a symbol."""
+        return self._call(self.shard_for(symbol), "get_bbo", symbol)
+
+    def get_order_book_snapshot(self, symbol: str, depth: Optional[int] = 10) -> Optional[OrderBookUpdate]:
+        """Get a snapshot of the order book for a symbol, with every level if depth is None."""
+        return self._call(self.shard_for(symbol), "get_order_book_snapshot", symbol, depth)
+    
+    def get_order_book_changes(
+        self,
+        symbol: str,
+        after_sequence: int,
+        with_snapshot: bool = False
+    ) -> Tuple[Optional[List[LevelChange]], Optional[OrderBookUpdate]]:
+        """Get the price level changes of a symbol's book after a sequence number, and a snapshot if needed."""
+        return self._call(self.shard_for(symbol), "get_order_book_changes", symbol, after_sequence, with_snapshot)
+
+    def publish_snapshots(self, symbols: Optional[List[str]] = None) -> None:
+        """Publish the BBO and full order book of the given symbols, or of every symbol, from their shards."""
+        if symbols is None:
+            calls = {shard: ("publish_snapshots", (None,)) for shard in range(self.num_shards)}
+        else:
+            symbols_by_shard: Dict[int, List[str]] = {}
+            for symbol in symbols:
+                symbols_by_shard.setdefault(self.shard_for(symbol), []).append(symbol)
+            calls = {shard: ("publish_snapshots", (shard_symbols,)) for shard, shard_symbols in symbols_by_shard.items()}
+        self._call_all(calls)
+    
+    def get_quote(self, symbol: str, side: OrderSide, quantity: int) -> Tuple[int, int, Optional[int]]:
+        """Estimate the fill of a market order without placing it."""
+        return self._call(self.shard_for(symbol), "get_quote", symbol, side, quantity)
+
+    def get_recent_trades(self, symbol: str, limit: int = 100, include_history: bool = False) -> List[Trade]:
+        """Get recent trades for a symbol, newest first."""
+        return self._call(self.shard_for(symbol), "get_recent_trades", symbol, limit, include_history)
+
+    def set_fee_schedule(self, symbol: str, maker_rate: float, taker_rate: float) -> None:
+        """Set a custom fee schedule for a symbol."""
+        self._call(self.shard_for(symbol), "set_fee_schedule", symbol, maker_rate, taker_rate)
+
+    def set_default_fee_rates(self, maker_rate: float, taker_rate: float) -> None:
+        """Set the default fee rates in every shard."""
+        self._call_all({shard: ("set_default_fee_rates", (maker_rate, taker_rate)) for shard in range(self.num_shards)})
+
+    def get_fee_schedule(self, symbol: str) -> dict:
+        """Get the fee schedule for a symbol."""
+        return self._call(self.shard_for(symbol), "get_fee_schedule", symbol)
+
+    def get_instrument(self, symbol: str) -> Instrument:
+        """Get the tick and lot size for a symbol."""
+        instrument = self.instruments.get(symbol)
+        if instrument is None:
+            instrument = self._call(self.shard_for(symbol), "get_instrument", symbol)
+            if symbol in self.book_symbols:
+                self.instruments[symbol] = instrument
+        return instrument
+
+    def set_instrument(self, symbol: str, tick_size: Number, lot_size: Number) -> Instrument:
+        """
+        Set the tick and lot size for a symbol.
+        Raises ValueError if the symbol already has resting or pending orders.
+        """
+        instrument = self._call(self.shard_for(symbol), "set_instrument", symbol, tick_size, lot_size)
+        self.instruments[symbol] = instrument
+        return instrument
+
+    def get_latency_histograms(self) -> Dict[Tuple[str, str], LatencyHistogram]:
+        """Get the per-stage latency histograms of every shard, merged."""
+        recorder = LatencyRecorder()
+        for histograms in self._call_all({shard: ("get_latency_histograms", ()) for shard in range(self.num_shards)}).values():
+            recorder.merge(histograms)
+        return recorder.histograms
+
+    def get_metrics(self) -> EngineMetrics:
+        """Get the counters and gauges of every shard, merged."""
+        metrics = EngineMetrics()
+        for shard_metrics in self._call_all({shard: ("get_metrics", ()) for shard in range(self.num_shards)}).values():
+            metrics.merge(shard_metrics)
+        return metrics
+    
+    def save_state(self) -> None:
+        """Save the state of every shard to its database."""
+        self._call_all({shard: ("save_state", ()) for shard in range(self.num_shards)})
+
+    def load_state(self) -> None:
+        """
+        Load the state of every shard from its database.
+        Order IDs issued by the router continue after the last IDs the shards saw.
+        """
+        self._call_all({shard: ("load_state", ()) for shard in range(self.num_shards)})
+        self.instruments.clear()
+        self.book_symbols = set(self.get_symbols())
+        last_ids = self._call_all({shard: ("last_id", ()) for shard in range(self.num_shards)})
+        for shard, last_id in last_ids.items():
+            self.id_generators[shard].advance_to(last_id)
+
+    def close(self) -> None:
+        """Stop the shard processes."""
+        for shard, conn in enumerate(self._connections):
+            with self._locks[shard]:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._connections:
+            conn.close()
+        logger.info("Sharded matching engine stopped")
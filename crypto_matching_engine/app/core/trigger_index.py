@@ -0,0 +1,84 @@
+from typing import Dict, Iterator, List, Optional
+from sortedcontainers import SortedDict
+
+from app.models.order import Order, OrderType, OrderSide
+
+
+class TriggerIndex:
+    """
+    Pending stop and take-profit orders for a single trading pair, indexed by stop price.
+
+    Orders are split by the direction the market has to move to trigger them:
+    - above: buy stop-loss, buy stop-limit and sell take-profit orders,
+      triggered when the price rises to or above their stop price
+    - below: sell stop-loss, sell stop-limit and buy take-profit orders,
+      triggered when the price falls to or below their stop price
+
+    Each side maps stop price -> orders at that price in arrival order, so a
+    trade batch only visits the orders it triggers, and a dictionary maps
+    order IDs to their orders for O(log n) cancellation.
+    """
+
+    def __init__(self):
+        self.above = SortedDict()  # Stop price -> {order ID -> order}
+        self.below = SortedDict()  # Stop price -> {order ID -> order}
+        self.orders_by_id: Dict[int, Order] = {}
+
+    def __len__(self) -> int:
+        return len(self.orders_by_id)
+
+    def __iter__(self) -> Iterator[Order]:
+        return iter(list(self.orders_by_id.values()))
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self.orders_by_id
+
+    def add(self, order: Order) -> None:
+        """Add a pending trigger order."""
+        side = self._side_for(order)
+        if order.stop_price not in side:
+            side[order.stop_price] = {}
+        side[order.stop_price][order.order_id] = order
+        self.orders_by_id[order.order_id] = order
+
+    def remove(self, order_id: int) -> Optional[Order]:
+        """Remove a pending trigger order by ID. Returns the order or None if not found."""
+        order = self.orders_by_id.pop(order_id, None)
+        if order is None:
+            return None
+
+        side = self._side_for(order)
+        orders = side[order.stop_price]
+        del orders[order_id]
+        if not orders:
+            del side[order.stop_price]
+        return order
+
+    def pop_triggered(self, low_price: int, high_price: int) -> List[Order]:
+        """
+        Remove and return the orders triggered by trades between low_price and high_price.
+        Orders nearest the trade prices come first, in arrival order at each stop price.
+        """
+        triggered = []
+
+        # Orders above trigger on a rise to their stop price (lowest stop first)
+        while self.above and self.above.peekitem(0)[0] <= high_price:
+            _, orders = self.above.popitem(0)
+            triggered.extend(orders.values())
+
+        # Orders below trigger on a fall to their stop price (highest stop first)
+        while self.below and self.below.peekitem(-1)[0] >= low_price:
+            _, orders = self.below.popitem(-1)
+            triggered.extend(orders.values())
+
+        for order in triggered:
+            del self.orders_by_id[order.order_id]
+        return triggered
+
+    def _side_for(self, order: Order) -> SortedDict:
+        """Get the side of the index an order belongs to."""
+        if order.order_type == OrderType.TAKE_PROFIT:
+            # Take profit on a buy when the price falls, on a sell when it rises
+            return self.below if order.side == OrderSide.BUY else self.above
+        # Stop on a buy when the price rises, on a sell when it falls
+        return self.above if order.side == OrderSide.BUY else self.below
@@ -0,0 +1,105 @@
+"""
+Logging pipeline for the trading app.
+
+Log records are put on an in-memory queue by the calling thread and formatted
+and written by a background listener thread, so the matching path never waits
+on string formatting or file I/O. Hot path events (orders, fills, cancels) are
+logged at DEBUG with lazy %-style arguments, so when verbose logging is off
+they cost one level check.
+
+An optional audit sink writes every order, trade and cancel as one compact JSON
+object per line through the "audit" logger.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+from typing import Any, List, Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Audit events are logged at INFO; the audit logger stays off until an audit sink is configured
+audit_logger = logging.getLogger("audit")
+audit_logger.propagate = False
+audit_logger.setLevel(logging.WARNING)
+
+# Listener threads draining the log queues
+_listeners: List[logging.handlers.QueueListener] = []
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves message formatting to the listener thread.
+    The standard QueueHandler formats each record before queueing it; here the
+    record is queued as is, so callers must only pass immutable log arguments.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats audit records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {"event": record.getMessage()}
+        event.update(getattr(record, "fields", {}))
+        return json.dumps(event, separators=(",", ":"), default=str)
+
+
+def audit_enabled() -> bool:
+    """Check if an audit sink is configured, before building audit events."""
+    return audit_logger.isEnabledFor(logging.INFO)
+
+
+def audit(event: str, obj: Any) -> None:
+    """
+    Write an audit event for an order or trade.
+    The object's fields are copied now, since it may change before the record is written.
+    """
+    fields = {name: getattr(obj, name) for name in obj.__slots__}
+    audit_logger.info(event, extra={"fields": fields})
+
+
+def configure_logging(log_file: Optional[str] = None, level: int = logging.INFO,
+                      audit_file: Optional[str] = None) -> None:
+    """
+    Route all logging through background listener threads.
+    Logs go to log_file (or stderr) at the given level; audit events go to
+    audit_file as JSON lines if it is set.
+    """
+    shutdown_logging()
+
+    # Application log
+    handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _start_listener(logging.getLogger(), handler)
+    logging.getLogger().setLevel(level)
+
+    # Audit log
+    if audit_file:
+        audit_handler = logging.FileHandler(audit_file)
+        audit_handler.setFormatter(JsonLinesFormatter())
+        _start_listener(audit_logger, audit_handler)
+        audit_logger.setLevel(logging.INFO)
+
+
+def shutdown_logging() -> None:
+    """Stop the listener threads after writing every queued record."""
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def _start_listener(target: logging.Logger, handler: logging.Handler) -> None:
+    """Replace the logger's handlers with a queue drained by a listener thread writing to handler."""
+    log_queue = queue.SimpleQueue()
+    for existing in list(target.handlers):
+        target.removeHandler(existing)
+    target.addHandler(DeferredQueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    _listeners.append(listener)
@@ -1,20 +1,30 @@
 import os
+import json
 import signal
 import logging
 import asyncio
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
+from fastapi.responses import Response
 from typing import List, Dict, Any, Optional
 
 from app.core.matching_engine import MatchingEngine
-from app.api.rest import app as rest_app
+from app.core.sharded_engine import ShardedMatchingEngine
+from app.core.sequencer import Sequencer, ShardedSequencer
+from app.core.publisher import MarketDataPublisher
+from app.core.latency import LatencyRecorder, api_latency, format_summary
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, PrometheusText
+from app.core.profiler import profiler
+from app.api.rest import app as rest_app, get_matching_engine as rest_get_matching_engine, get_sequencer as rest_get_sequencer
 from app.api.websocket import handle_websocket, ConnectionManager
 from app.persistence.persistence_manager import PersistenceManager
+from app.logging_setup import configure_logging, shutdown_logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='trading_app.log'
+# Configure logging: records are written by a background thread to LOG_FILE at LOG_LEVEL
+# (DEBUG logs every order and fill), and to an AUDIT_LOG of JSON lines if set
+configure_logging(
+    log_file=os.environ.get("LOG_FILE", "trading_app.log"),
+    level=getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper()),
+    audit_file=os.environ.get("AUDIT_LOG")
 )
 logger = logging.getLogger(__name__)
 
@@ -25,13 +35,69 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Create matching engine instance
-matching_engine = MatchingEngine()
-
-# Create persistence manager
+# Engine settings: keep the last TRADE_HISTORY_SIZE trades per symbol in memory
+# and up to TERMINAL_ORDER_CACHE_SIZE finished orders (evicted after TERMINAL_ORDER_MAX_AGE seconds if set);
+# LATENCY_HISTOGRAMS=0 turns off the engine's per-stage latency histograms
+terminal_order_max_age = os.environ.get("TERMINAL_ORDER_MAX_AGE")
+engine_options = dict(
+    trade_history_size=int(os.environ.get("TRADE_HISTORY_SIZE", "10000")),
+    terminal_order_cache_size=int(os.environ.get("TERMINAL_ORDER_CACHE_SIZE", "10000")),
+    terminal_order_max_age=float(terminal_order_max_age) if terminal_order_max_age else None,
+    record_latency=os.environ.get("LATENCY_HISTOGRAMS", "1") != "0"
+)
 db_path = os.environ.get("DB_PATH", "trading_app.db")
-persistence_manager = PersistenceManager(db_path)
-matching_engine.persistence_manager = persistence_manager
+
+# Profiler runs started from /admin/profiler/start are also written to PROFILE_DIR as collapsed stacks, if set
+profiler.output_dir = os.environ.get("PROFILE_DIR") or None
+
+# Order and trade updates go to a write-ahead journal (JOURNAL_PATH, empty to commit each batch to
+# SQLite directly) with JOURNAL_DURABILITY "sync" (default, fsync per command before it is acknowledged),
+# "group" (fsync every JOURNAL_GROUP_SIZE records or JOURNAL_GROUP_INTERVAL_US microseconds) or "async"
+# (no fsync); "group" and "async" acknowledge commands once written to the OS, before they are durable.
+# With a journal, each periodic save writes a binary snapshot of the books to SNAPSHOT_PATH (empty to
+# save the full state to SQLite instead) and restarts replay only the journal records written after it
+journal_path = os.environ.get("JOURNAL_PATH", "trading_app.journal") or None
+persistence_options = dict(
+    journal_path=journal_path,
+    snapshot_path=(os.environ.get("SNAPSHOT_PATH", "trading_app.snapshot") or None) if journal_path else None,
+    durability=os.environ.get("JOURNAL_DURABILITY", "sync"),
+    group_size=int(os.environ.get("JOURNAL_GROUP_SIZE", "256")),
+    group_interval_us=int(os.environ.get("JOURNAL_GROUP_INTERVAL_US", "1000"))
+)
+
+# Select order book backends ("sorted" or "dense"), e.g. DENSE_BOOK_SYMBOLS=BTC-USDT,ETH-USDT
+default_backend = os.environ.get("ORDER_BOOK_BACKEND", "sorted")
+
+# ENGINE_SHARDS=N runs the order books in N worker processes, with symbols assigned by hash
+# or by SHARD_SYMBOLS, e.g. SHARD_SYMBOLS=BTC-USDT:0,ETH-USDT:1; PIN_CPUS=1 pins each worker to a CPU
+# (shard processes import this module as __mp_main__ when the app is run with python -m app.main;
+# only the API process starts shards)
+engine_shards = int(os.environ.get("ENGINE_SHARDS", "0")) if __name__ != "__mp_main__" else 0
+persistence_manager = None
+if engine_shards:
+    symbol_shards = {}
+    for assignment in filter(None, os.environ.get("SHARD_SYMBOLS", "").split(",")):
+        symbol, shard = assignment.rsplit(":", 1)
+        symbol_shards[symbol.strip()] = int(shard)
+    matching_engine = ShardedMatchingEngine(
+        engine_shards,
+        symbol_shards=symbol_shards,
+        pin_cpus=os.environ.get("PIN_CPUS") == "1",
+        db_path=db_path,
+        persistence_options=persistence_options,
+        default_order_book_backend=default_backend,
+        **engine_options
+    )
+else:
+    matching_engine = MatchingEngine(**engine_options)
+    matching_engine.default_order_book_backend = default_backend
+    
+    # Create persistence manager
+    persistence_manager = PersistenceManager(db_path, **persistence_options)
+    matching_engine.persistence_manager = persistence_manager
+
+for symbol in filter(None, os.environ.get("DENSE_BOOK_SYMBOLS", "").split(",")):
+    matching_engine.set_order_book_backend(symbol.strip(), "dense")
 
 # Load state from database
 try:
@@ -41,8 +107,29 @@ except Exception as e:
     logger.error(f"Error loading state from database: {e}")
     logger.info("Starting with empty state")
 
+# The engine publishes trades and book changes for the WebSocket feeds as they happen
+publisher = MarketDataPublisher()
+matching_engine.publisher = publisher
+
+# From here on, every engine call goes through the sequencer's matching thread, or in sharded mode
+# through the sequencer thread of the shard it calls, so the shards serve requests in parallel
+sequencer = ShardedSequencer(matching_engine) if engine_shards else Sequencer(matching_engine)
+
 # Create WebSocket connection manager
-connection_manager = ConnectionManager(matching_engine)
+# WS_CONFLATION_MS merges a channel's updates per symbol and sends them at most once per interval,
+# e.g. WS_CONFLATION_MS=bbo:100,order_book:50 (unset channels are sent as they happen).
+# Each client has a send queue of up to WS_MAX_QUEUE messages; a client whose queue stays full for
+# WS_SLOW_CLIENT_TIMEOUT seconds, or whose send takes over WS_SEND_TIMEOUT seconds, is disconnected
+conflation = {}
+for setting in filter(None, os.environ.get("WS_CONFLATION_MS", "").split(",")):
+    channel, interval_ms = setting.rsplit(":", 1)
+    conflation[channel.strip()] = float(interval_ms) / 1000
+connection_manager = ConnectionManager(
+    matching_engine, sequencer, publisher, conflation,
+    max_queue=int(os.environ.get("WS_MAX_QUEUE", "1000")),
+    slow_client_timeout=float(os.environ.get("WS_SLOW_CLIENT_TIMEOUT", "5")),
+    send_timeout=float(os.environ.get("WS_SEND_TIMEOUT", "10"))
+)
 
 # Copy routes from the REST API
 for route in rest_app.routes:
@@ -67,18 +154,62 @@ async def websocket_trades_endpoint(websocket: WebSocket):
     await handle_websocket(websocket, "trades", connection_manager)
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Engine, persistence and WebSocket metrics in the Prometheus text format."""
+    text = PrometheusText()
+    engine_metrics = await sequencer.submit("get_metrics")
+    engine_metrics.write(text)
+    connection_manager.write_metrics(text)
+    return Response(content=text.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 # Dependency to get the matching engine
 def get_matching_engine():
     return matching_engine
 
 
+# Dependency to get the sequencer
+def get_sequencer():
+    return sequencer
+
+
+# Serve the copied REST routes from this app's engine rather than the REST module's own
+# (the routes look up overrides on the app they were declared on)
+rest_app.dependency_overrides[rest_get_matching_engine] = get_matching_engine
+rest_app.dependency_overrides[rest_get_sequencer] = get_sequencer
+
+
+def dump_latency():
+    """Log the latency percentiles recorded since startup, and write them to LATENCY_DUMP as JSON if set."""
+    recorder = LatencyRecorder()
+    recorder.merge(sequencer.call("get_latency_histograms"))
+    recorder.merge(api_latency.histograms)
+    if not recorder.histograms:
+        return
+    summary = recorder.summary()
+    logger.info("Latency percentiles (microseconds):\n%s", format_summary(summary))
+    dump_path = os.environ.get("LATENCY_DUMP")
+    if dump_path:
+        with open(dump_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+def close_engine():
+    """Close the database, or stop the shard processes, which close their databases."""
+    if persistence_manager:
+        persistence_manager.close()
+    if engine_shards:
+        matching_engine.close()
+
+
 # Periodic state saving
 async def save_state_periodically():
     """Save the engine state to the database periodically."""
     while True:
         try:
             await asyncio.sleep(60)  # Save every 60 seconds
-            matching_engine.save_state()
+            await sequencer.submit("save_state")
             logger.info("Periodic state save completed")
         except asyncio.CancelledError:
             break
@@ -91,13 +222,16 @@ def handle_shutdown(signal, frame):
     """Handle graceful shutdown."""
     logger.info("Shutdown signal received, saving state...")
     try:
-        matching_engine.save_state()
-        persistence_manager.close()
+        sequencer.call("save_state")
+        dump_latency()
+        sequencer.stop()
+        close_engine()
         logger.info("State saved, shutting down")
     except Exception as e:
         logger.error(f"Error saving state during shutdown: {e}")
     finally:
-        # Exit with success status
+        # Flush queued log records, then exit with success status
+        shutdown_logging()
         os._exit(0)
 
 
@@ -125,17 +259,29 @@ async def shutdown_event():
         except asyncio.CancelledError:
             pass
     
+    # Stop pushing market data before the engine stops
+    await connection_manager.stop_broadcasting()
+    
     # Save state one last time
     try:
-        matching_engine.save_state()
-        persistence_manager.close()
+        await sequencer.submit("save_state")
+        dump_latency()
+        sequencer.stop()
+        close_engine()
         logger.info("Final state save completed")
     except Exception as e:
         logger.error(f"Error during final state save: {e}")
     
     logger.info("Application shutdown")
+    shutdown_logging()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    # uvicorn pings WebSocket clients every WS_PING_INTERVAL seconds and closes those that do not
+    # answer within WS_PING_TIMEOUT, which ends their connection and removes them here
+    uvicorn.run(
+        "app.main:app", host="0.0.0.0", port=8000, reload=True,
+        ws_ping_interval=float(os.environ.get("WS_PING_INTERVAL", "20")),
+        ws_ping_timeout=float(os.environ.get("WS_PING_TIMEOUT", "20"))
+    )
@@ -0,0 +1,111 @@
+from decimal import Decimal
+from typing import Dict, Union
+from pydantic import BaseModel
+
+
+Number = Union[int, float, str, Decimal]
+
+# Ticks and lots are stored in signed 64-bit journal and database fields
+MAX_UNITS = 2 ** 63
+
+
+class Instrument(BaseModel):
+    """
+    Model representing the price and quantity increments of a trading pair.
+    The engine keeps prices as integer ticks and quantities as integer lots;
+    this model converts between those units and decimals at the API edges.
+    """
+    symbol: str
+    tick_size: Decimal  # Smallest price increment (e.g., 0.01)
+    lot_size: Decimal  # Smallest quantity increment (e.g., 0.00000001)
+
+    def price_to_ticks(self, price: Number) -> int:
+        """Convert a decimal price to an integer number of ticks."""
+        return self._to_units(price, self.tick_size, "Price")
+
+    def ticks_to_price(self, ticks: int) -> float:
+        """Convert an integer number of ticks to a decimal price."""
+        return float(ticks * self.tick_size)
+
+    def quantity_to_lots(self, quantity: Number) -> int:
+        """Convert a decimal quantity to an integer number of lots."""
+        return self._to_units(quantity, self.lot_size, "Quantity")
+
+    def lots_to_quantity(self, lots: int) -> float:
+        """Convert an integer number of lots to a decimal quantity."""
+        return float(lots * self.lot_size)
+
+    def notional(self, ticks: int, lots: int) -> float:
+        """Calculate the quote currency value of a quantity in lots at a price in ticks."""
+        return float(ticks * lots * self.tick_size * self.lot_size)
+
+    @staticmethod
+    def _to_units(value: Number, increment: Decimal, name: str) -> int:
+        """
+        Convert a decimal value to a whole number of increments.
+        The result must be positive and fit the 64-bit fields it is stored in.
+        """
+        try:
+            units = Decimal(str(value)) / increment
+        except ArithmeticError:
+            raise ValueError(f"{name} {value} is not a number")
+        if not units.is_finite():
+            raise ValueError(f"{name} {value} is not a finite number")
+        if units != units.to_integral_value():
+            raise ValueError(f"{name} {value} is not a multiple of {increment}")
+        if not 0 < units < MAX_UNITS:
+            raise ValueError(f"{name} {value} is out of range")
+        return int(units)
+
+
+class InstrumentRegistry:
+    """
+    Registry of instruments for the trading system.
+    Manages tick and lot sizes for different trading pairs.
+    """
+
+    def __init__(self):
+        # Default increments
+        self.default_tick_size = Decimal("0.01")
+        self.default_lot_size = Decimal("0.00000001")
+
+        # Instruments by symbol
+        self.instruments: Dict[str, Instrument] = {}
+
+    def get_instrument(self, symbol: str) -> Instrument:
+        """
+        Get the instrument for a symbol.
+        If no specific instrument exists, return one with default increments
+        without registering it, so looking up unknown symbols leaves the registry unchanged.
+        """
+        instrument = self.instruments.get(symbol)
+        if instrument is None:
+            instrument = Instrument(
+                symbol=symbol,
+                tick_size=self.default_tick_size,
+                lot_size=self.default_lot_size
+            )
+
+        return instrument
+
+    def register_instrument(self, symbol: str) -> Instrument:
+        """Register the instrument for a symbol with default increments, unless it already has one."""
+        if symbol not in self.instruments:
+            self.instruments[symbol] = self.get_instrument(symbol)
+
+        return self.instruments[symbol]
+
+    def set_instrument(self, symbol: str, tick_size: Number, lot_size: Number) -> Instrument:
+        """Set the tick and lot size for a symbol."""
+        tick_size = Decimal(str(tick_size))
+        lot_size = Decimal(str(lot_size))
+        if tick_size <= 0 or lot_size <= 0:
+            raise ValueError("Tick size and lot size must be positive")
+
+        self.instruments[symbol] = Instrument(
+            symbol=symbol,
+            tick_size=tick_size,
+            lot_size=lot_size
+        )
+
+        return self.instruments[symbol]
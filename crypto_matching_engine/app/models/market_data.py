@@ -1,10 +1,63 @@
 from datetime import datetime
-from typing import List, Tuple, Optional
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple, Optional
 from pydantic import BaseModel, Field
 
+from app.models.instrument import Instrument
+from app.models.order import OrderSide
+from app.core.clock import now_ns, ns_to_datetime
 
-class BBO(BaseModel):
-    """Best Bid and Offer model."""
+
+class BBO:
+    """
+    Best Bid and Offer model. Prices are in ticks and quantities in lots.
+    A plain slotted class, since the engine updates it on every book change;
+    convert to BBOView at the API boundary.
+    """
+    __slots__ = ("symbol", "bid_price", "bid_quantity", "ask_price", "ask_quantity", "timestamp")
+
+    def __init__(
+        self,
+        *,
+        symbol: str,
+        bid_price: Optional[int] = None,
+        bid_quantity: Optional[int] = None,
+        ask_price: Optional[int] = None,
+        ask_quantity: Optional[int] = None,
+        timestamp: Optional[int] = None  # nanoseconds since the epoch
+    ):
+        self.symbol = symbol
+        self.bid_price = bid_price
+        self.bid_quantity = bid_quantity
+        self.ask_price = ask_price
+        self.ask_quantity = ask_quantity
+        self.timestamp = timestamp if timestamp is not None else now_ns()
+
+    def copy(self) -> "BBO":
+        """Copy the BBO, e.g. to publish it while the book keeps updating the original."""
+        return BBO(symbol=self.symbol, bid_price=self.bid_price, bid_quantity=self.bid_quantity,
+                   ask_price=self.ask_price, ask_quantity=self.ask_quantity, timestamp=self.timestamp)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"BBO({fields})"
+
+
+class OrderBookUpdate(BaseModel):
+    """
+    Order book update model for L2 data. Prices are in ticks, quantities in lots
+    and the timestamp in nanoseconds since the epoch. The sequence number is
+    that of the last price level change the update includes.
+    """
+    timestamp: int = Field(default_factory=now_ns)
+    symbol: str
+    sequence: int = 0
+    asks: List[Tuple[int, int]] = []  # List of [price, quantity] pairs
+    bids: List[Tuple[int, int]] = []  # List of [price, quantity] pairs
+
+
+class BBOView(BaseModel):
+    """API representation of the Best Bid and Offer with decimal prices and quantities."""
     symbol: str
     bid_price: Optional[float] = None
     bid_quantity: Optional[float] = None
@@ -12,10 +65,151 @@ class BBO(BaseModel):
     ask_quantity: Optional[float] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+    @classmethod
+    def from_bbo(cls, bbo: BBO, instrument: Instrument) -> "BBOView":
+        """Convert an engine BBO to its API representation."""
+        return cls(
+            symbol=bbo.symbol,
+            bid_price=instrument.ticks_to_price(bbo.bid_price) if bbo.bid_price is not None else None,
+            bid_quantity=instrument.lots_to_quantity(bbo.bid_quantity) if bbo.bid_quantity is not None else None,
+            ask_price=instrument.ticks_to_price(bbo.ask_price) if bbo.ask_price is not None else None,
+            ask_quantity=instrument.lots_to_quantity(bbo.ask_quantity) if bbo.ask_quantity is not None else None,
+            timestamp=ns_to_datetime(bbo.timestamp)
+        )
 
-class OrderBookUpdate(BaseModel):
-    """Order book update model for L2 data."""
+    @staticmethod
+    def json_from_bbo(bbo: BBO, instrument: Instrument) -> Dict[str, Any]:
+        """
+        Get the fields of from_bbo(bbo, instrument).dict() as JSON-ready values,
+        without building the model, for messages encoded on every book change.
+        """
+        return {
+            "symbol": bbo.symbol,
+            "bid_price": instrument.ticks_to_price(bbo.bid_price) if bbo.bid_price is not None else None,
+            "bid_quantity": instrument.lots_to_quantity(bbo.bid_quantity) if bbo.bid_quantity is not None else None,
+            "ask_price": instrument.ticks_to_price(bbo.ask_price) if bbo.ask_price is not None else None,
+            "ask_quantity": instrument.lots_to_quantity(bbo.ask_quantity) if bbo.ask_quantity is not None else None,
+            "timestamp": ns_to_datetime(bbo.timestamp).isoformat()
+        }
+
+
+class OrderBookView(BaseModel):
+    """API representation of an L2 order book with decimal prices and quantities."""
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     symbol: str
+    sequence: int = 0  # Apply order book deltas with later sequence numbers on top
     asks: List[Tuple[float, float]] = []  # List of [price, quantity] pairs
     bids: List[Tuple[float, float]] = []  # List of [price, quantity] pairs
+
+    @classmethod
+    def from_update(cls, update: OrderBookUpdate, instrument: Instrument) -> "OrderBookView":
+        """Convert an engine order book update to its API representation."""
+        return cls(
+            timestamp=ns_to_datetime(update.timestamp),
+            symbol=update.symbol,
+            sequence=update.sequence,
+            asks=_convert_levels(update.asks, instrument),
+            bids=_convert_levels(update.bids, instrument)
+        )
+
+    @staticmethod
+    def json_from_update(update: OrderBookUpdate, instrument: Instrument) -> Dict[str, Any]:
+        """Get the fields of from_update(update, instrument).dict() as JSON-ready values, without building the model."""
+        return {
+            "timestamp": ns_to_datetime(update.timestamp).isoformat(),
+            "symbol": update.symbol,
+            "sequence": update.sequence,
+            "asks": _convert_levels(update.asks, instrument),
+            "bids": _convert_levels(update.bids, instrument)
+        }
+
+
+class OrderBookDeltaView(BaseModel):
+    """
+    API representation of the price level changes of an L2 order book between
+    two sequence numbers, as [price, new total quantity] pairs per side.
+    A quantity of 0 means the level was removed.
+    """
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    symbol: str
+    prev_sequence: int  # Sequence number the changes apply on top of
+    sequence: int  # Sequence number after the changes
+    asks: List[Tuple[float, float]] = []
+    bids: List[Tuple[float, float]] = []
+
+    @classmethod
+    def from_changes(cls, symbol: str, prev_sequence: int, changes: List[Tuple[int, OrderSide, int, int]],
+                     instrument: Instrument) -> "OrderBookDeltaView":
+        """
+        Convert engine level changes (sequence, side, ticks, lots) to their API
+        representation, keeping only the last change of each level.
+        """
+        asks, bids = _conflate_changes(changes)
+        return cls(
+            symbol=symbol,
+            prev_sequence=prev_sequence,
+            sequence=changes[-1][0] if changes else prev_sequence,
+            asks=_convert_levels(asks.items(), instrument),
+            bids=_convert_levels(bids.items(), instrument)
+        )
+
+    @staticmethod
+    def json_from_changes(symbol: str, prev_sequence: int, changes: List[Tuple[int, OrderSide, int, int]],
+                          instrument: Instrument) -> Dict[str, Any]:
+        """
+        Get the fields of from_changes(symbol, prev_sequence, changes, instrument).dict()
+        as JSON-ready values, without building the model.
+        """
+        asks, bids = _conflate_changes(changes)
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            "symbol": symbol,
+            "prev_sequence": prev_sequence,
+            "sequence": changes[-1][0] if changes else prev_sequence,
+            "asks": _convert_levels(asks.items(), instrument),
+            "bids": _convert_levels(bids.items(), instrument)
+        }
+
+
+class QuoteView(BaseModel):
+    """
+    API representation of the estimated execution of a market order
+    against the current book, with decimal prices and quantities.
+    """
+    symbol: str
+    side: str
+    quantity: float  # Requested quantity
+    filled_quantity: float  # Quantity available to fill
+    average_price: Optional[float] = None  # Volume-weighted average fill price
+    worst_price: Optional[float] = None  # Last price level reached
+    fully_filled: bool
+
+    @classmethod
+    def from_quote(cls, symbol: str, side: str, quantity: int, quote: Tuple[int, int, Optional[int]],
+                   instrument: Instrument) -> "QuoteView":
+        """Convert an engine quote (lots, ticks * lots, ticks) to its API representation."""
+        filled, notional, worst_price = quote
+        return cls(
+            symbol=symbol,
+            side=side,
+            quantity=instrument.lots_to_quantity(quantity),
+            filled_quantity=instrument.lots_to_quantity(filled),
+            average_price=float(Decimal(notional) / filled * instrument.tick_size) if filled else None,
+            worst_price=instrument.ticks_to_price(worst_price) if worst_price is not None else None,
+            fully_filled=filled >= quantity
+        )
+
+
+def _conflate_changes(changes: List[Tuple[int, OrderSide, int, int]]) -> Tuple[Dict[int, int], Dict[int, int]]:
+    """Get the last quantity of each level in a list of level changes, as (asks, bids) price -> quantity."""
+    levels = {OrderSide.BUY: {}, OrderSide.SELL: {}}
+    for _, side, price, quantity in changes:
+        levels[side][price] = quantity
+    return levels[OrderSide.SELL], levels[OrderSide.BUY]
+
+
+def _convert_levels(levels: Iterable[Tuple[int, int]], instrument: Instrument) -> List[Tuple[float, float]]:
+    """Convert (ticks, lots) price levels to (price, quantity) pairs."""
+    ticks_to_price, lots_to_quantity = instrument.ticks_to_price, instrument.lots_to_quantity
+    return [(ticks_to_price(p), lots_to_quantity(q)) for p, q in levels]
+
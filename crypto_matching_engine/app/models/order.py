@@ -1,8 +1,11 @@
 from enum import Enum
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
-import uuid
+from typing import Optional, List, Iterator
+from pydantic import BaseModel
+
+from app.models.instrument import Instrument
+from app.core.id_generator import default_id_generator
+from app.core.clock import now_ns, ns_to_datetime
 
 
 class OrderType(str, Enum):
@@ -29,30 +32,57 @@ class OrderStatus(str, Enum):
     PENDING_TRIGGER = "pending_trigger"  # for stop/take-profit orders waiting for trigger
 
 
-class Order(BaseModel):
-    order_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    symbol: str
-    order_type: OrderType
-    side: OrderSide
-    quantity: float
-    price: Optional[float] = None
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-    status: OrderStatus = OrderStatus.OPEN
-    filled_quantity: float = 0
-    remaining_quantity: float = None
-    stop_price: Optional[float] = None  # truigger price for stop orders
-    limit_price: Optional[float] = None  # limkit price for stop-limit orders
-
-    def __init__(self, **data):
-        super().__init__(**data)
-        if self.remaining_quantity is None:
-            self.remaining_quantity = self.quantity
+class Order:
+    """
+    Engine order. Prices are integer ticks and quantities are integer lots.
+    A plain slotted class rather than a pydantic model, since one is built for
+    every submitted order and held for every resting one; validation happens
+    in the matching engine and conversion to OrderView at the API boundary.
+    """
+    __slots__ = (
+        "order_id", "symbol", "order_type", "side", "quantity", "price", "timestamp", "status",
+        "filled_quantity", "remaining_quantity", "stop_price", "limit_price"
+    )
+
+    def __init__(
+        self,
+        *,
+        symbol: str,
+        order_type: OrderType,
+        side: OrderSide,
+        quantity: int,
+        price: Optional[int] = None,
+        order_id: Optional[int] = None,
+        timestamp: Optional[int] = None,  # nanoseconds since the epoch
+        status: OrderStatus = OrderStatus.OPEN,
+        filled_quantity: int = 0,
+        remaining_quantity: Optional[int] = None,
+        stop_price: Optional[int] = None,  # truigger price for stop orders
+        limit_price: Optional[int] = None  # limkit price for stop-limit orders
+    ):
+        self.order_id = order_id if order_id is not None else default_id_generator.next_id()
+        self.symbol = symbol
+        self.order_type = OrderType(order_type)
+        self.side = OrderSide(side)
+        self.quantity = quantity
+        self.price = price
+        self.timestamp = timestamp if timestamp is not None else now_ns()
+        self.status = OrderStatus(status)
+        self.filled_quantity = filled_quantity
+        self.remaining_quantity = remaining_quantity if remaining_quantity is not None else quantity
+        self.stop_price = stop_price
+        self.limit_price = limit_price
             
-        # setting initial status for stop and take-profit orders
-        if self.order_type in [OrderType.STOP_LOSS, OrderType.STOP_LIMIT, OrderType.TAKE_PROFIT]:
+        # setting initial status for new stop and take-profit orders
+        if self.status == OrderStatus.OPEN and \
+           self.order_type in (OrderType.STOP_LOSS, OrderType.STOP_LIMIT, OrderType.TAKE_PROFIT):
             self.status = OrderStatus.PENDING_TRIGGER
 
-    def is_marketable(self, best_price: float) -> bool:
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Order({fields})"
+
+    def is_marketable(self, best_price: int) -> bool:
         """Check if the order is marketable against the given best price."""
         if self.order_type == OrderType.MARKET:
             return True
@@ -61,7 +91,7 @@ class Order(BaseModel):
         else:  # SELL
             return self.price <= best_price if best_price else False
 
-    def update_on_fill(self, fill_qty: float) -> None:
+    def update_on_fill(self, fill_qty: int) -> None:
         """Update order after a fill."""
         self.filled_quantity += fill_qty
         self.remaining_quantity -= fill_qty
@@ -71,7 +101,7 @@ class Order(BaseModel):
         else:
             self.status = OrderStatus.PARTIALLY_FILLED
             
-    def is_triggered(self, last_price: float) -> bool:
+    def is_triggered(self, last_price: int) -> bool:
         """
         Check if a stop or take-profit order is triggered by the last trade price.
         
@@ -101,33 +131,85 @@ class Order(BaseModel):
         return False
 
 
-class OrderBookEntry(BaseModel):
-    """Represents an entry in the order book."""
-    price: float
-    orders: List[Order] = Field(default_factory=list)
-    total_quantity: float = 0
+class OrderNode:
+    """
+    Node of the doubly-linked FIFO queue kept at each price level.
+    The order book stores these nodes in its order ID lookup so that an order
+    can be unlinked from its level without searching the queue.
+    """
+    __slots__ = ("order", "level", "prev", "next")
+
+    def __init__(self, order: Order, level: "OrderBookEntry"):
+        self.order = order
+        self.level = level
+        self.prev: Optional["OrderNode"] = None
+        self.next: Optional["OrderNode"] = None
+
+
+class OrderBookEntry:
+    """
+    Represents a price level in the order book.
+    Orders are kept in a doubly-linked FIFO queue, so appending, filling at the
+    front and canceling from anywhere in the queue are all O(1).
+    """
+    __slots__ = ("price", "head", "tail", "order_count", "total_quantity")
+
+    def __init__(self, price: int):
+        self.price = price
+        self.head: Optional[OrderNode] = None
+        self.tail: Optional[OrderNode] = None
+        self.order_count = 0
+        self.total_quantity = 0
+
+    def __len__(self) -> int:
+        return self.order_count
+
+    def __iter__(self) -> Iterator[Order]:
+        node = self.head
+        while node is not None:
+            yield node.order
+            node = node.next
 
-    def add_order(self, order: Order) -> None:
-        """Add an order to this price level."""
-        self.orders.append(order)
+    @property
+    def orders(self) -> List[Order]:
+        """Orders at this price level in time priority order."""
+        return list(self)
+
+    def add_order(self, order: Order) -> OrderNode:
+        """Append an order to the back of the queue and return its node."""
+        node = OrderNode(order, self)
+        if self.tail is None:
+            self.head = node
+        else:
+            node.prev = self.tail
+            self.tail.next = node
+        self.tail = node
+        self.order_count += 1
         self.total_quantity += order.remaining_quantity
+        return node
 
-    def remove_order(self, order_id: str) -> Optional[Order]:
-        """Remove an order from this price level."""
-        for i, order in enumerate(self.orders):
-            if order.order_id == order_id:
-                removed_order = self.orders.pop(i)
-                self.total_quantity -= removed_order.remaining_quantity
-                return removed_order
-        return None
+    def remove_node(self, node: OrderNode) -> Order:
+        """Unlink a node from the queue and return its order."""
+        if node.prev is None:
+            self.head = node.next
+        else:
+            node.prev.next = node.next
+        if node.next is None:
+            self.tail = node.prev
+        else:
+            node.next.prev = node.prev
+        node.prev = node.next = None
+        self.order_count -= 1
+        self.total_quantity -= node.order.remaining_quantity
+        return node.order
 
-    def update_quantity(self) -> None:
-        """Recalculate the total quantity at this price level."""
-        self.total_quantity = sum(order.remaining_quantity for order in self.orders)
+    def reduce_quantity(self, fill_qty: int) -> None:
+        """Account for a fill against an order resting at this level."""
+        self.total_quantity -= fill_qty
 
 
 class OrderSubmission(BaseModel):
-    """Model for order submission API."""
+    """Model for order submission API. Prices and quantities are decimals."""
     symbol: str
     order_type: OrderType
     side: OrderSide
@@ -138,7 +220,41 @@ class OrderSubmission(BaseModel):
 
 
 class OrderResponse(BaseModel):
-    """Response model for order submission."""
+    """Response model for order submission. IDs are rendered as strings."""
     order_id: str
     status: str
     message: str = ""
+
+
+class OrderView(BaseModel):
+    """API representation of an order with decimal prices and quantities and a string ID."""
+    order_id: str
+    symbol: str
+    order_type: OrderType
+    side: OrderSide
+    quantity: float
+    price: Optional[float] = None
+    timestamp: datetime
+    status: OrderStatus
+    filled_quantity: float
+    remaining_quantity: float
+    stop_price: Optional[float] = None
+    limit_price: Optional[float] = None
+
+    @classmethod
+    def from_order(cls, order: Order, instrument: Instrument) -> "OrderView":
+        """Convert an engine order to its API representation."""
+        return cls(
+            order_id=str(order.order_id),
+            symbol=order.symbol,
+            order_type=order.order_type,
+            side=order.side,
+            quantity=instrument.lots_to_quantity(order.quantity),
+            price=instrument.ticks_to_price(order.price) if order.price is not None else None,
+            timestamp=ns_to_datetime(order.timestamp),
+            status=order.status,
+            filled_quantity=instrument.lots_to_quantity(order.filled_quantity),
+            remaining_quantity=instrument.lots_to_quantity(order.remaining_quantity),
+            stop_price=instrument.ticks_to_price(order.stop_price) if order.stop_price is not None else None,
+            limit_price=instrument.ticks_to_price(order.limit_price) if order.limit_price is not None else None
+        )
@@ -1,19 +1,107 @@
 from datetime import datetime
-from pydantic import BaseModel, Field
-import uuid
+from typing import Any, Dict, Optional
+from pydantic import BaseModel
 
+from app.models.instrument import Instrument
+from app.core.id_generator import default_id_generator
+from app.core.clock import now_ns, ns_to_datetime
 
-class Trade(BaseModel):
-    """Model representing a trade execution."""
-    trade_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class Trade:
+    """
+    Model representing a trade execution. Price is in ticks and quantity in lots.
+    A plain slotted class, since one is built for every fill; convert to
+    TradeView at the API boundary.
+    """
+    __slots__ = (
+        "trade_id", "timestamp", "symbol", "price", "quantity", "aggressor_side", "maker_order_id",
+        "taker_order_id", "maker_fee", "taker_fee", "maker_fee_rate", "taker_fee_rate"
+    )
+
+    def __init__(
+        self,
+        *,
+        symbol: str,
+        price: int,
+        quantity: int,
+        aggressor_side: str,  # "buy" or "sell"
+        maker_order_id: int,
+        taker_order_id: int,
+        trade_id: Optional[int] = None,
+        timestamp: Optional[int] = None,  # nanoseconds since the epoch
+        maker_fee: float = 0.0,  # Fee paid by the maker
+        taker_fee: float = 0.0,  # Fee paid by the taker
+        maker_fee_rate: float = 0.0,  # Fee rate applied to maker
+        taker_fee_rate: float = 0.0  # Fee rate applied to taker
+    ):
+        self.trade_id = trade_id if trade_id is not None else default_id_generator.next_id()
+        self.timestamp = timestamp if timestamp is not None else now_ns()
+        self.symbol = symbol
+        self.price = price
+        self.quantity = quantity
+        self.aggressor_side = aggressor_side
+        self.maker_order_id = maker_order_id
+        self.taker_order_id = taker_order_id
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.maker_fee_rate = maker_fee_rate
+        self.taker_fee_rate = taker_fee_rate
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Trade({fields})"
+
+
+class TradeView(BaseModel):
+    """API representation of a trade with decimal price and quantity and string IDs."""
+    trade_id: str
+    timestamp: datetime
     symbol: str
     price: float
     quantity: float
-    aggressor_side: str  # "buy" or "sell"
+    aggressor_side: str
     maker_order_id: str
     taker_order_id: str
-    maker_fee: float = 0.0  # Fee paid by the maker
-    taker_fee: float = 0.0  # Fee paid by the taker
-    maker_fee_rate: float = 0.0  # Fee rate applied to maker
-    taker_fee_rate: float = 0.0  # Fee rate applied to taker
+    maker_fee: float
+    taker_fee: float
+    maker_fee_rate: float
+    taker_fee_rate: float
+
+    @classmethod
+    def from_trade(cls, trade: Trade, instrument: Instrument) -> "TradeView":
+        """Convert an engine trade to its API representation."""
+        return cls(
+            trade_id=str(trade.trade_id),
+            timestamp=ns_to_datetime(trade.timestamp),
+            symbol=trade.symbol,
+            price=instrument.ticks_to_price(trade.price),
+            quantity=instrument.lots_to_quantity(trade.quantity),
+            aggressor_side=trade.aggressor_side,
+            maker_order_id=str(trade.maker_order_id),
+            taker_order_id=str(trade.taker_order_id),
+            maker_fee=trade.maker_fee,
+            taker_fee=trade.taker_fee,
+            maker_fee_rate=trade.maker_fee_rate,
+            taker_fee_rate=trade.taker_fee_rate
+        )
+
+    @staticmethod
+    def json_from_trade(trade: Trade, instrument: Instrument) -> Dict[str, Any]:
+        """
+        Get the fields of from_trade(trade, instrument).dict() as JSON-ready values,
+        without building the model, for messages encoded on every fill.
+        """
+        return {
+            "trade_id": str(trade.trade_id),
+            "timestamp": ns_to_datetime(trade.timestamp).isoformat(),
+            "symbol": trade.symbol,
+            "price": instrument.ticks_to_price(trade.price),
+            "quantity": instrument.lots_to_quantity(trade.quantity),
+            "aggressor_side": getattr(trade.aggressor_side, "value", trade.aggressor_side),
+            "maker_order_id": str(trade.maker_order_id),
+            "taker_order_id": str(trade.taker_order_id),
+            "maker_fee": float(trade.maker_fee),
+            "taker_fee": float(trade.taker_fee),
+            "maker_fee_rate": float(trade.maker_fee_rate),
+            "taker_fee_rate": float(trade.taker_fee_rate)
+        }
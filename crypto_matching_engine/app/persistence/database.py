@@ -15,6 +15,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Version stored in PRAGMA user_version; bump it when a table's columns change
+SCHEMA_VERSION = 1
+
+ORDERS_TABLE = '''
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    order_type TEXT NOT NULL,
+    side TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price INTEGER,
+    stop_price INTEGER,
+    limit_price INTEGER,
+    timestamp INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    filled_quantity INTEGER NOT NULL,
+    remaining_quantity INTEGER NOT NULL
+)
+'''
+
+TRADES_TABLE = '''
+CREATE TABLE IF NOT EXISTS trades (
+    trade_id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    aggressor_side TEXT NOT NULL,
+    maker_order_id INTEGER NOT NULL,
+    taker_order_id INTEGER NOT NULL,
+    maker_fee REAL NOT NULL,
+    taker_fee REAL NOT NULL,
+    maker_fee_rate REAL NOT NULL,
+    taker_fee_rate REAL NOT NULL,
+    FOREIGN KEY (maker_order_id) REFERENCES orders (order_id),
+    FOREIGN KEY (taker_order_id) REFERENCES orders (order_id)
+)
+'''
+
+
 class Database:
     """SQLite database connection manager."""
     
@@ -28,7 +68,9 @@ class Database:
         """Connect to the SQLite database."""
         if self.conn is None:
             try:
-                self.conn = sqlite3.connect(self.db_path)
+                # The connection is opened at startup and used from the sequencer thread,
+                # which runs one engine call at a time
+                self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
                 self.conn.row_factory = sqlite3.Row  # Return rows as dictionaries
                 logger.info(f"Connected to database: {self.db_path}")
             except sqlite3.Error as e:
@@ -48,41 +90,39 @@ class Database:
         conn = self.connect()
         cursor = conn.cursor()
         
-        # Create orders table
+        # Check the schema version; empty tables of an earlier schema are recreated
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Database {self.db_path} has schema version {version}, "
+                f"but this version of the app supports up to {SCHEMA_VERSION}"
+            )
+        if version < SCHEMA_VERSION:
+            self._drop_legacy_tables(cursor)
+        
+        # Create orders and trades tables
+        cursor.execute(ORDERS_TABLE)
+        cursor.execute(TRADES_TABLE)
+        
+        # Index trades by time for recent trade queries
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trades_symbol_timestamp ON trades (symbol, timestamp)
+        ''')
+        
+        # Create instruments table (increments stored as decimal strings to stay exact)
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            order_id TEXT PRIMARY KEY,
-            symbol TEXT NOT NULL,
-            order_type TEXT NOT NULL,
-            side TEXT NOT NULL,
-            quantity REAL NOT NULL,
-            price REAL,
-            stop_price REAL,
-            limit_price REAL,
-            timestamp TEXT NOT NULL,
-            status TEXT NOT NULL,
-            filled_quantity REAL NOT NULL,
-            remaining_quantity REAL NOT NULL
+        CREATE TABLE IF NOT EXISTS instruments (
+            symbol TEXT PRIMARY KEY,
+            tick_size TEXT NOT NULL,
+            lot_size TEXT NOT NULL
         )
         ''')
         
-        # Create trades table
+        # Create id_sequences table (last issued Snowflake ID, so IDs keep increasing across restarts)
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trades (
-            trade_id TEXT PRIMARY KEY,
-            symbol TEXT NOT NULL,
-            price REAL NOT NULL,
-            quantity REAL NOT NULL,
-            timestamp TEXT NOT NULL,
-            aggressor_side TEXT NOT NULL,
-            maker_order_id TEXT NOT NULL,
-            taker_order_id TEXT NOT NULL,
-            maker_fee REAL NOT NULL,
-            taker_fee REAL NOT NULL,
-            maker_fee_rate REAL NOT NULL,
-            taker_fee_rate REAL NOT NULL,
-            FOREIGN KEY (maker_order_id) REFERENCES orders (order_id),
-            FOREIGN KEY (taker_order_id) REFERENCES orders (order_id)
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
         )
         ''')
         
@@ -110,5 +150,33 @@ class Database:
         VALUES (1, 0.001, 0.002)
         ''')
         
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
         logger.info("Database tables created")
+    
+    def _drop_legacy_tables(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Drop orders and trades tables created with the columns of an earlier schema (text IDs,
+        decimal prices and quantities, ISO timestamps) so they are recreated. Their rows cannot be
+        converted to ticks, lots and Snowflake IDs, so a database that holds any is refused.
+        """
+        expected_schema = sqlite3.connect(":memory:")
+        try:
+            for table, statement in (("trades", TRADES_TABLE), ("orders", ORDERS_TABLE)):
+                columns = cursor.execute(f'PRAGMA table_info({table})').fetchall()
+                if not columns:
+                    continue
+                expected_schema.execute(statement)
+                expected_columns = expected_schema.execute(f'PRAGMA table_info({table})').fetchall()
+                if [tuple(column) for column in columns] == expected_columns:
+                    continue
+                
+                if cursor.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:
+                    raise RuntimeError(
+                        f"Database {self.db_path} holds {table} in the schema of an earlier version, "
+                        f"which cannot be converted; move it aside or set DB_PATH to start a new database"
+                    )
+                cursor.execute(f'DROP TABLE {table}')
+                logger.info(f"Dropped empty {table} table of an earlier schema")
+        finally:
+            expected_schema.close()
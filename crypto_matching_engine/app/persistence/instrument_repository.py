@@ -0,0 +1,81 @@
+"""
+Repository for instrument persistence operations.
+"""
+import sqlite3
+import logging
+from decimal import Decimal
+from typing import List, Optional
+
+from app.models.instrument import Instrument
+from app.persistence.database import Database
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class InstrumentRepository:
+    """Repository for instrument persistence operations."""
+    
+    def __init__(self, database: Database):
+        """Initialize with database connection."""
+        self.db = database
+    
+    def save_instrument(self, instrument: Instrument) -> None:
+        """Save an instrument to the database."""
+        conn = self.db.connect()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+            INSERT OR REPLACE INTO instruments (
+                symbol, tick_size, lot_size
+            ) VALUES (?, ?, ?)
+            ''', (
+                instrument.symbol,
+                str(instrument.tick_size),
+                str(instrument.lot_size)
+            ))
+            
+            conn.commit()
+            logger.debug(f"Instrument saved for symbol: {instrument.symbol}")
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Error saving instrument for {instrument.symbol}: {e}")
+            raise
+    
+    def get_instrument(self, symbol: str) -> Optional[Instrument]:
+        """Get an instrument by symbol."""
+        conn = self.db.connect()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT * FROM instruments WHERE symbol = ?', (symbol,))
+            row = cursor.fetchone()
+            
+            if row:
+                return self._row_to_instrument(row)
+            return None
+        except sqlite3.Error as e:
+            logger.error(f"Error getting instrument for {symbol}: {e}")
+            raise
+    
+    def get_all_instruments(self) -> List[Instrument]:
+        """Get all instruments."""
+        conn = self.db.connect()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT * FROM instruments')
+            rows = cursor.fetchall()
+            
+            return [self._row_to_instrument(row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f"Error getting all instruments: {e}")
+            raise
+    
+    def _row_to_instrument(self, row: sqlite3.Row) -> Instrument:
+        """Convert a database row to an Instrument object."""
+        return Instrument(
+            symbol=row['symbol'],
+            tick_size=Decimal(row['tick_size']),
+            lot_size=Decimal(row['lot_size'])
+        )
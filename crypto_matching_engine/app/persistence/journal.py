@@ -0,0 +1,356 @@
+"""
+Append-only write-ahead journal for the matching engine.
+
+Every engine input (submitted orders, cancels) is journaled before it is
+applied, followed by its outputs (order updates, trades). Records are packed
+in a compact binary format, written once per command and fsynced in groups,
+so a burst of fills costs one write and one fsync instead of one SQLite commit
+per row. SQLite is then
+updated from the committed records by a background thread.
+"""
+import os
+import struct
+import logging
+import threading
+import zlib
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from app.models.order import Order, OrderType, OrderSide, OrderStatus
+from app.models.trade import Trade
+from app.core.clock import monotonic_ns
+from app.core.latency import LatencyHistogram
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Record kinds
+ORDER_COMMAND = 1  # Order as submitted, before matching
+CANCEL_COMMAND = 2  # Cancel request for an order ID
+ORDER_EVENT = 3  # Order state after a command
+TRADE_EVENT = 4  # Trade executed by a command
+
+# Durability modes; in GROUP and ASYNC mode a command returns once its records are written to the OS,
+# so they survive a process crash, but not yet fsynced, so a power failure can lose them
+SYNC = "sync"  # fsync after every command
+GROUP = "group"  # fsync every group_size records or group_interval_us microseconds
+ASYNC = "async"  # leave syncing to the OS
+DURABILITY_MODES = (SYNC, GROUP, ASYNC)
+
+# Record frame: payload length, CRC32 of kind, sequence and payload, kind, sequence number
+HEADER = struct.Struct("<IIBQ")
+# Order fields: ID, type, side, status, flags (price, stop price, limit price present),
+# quantity, filled, remaining, timestamp, price, stop price, limit price
+ORDER = struct.Struct("<QBBBBqqqqqqq")
+# Trade fields: ID, timestamp, price, quantity, aggressor side, maker and taker order IDs, fees and fee rates
+TRADE = struct.Struct("<QqqqBQQdddd")
+CANCEL = struct.Struct("<Q")
+
+ORDER_TYPES = list(OrderType)
+ORDER_SIDES = list(OrderSide)
+ORDER_STATUSES = list(OrderStatus)
+
+
+def encode_order(order: Order) -> bytes:
+    """Pack an order into a journal payload."""
+    flags = (order.price is not None) | (order.stop_price is not None) << 1 | (order.limit_price is not None) << 2
+    symbol = order.symbol.encode()
+    return ORDER.pack(
+        order.order_id,
+        ORDER_TYPES.index(order.order_type),
+        ORDER_SIDES.index(order.side),
+        ORDER_STATUSES.index(order.status),
+        flags,
+        order.quantity,
+        order.filled_quantity,
+        order.remaining_quantity,
+        order.timestamp,
+        order.price or 0,
+        order.stop_price or 0,
+        order.limit_price or 0
+    ) + symbol
+
+
+def decode_order(payload: bytes) -> Order:
+    """Unpack an order from a journal payload."""
+    (order_id, order_type, side, status, flags, quantity, filled_quantity, remaining_quantity,
+     timestamp, price, stop_price, limit_price) = ORDER.unpack_from(payload)
+    return Order(
+        order_id=order_id,
+        symbol=payload[ORDER.size:].decode(),
+        order_type=ORDER_TYPES[order_type],
+        side=ORDER_SIDES[side],
+        quantity=quantity,
+        price=price if flags & 1 else None,
+        timestamp=timestamp,
+        status=ORDER_STATUSES[status],
+        filled_quantity=filled_quantity,
+        remaining_quantity=remaining_quantity,
+        stop_price=stop_price if flags & 2 else None,
+        limit_price=limit_price if flags & 4 else None
+    )
+
+
+def encode_trade(trade: Trade) -> bytes:
+    """Pack a trade into a journal payload."""
+    return TRADE.pack(
+        trade.trade_id,
+        trade.timestamp,
+        trade.price,
+        trade.quantity,
+        ORDER_SIDES.index(OrderSide(trade.aggressor_side)),
+        trade.maker_order_id,
+        trade.taker_order_id,
+        trade.maker_fee,
+        trade.taker_fee,
+        trade.maker_fee_rate,
+        trade.taker_fee_rate
+    ) + trade.symbol.encode()
+
+
+def decode_trade(payload: bytes) -> Trade:
+    """Unpack a trade from a journal payload."""
+    (trade_id, timestamp, price, quantity, aggressor_side, maker_order_id, taker_order_id,
+     maker_fee, taker_fee, maker_fee_rate, taker_fee_rate) = TRADE.unpack_from(payload)
+    return Trade(
+        trade_id=trade_id,
+        timestamp=timestamp,
+        symbol=payload[TRADE.size:].decode(),
+        price=price,
+        quantity=quantity,
+        aggressor_side=ORDER_SIDES[aggressor_side].value,
+        maker_order_id=maker_order_id,
+        taker_order_id=taker_order_id,
+        maker_fee=maker_fee,
+        taker_fee=taker_fee,
+        maker_fee_rate=maker_fee_rate,
+        taker_fee_rate=taker_fee_rate
+    )
+
+
+def decode_record(kind: int, payload: bytes):
+    """Unpack the order, trade or order ID held by a record."""
+    if kind in (ORDER_COMMAND, ORDER_EVENT):
+        return decode_order(payload)
+    if kind == TRADE_EVENT:
+        return decode_trade(payload)
+    if kind == CANCEL_COMMAND:
+        return CANCEL.unpack(payload)[0]
+    raise ValueError(f"Unknown journal record kind: {kind}")
+
+
+def encode_record(kind: int, sequence: int, payload: bytes) -> bytes:
+    """Frame a payload as a record with its kind, sequence number and checksum."""
+    crc = zlib.crc32(payload, zlib.crc32(struct.pack("<BQ", kind, sequence)))
+    return HEADER.pack(len(payload), crc, kind, sequence) + payload
+
+
+def _read_frames(data: bytes) -> Iterator[Tuple[int, int, int, bytes]]:
+    """
+    Yield the (end offset, sequence, kind, payload) of each record framed in data.
+    Stops at the first incomplete or corrupt record.
+    """
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, crc, kind, sequence = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload, zlib.crc32(data[offset + 8:start])) != crc:
+            return
+        offset = start + length
+        yield offset, sequence, kind, payload
+
+
+def read_records(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Read the (sequence, kind, payload) records of a journal file in order.
+    Stops at the first incomplete or corrupt record, e.g. a write torn by a crash.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        data = f.read()
+
+    end = 0
+    for end, sequence, kind, payload in _read_frames(data):
+        yield sequence, kind, payload
+    if end < len(data):
+        logger.warning(f"Journal {path} ends with a torn record at offset {end}")
+
+
+def trim_torn_tail(path: str) -> None:
+    """Cut a journal file after its last intact record, so records appended later can be read back."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        data = f.read()
+
+    end = 0
+    for end, _, _, _ in _read_frames(data):
+        pass
+    if end < len(data):
+        logger.warning(f"Dropping torn record at offset {end} of journal {path}")
+        with open(path, "r+b") as f:
+            f.truncate(end)
+            os.fsync(f.fileno())
+
+
+class Journal:
+    """
+    Append-only binary journal with group commit.
+
+    Records are buffered in memory until their command commits, then written
+    to the file. In SYNC mode they are also fsynced before the engine call
+    returns; in GROUP mode the file is fsynced once group_size records are
+    pending or the oldest pending record is group_interval_us old, so a command
+    is acknowledged before its records are durable against a power failure;
+    in ASYNC mode the same timer closes groups without fsync.
+
+    Each closed group of (sequence, kind, payload) records is passed to
+    on_commit, e.g. to update SQLite downstream. The time taken to write (and
+    sync) each group is counted in write_latency. A write that fails partway
+    is cut back off the file before the records are written again.
+    """
+
+    def __init__(self, path: str, durability: str = SYNC, group_size: int = 256,
+                 group_interval_us: int = 1000, next_sequence: int = 1,
+                 on_commit: Optional[Callable[[List[Tuple[int, int, bytes]]], None]] = None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown journal durability: {durability}")
+        self.path = path
+        self.durability = durability
+        self.group_size = group_size
+        self.group_interval_ns = group_interval_us * 1000
+        self.next_sequence = next_sequence
+        self.written_sequence = next_sequence - 1  # Last record written to the file
+        self.on_commit = on_commit
+        self._file = open(path, "ab", buffering=0)
+        self._end = self._file.seek(0, os.SEEK_END)  # End of the last complete write
+        self._torn = False  # Whether a failed write may have left part of a record after _end
+        self._buffer = bytearray()
+        self._pending: List[Tuple[int, int, bytes]] = []
+        self._first_pending_ns = 0
+        self.write_latency = LatencyHistogram()
+        self._condition = threading.Condition()
+        self._closed = False
+
+        # Timer thread writing groups that did not fill up
+        self._flusher = None
+        if durability != SYNC:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="journal-flusher", daemon=True)
+            self._flusher.start()
+
+    def record_orders(self, kind: int, orders: List[Order]) -> None:
+        """Append order commands or order events."""
+        for order in orders:
+            self._append(kind, encode_order(order))
+
+    def record_trades(self, trades: List[Trade]) -> None:
+        """Append trade events."""
+        for trade in trades:
+            self._append(TRADE_EVENT, encode_trade(trade))
+
+    def record_cancel(self, order_id: int) -> None:
+        """Append a cancel command."""
+        self._append(CANCEL_COMMAND, CANCEL.pack(order_id))
+
+    def commit(self) -> None:
+        """
+        Mark the end of a command's records and write them to the file.
+        Closes the group now in SYNC mode, or once it is full in GROUP and ASYNC mode.
+        """
+        with self._condition:
+            if self.durability == SYNC or len(self._pending) >= self.group_size:
+                self._write(sync=self.durability != ASYNC)
+            else:
+                self._write_buffer()
+
+    def flush(self) -> None:
+        """Write and fsync every pending record."""
+        with self._condition:
+            self._write(sync=True)
+
+    def truncate(self) -> None:
+        """Discard the journal file's records, e.g. once they are all in the database. Sequence numbers continue."""
+        with self._condition:
+            self._write(sync=True)
+            self._file.truncate(0)
+            self._end = 0
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Write pending records and close the file."""
+        with self._condition:
+            if self._closed:
+                return
+            self._write(sync=True)
+            self._closed = True
+            self._condition.notify_all()
+        if self._flusher:
+            self._flusher.join()
+        self._file.close()
+
+    def stats(self) -> Tuple[int, LatencyHistogram]:
+        """Get the number of records waiting to be written and a copy of the group write latencies."""
+        with self._condition:
+            write_latency = LatencyHistogram()
+            write_latency.merge(self.write_latency)
+            return len(self._pending), write_latency
+
+    def _append(self, kind: int, payload: bytes) -> None:
+        """Buffer one record."""
+        with self._condition:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            self._buffer += encode_record(kind, sequence, payload)
+            if not self._pending:
+                self._first_pending_ns = monotonic_ns()
+                self._condition.notify()
+            self._pending.append((sequence, kind, payload))
+
+    def _write(self, sync: bool) -> None:
+        """Write the pending records as one group. The caller must hold the condition's lock."""
+        if not self._pending:
+            return
+        start_ns = monotonic_ns()
+        self._write_buffer()
+        if sync:
+            os.fsync(self._file.fileno())
+        self.write_latency.record(monotonic_ns() - start_ns)
+        records = self._pending
+        self.written_sequence = records[-1][0]
+        self._pending = []
+        if self.on_commit:
+            self.on_commit(records)
+
+    def _write_buffer(self) -> None:
+        """Write the buffered bytes to the file. The caller must hold the condition's lock."""
+        if self._torn:
+            # Drop what a failed write left behind, so the records are not framed after partial bytes
+            self._file.truncate(self._end)
+            self._torn = False
+        written = 0
+        try:
+            while written < len(self._buffer):
+                written += self._file.write(self._buffer[written:] if written else self._buffer)
+        except BaseException:
+            self._torn = True
+            raise
+        self._end += len(self._buffer)
+        self._buffer = bytearray()
+
+    def _flush_periodically(self) -> None:
+        """Write groups whose oldest record is group_interval_us old."""
+        with self._condition:
+            while not self._closed:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                wait_ns = self._first_pending_ns + self.group_interval_ns - monotonic_ns()
+                if wait_ns > 0:
+                    self._condition.wait(wait_ns / 1e9)
+                    continue
+                try:
+                    self._write(sync=self.durability == GROUP)
+                except Exception as e:
+                    logger.error(f"Error writing journal: {e}")
+                    self._condition.wait(self.group_interval_ns / 1e9)
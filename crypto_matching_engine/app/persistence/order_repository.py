@@ -4,7 +4,6 @@ Repository for order persistence operations.
 import sqlite3
 import logging
 from typing import List, Optional, Dict, Any
-from datetime import datetime
 
 from app.models.order import Order, OrderType, OrderSide, OrderStatus
 from app.persistence.database import Database
@@ -39,14 +38,14 @@ class OrderRepository:
                 order.price,
                 order.stop_price,
                 order.limit_price,
-                order.timestamp.isoformat(),
+                order.timestamp,
                 order.status.value,
                 order.filled_quantity,
                 order.remaining_quantity
             ))
             
             conn.commit()
-            logger.debug(f"Order saved: {order.order_id}")
+            logger.debug("Order saved: %s", order.order_id)
         except sqlite3.Error as e:
             conn.rollback()
             logger.error(f"Error saving order {order.order_id}: {e}")
@@ -73,20 +72,20 @@ class OrderRepository:
                     order.price,
                     order.stop_price,
                     order.limit_price,
-                    order.timestamp.isoformat(),
+                    order.timestamp,
                     order.status.value,
                     order.filled_quantity,
                     order.remaining_quantity
                 ))
             
             conn.commit()
-            logger.debug(f"Saved {len(orders)} orders")
+            logger.debug("Saved %s orders", len(orders))
         except sqlite3.Error as e:
             conn.rollback()
             logger.error(f"Error saving orders: {e}")
             raise
     
-    def get_order(self, order_id: str) -> Optional[Order]:
+    def get_order(self, order_id: int) -> Optional[Order]:
         """Get an order by ID."""
         conn = self.db.connect()
         cursor = conn.cursor()
@@ -150,7 +149,7 @@ class OrderRepository:
             logger.error(f"Error getting pending trigger orders for symbol {symbol}: {e}")
             raise
     
-    def delete_order(self, order_id: str) -> None:
+    def delete_order(self, order_id: int) -> None:
         """Delete an order from the database."""
         conn = self.db.connect()
         cursor = conn.cursor()
@@ -158,7 +157,7 @@ class OrderRepository:
         try:
             cursor.execute('DELETE FROM orders WHERE order_id = ?', (order_id,))
             conn.commit()
-            logger.debug(f"Order deleted: {order_id}")
+            logger.debug("Order deleted: %s", order_id)
         except sqlite3.Error as e:
             conn.rollback()
             logger.error(f"Error deleting order {order_id}: {e}")
@@ -173,7 +172,7 @@ class OrderRepository:
             side=OrderSide(row['side']),
             quantity=row['quantity'],
             price=row['price'],
-            timestamp=datetime.fromisoformat(row['timestamp']),
+            timestamp=row['timestamp'],
             status=OrderStatus(row['status']),
             filled_quantity=row['filled_quantity'],
             remaining_quantity=row['remaining_quantity'],
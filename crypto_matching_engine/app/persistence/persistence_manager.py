@@ -3,6 +3,9 @@ Persistence manager for the cryptocurrency matching engine.
 Coordinates persistence operations across repositories.
 """
 import logging
+import queue
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple
 
 from app.models.order import Order
@@ -10,40 +13,208 @@ from app.models.trade import Trade
 from app.models.fee import FeeSchedule, FeeModel
 from app.core.matching_engine import MatchingEngine
 from app.core.order_book import OrderBook
+from app.core.trigger_index import TriggerIndex
+from app.core.clock import monotonic_ns
+from app.core.latency import LatencyHistogram
+from app.core.metrics import EngineMetrics
 from app.persistence.database import Database
 from app.persistence.order_repository import OrderRepository
 from app.persistence.trade_repository import TradeRepository
 from app.persistence.fee_repository import FeeRepository
+from app.persistence.instrument_repository import InstrumentRepository
+from app.persistence.sequence_repository import SequenceRepository
+from app.persistence.journal import (
+    Journal, SYNC, ORDER_COMMAND, ORDER_EVENT, TRADE_EVENT, decode_order, decode_trade, read_records, trim_torn_tail
+)
+from app.persistence.snapshot import load_snapshot, replay_journal, write_snapshot
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Name of the order and trade ID sequence in the id_sequences table
+ID_SEQUENCE = "ids"
+# Name of the last journal record applied to the database in the id_sequences table
+JOURNAL_SEQUENCE = "journal"
+# Seconds before retrying journal records that failed to apply, doubling up to the maximum
+APPLY_RETRY_DELAY = 0.01
+APPLY_RETRY_MAX_DELAY = 1.0
+
 class PersistenceManager:
     """
     Manages persistence operations for the matching engine.
     Coordinates saving and loading of orders, trades, and fee schedules.
     """
     
-    def __init__(self, db_path: str = "trading_app.db"):
-        """Initialize the persistence manager."""
+    def __init__(self, db_path: str = "trading_app.db", journal_path: Optional[str] = None,
+                 durability: str = SYNC, group_size: int = 256, group_interval_us: int = 1000,
+                 snapshot_path: Optional[str] = None):
+        """
+        Initialize the persistence manager.
+        With a journal_path, order and trade updates are appended to a write-ahead
+        journal with group commit and copied to the database by a background
+        thread; otherwise each batch is committed to the database directly.
+        With a snapshot_path as well, saving the engine state writes a binary
+        snapshot instead, and the journal keeps the records written since, so
+        loading restores the snapshot and replays the journal's tail.
+        """
+        if snapshot_path and not journal_path:
+            raise ValueError("Snapshots need a journal to replay updates made after them")
+        self.snapshot_path = snapshot_path
         self.database = Database(db_path)
         self.order_repository = OrderRepository(self.database)
         self.trade_repository = TradeRepository(self.database)
         self.fee_repository = FeeRepository(self.database)
+        self.instrument_repository = InstrumentRepository(self.database)
+        self.sequence_repository = SequenceRepository(self.database)
+        self.commit_latency = LatencyHistogram()  # Batch commits to the database, without a journal
+        
+        self.journal: Optional[Journal] = None
+        if journal_path:
+            # Copy records committed before a crash to the database
+            next_sequence = self._recover_journal(journal_path)
+            
+            # The applier thread writes through its own connection; applied_sequence is the last
+            # journal record in the database, and apply_error is set while records fail to apply
+            self.applied_sequence = next_sequence - 1
+            self.apply_error: Optional[Exception] = None
+            self._applied = threading.Condition()
+            # Journal sequence holding the latest update of each order and trade of each symbol that may
+            # not be in the database yet, so reads only wait for those records; applied orders are pruned
+            self._order_sequences: "OrderedDict[int, int]" = OrderedDict()
+            self._trade_sequences: Dict[str, int] = {}
+            self._apply_database = Database(db_path)
+            self._apply_order_repository = OrderRepository(self._apply_database)
+            self._apply_trade_repository = TradeRepository(self._apply_database)
+            self._apply_sequence_repository = SequenceRepository(self._apply_database)
+            self._apply_queue = queue.Queue()
+            self._applier = threading.Thread(target=self._apply_committed, name="journal-applier", daemon=True)
+            self._applier.start()
+            
+            self.journal = Journal(journal_path, durability, group_size, group_interval_us,
+                                   next_sequence, on_commit=self._apply_queue.put)
         logger.info("Persistence manager initialized")
     
+    def record_order_commands(self, orders: List[Order]) -> None:
+        """Journal submitted orders before they are processed."""
+        if self.journal:
+            self.journal.record_orders(ORDER_COMMAND, orders)
+    
+    def record_cancel_command(self, order_id: int) -> None:
+        """Journal a cancel request before it is processed."""
+        if self.journal:
+            self.journal.record_cancel(order_id)
+    
+    def save_batch(self, orders: List[Order], trades: List[Trade]) -> None:
+        """Save updated orders and new trades, to the journal if there is one or else the database."""
+        if self.journal:
+            self.journal.record_orders(ORDER_EVENT, orders)
+            self.journal.record_trades(trades)
+            self._track_sequences(orders, trades)
+            return
+        
+        # One commit per table
+        start_ns = monotonic_ns()
+        if orders:
+            self.order_repository.save_orders(orders)
+        if trades:
+            self.trade_repository.save_trades(trades)
+        self.commit_latency.record(monotonic_ns() - start_ns)
+    
+    def commit(self) -> None:
+        """Mark the end of an engine command, committing its journal records as the durability mode requires."""
+        if self.journal:
+            self.journal.commit()
+    
+    def _track_sequences(self, orders: List[Order], trades: List[Trade]) -> None:
+        """Note the journal sequence of a batch's order updates and trades, and forget orders since applied."""
+        sequence = self.journal.next_sequence - 1
+        order_sequences = self._order_sequences
+        for order in orders:
+            order_sequences[order.order_id] = sequence
+            order_sequences.move_to_end(order.order_id)
+        for trade in trades:
+            self._trade_sequences[trade.symbol] = sequence
+        
+        # Entries are in sequence order, so the applied ones are at the front
+        applied_sequence = self.applied_sequence
+        while order_sequences and next(iter(order_sequences.values())) <= applied_sequence:
+            order_sequences.popitem(last=False)
+    
+    def wait_applied(self, sequence: Optional[int] = None) -> None:
+        """
+        Wait until the database has the journal records up to a sequence number, or
+        every record, writing them to the journal first if they are still buffered.
+        Raises RuntimeError if the applier is failing to copy them to the database.
+        """
+        if self.journal:
+            if sequence is None:
+                sequence = self.journal.next_sequence - 1
+            if sequence <= self.applied_sequence:
+                return
+            if sequence > self.journal.written_sequence:
+                self.journal.flush()
+            with self._applied:
+                while self.applied_sequence < sequence:
+                    if self.apply_error is not None:
+                        raise RuntimeError(f"Journal records are not applied to the database: {self.apply_error}")
+                    self._applied.wait()
+    
+    def write_metrics(self, metrics: EngineMetrics) -> None:
+        """Fill in the persistence queue depths and commit latencies of an engine metrics copy."""
+        if self.journal:
+            metrics.journal_pending, metrics.commit_latency = self.journal.stats()
+            metrics.apply_queue = self._apply_queue.qsize()
+        else:
+            metrics.commit_latency = LatencyHistogram()
+            metrics.commit_latency.merge(self.commit_latency)
+    
+    def get_order(self, order_id: int) -> Optional[Order]:
+        """Get an order from the database, including updates still in the journal."""
+        if self.journal:
+            sequence = self._order_sequences.get(order_id)
+            if sequence is not None:
+                self.wait_applied(sequence)
+        return self.order_repository.get_order(order_id)
+    
+    def get_trades_by_symbol(self, symbol: str, limit: int = 100) -> List[Trade]:
+        """Get recent trades for a symbol from the database, including trades still in the journal."""
+        if self.journal:
+            sequence = self._trade_sequences.get(symbol)
+            if sequence is not None:
+                self.wait_applied(sequence)
+        return self.trade_repository.get_trades_by_symbol(symbol, limit)
+    
     def save_engine_state(self, engine: MatchingEngine) -> None:
         """
         Save the current state of the matching engine to the database.
-        This includes all orders, trades, and fee schedules.
+        This includes all orders, trades, instruments and fee schedules.
         """
         try:
-            # Save all orders
+            # Bring the database up to date with the journal first
+            self.wait_applied()
+            
+            # Save the last issued ID
+            self.sequence_repository.save_last_id(ID_SEQUENCE, engine.id_generator.last_id)
+            
+            # The database already has every order and trade from the journal; snapshot the books
+            # and keep only the journal records written after the snapshot
+            if self.snapshot_path:
+                write_snapshot(engine, self.snapshot_path, self.journal.next_sequence - 1)
+                self.journal.truncate()
+                logger.info("Engine state saved to snapshot")
+                return
+            
+            # Save instruments
+            for instrument in engine.instruments.instruments.values():
+                self.instrument_repository.save_instrument(instrument)
+            
+            # Save live orders and the finished orders still cached in memory
             all_orders = list(engine.all_orders.values())
+            all_orders.extend(order for order, _ in engine.terminal_orders.values())
             self.order_repository.save_orders(all_orders)
             
-            # Save all trades
-            self.trade_repository.save_trades(engine.all_trades)
+            # Save the trades still held in memory
+            self.trade_repository.save_trades(list(engine.all_trades))
             
             # Save fee schedules
             for symbol, fee_schedule in engine.fee_model.fee_schedules.items():
@@ -55,6 +226,10 @@ class PersistenceManager:
                 engine.fee_model.default_taker_rate
             )
             
+            # The database now holds everything the journal did
+            if self.journal:
+                self.journal.truncate()
+            
             logger.info("Engine state saved to database")
         except Exception as e:
             logger.error(f"Error saving engine state: {e}")
@@ -63,16 +238,26 @@ class PersistenceManager:
     def load_engine_state(self, engine: MatchingEngine) -> None:
         """
         Load the matching engine state from the database.
-        This includes all orders, trades, and fee schedules.
+        This includes all orders, trades, instruments and fee schedules.
         """
         try:
-            # Load fee schedules first
-            default_maker_rate, default_taker_rate = self.fee_repository.get_default_fee_rates()
-            engine.fee_model.set_default_rates(default_maker_rate, default_taker_rate)
+            # Continue the ID sequence after the last ID issued before the restart
+            last_id = self.sequence_repository.get_last_id(ID_SEQUENCE)
+            if last_id is not None:
+                engine.id_generator.advance_to(last_id)
+            
+            # Restore the latest snapshot and the journal records written after it
+            if self.snapshot_path:
+                sequence = load_snapshot(engine, self.snapshot_path)
+                if sequence is not None:
+                    replay_journal(engine, self.journal.path, sequence)
+                    # Instruments and fee schedules changed since the snapshot are only in the database
+                    self._load_instruments_and_fees(engine)
+                    logger.info("Engine state loaded from snapshot and journal")
+                    return
             
-            fee_schedules = self.fee_repository.get_all_fee_schedules()
-            for fee_schedule in fee_schedules:
-                engine.fee_model.fee_schedules[fee_schedule.symbol] = fee_schedule
+            # Load instruments first so stored ticks and lots keep their meaning, then fee schedules
+            self._load_instruments_and_fees(engine)
             
             # Get all symbols from orders
             conn = self.database.connect()
@@ -97,23 +282,23 @@ class PersistenceManager:
                     if order.order_type.value == "limit":
                         # Add to the book directly to avoid matching
                         order_book._add_to_book(order)
-                        order_book.orders_by_id[order.order_id] = order
                 
                 # Add pending trigger orders
                 if pending_trigger_orders:
                     if symbol not in engine.pending_trigger_orders:
-                        engine.pending_trigger_orders[symbol] = []
+                        engine.pending_trigger_orders[symbol] = TriggerIndex()
                     
                     for order in pending_trigger_orders:
                         engine.all_orders[order.order_id] = order
-                        engine.pending_trigger_orders[symbol].append(order)
+                        engine.pending_trigger_orders[symbol].add(order)
                 
                 # Update BBO
                 order_book._update_bbo()
             
-            # Load recent trades
+            # Load recent trades, oldest first to match the in-memory history
             for symbol in symbols:
-                trades = self.trade_repository.get_trades_by_symbol(symbol, limit=1000)
+                trades = self.trade_repository.get_trades_by_symbol(symbol, limit=engine.trade_history_size)
+                trades.reverse()
                 engine.all_trades.extend(trades)
                 
                 # Add trades to the order book's trade history
@@ -125,6 +310,121 @@ class PersistenceManager:
             logger.error(f"Error loading engine state: {e}")
             raise
     
+    def _load_instruments_and_fees(self, engine: MatchingEngine) -> None:
+        """Load instruments, default fee rates and fee schedules from the database."""
+        for instrument in self.instrument_repository.get_all_instruments():
+            engine.instruments.instruments[instrument.symbol] = instrument
+        
+        default_maker_rate, default_taker_rate = self.fee_repository.get_default_fee_rates()
+        engine.fee_model.set_default_rates(default_maker_rate, default_taker_rate)
+        
+        for fee_schedule in self.fee_repository.get_all_fee_schedules():
+            engine.fee_model.fee_schedules[fee_schedule.symbol] = fee_schedule
+    
+    def _recover_journal(self, journal_path: str) -> int:
+        """
+        Apply journal records that did not reach the database before the last shutdown.
+        Without snapshots the journal is then emptied; with them it keeps the records
+        written since the last snapshot. Returns the sequence number for the next record.
+        """
+        applied = self.sequence_repository.get_saved_id(JOURNAL_SEQUENCE) or 0
+        last_sequence = applied
+        orders: Dict[int, Order] = {}
+        trades: List[Trade] = []
+        for sequence, kind, payload in read_records(journal_path):
+            last_sequence = max(last_sequence, sequence)
+            if sequence <= applied:
+                continue
+            if kind == ORDER_EVENT:
+                order = decode_order(payload)
+                orders[order.order_id] = order  # Latest state wins
+            elif kind == TRADE_EVENT:
+                trades.append(decode_trade(payload))
+        
+        if orders or trades:
+            self.order_repository.save_orders(list(orders.values()))
+            self.trade_repository.save_trades(trades)
+            logger.info(f"Recovered {len(orders)} orders and {len(trades)} trades from journal {journal_path}")
+        self.sequence_repository.save_last_id(JOURNAL_SEQUENCE, last_sequence)
+        
+        if self.snapshot_path:
+            # Keep the tail for replay, minus any torn record at its end
+            trim_torn_tail(journal_path)
+        else:
+            # Start the journal over, dropping any torn record at its end
+            open(journal_path, "wb").close()
+        return last_sequence + 1
+    
+    def _apply_committed(self) -> None:
+        """
+        Copy committed journal records to the database, merging queued groups into one transaction per table.
+        Groups that fail to apply, e.g. while another connection holds the database lock, are kept and
+        retried with the groups committed since, so the applied sequence never moves past a record the
+        database does not have.
+        """
+        pending: List[List[Tuple[int, int, bytes]]] = []  # Committed groups not applied yet, oldest first
+        retry_delay = APPLY_RETRY_DELAY
+        while True:
+            # Wait for committed groups, or after a failure at most until the next retry
+            try:
+                groups = [self._apply_queue.get(timeout=retry_delay if pending else None)]
+            except queue.Empty:
+                groups = []
+            while not self._apply_queue.empty():
+                groups.append(self._apply_queue.get_nowait())
+            stopping = None in groups
+            pending.extend(group for group in groups if group is not None)
+            if not pending:
+                return  # Closed with everything applied
+            
+            try:
+                self._apply_groups(pending)
+            except Exception as e:
+                logger.error(f"Error applying journal records {pending[0][0][0]}-{pending[-1][-1][0]} to database: {e}")
+                with self._applied:
+                    self.apply_error = e
+                    self._applied.notify_all()
+                if stopping:
+                    # They stay in the journal, which the next start applies from the saved sequence
+                    logger.error("Journal records left unapplied at shutdown; they will be applied on restart")
+                    return
+                retry_delay = min(retry_delay * 2, APPLY_RETRY_MAX_DELAY)
+                continue
+            
+            with self._applied:
+                self.applied_sequence = pending[-1][-1][0]
+                self.apply_error = None
+                self._applied.notify_all()
+            pending = []
+            retry_delay = APPLY_RETRY_DELAY
+            if stopping:
+                return
+    
+    def _apply_groups(self, groups: List[List[Tuple[int, int, bytes]]]) -> None:
+        """Write the orders and trades of journal groups to the database, then the last applied sequence."""
+        orders: Dict[int, Order] = {}
+        trades: List[Trade] = []
+        for records in groups:
+            for sequence, kind, payload in records:
+                if kind == ORDER_EVENT:
+                    order = decode_order(payload)
+                    orders[order.order_id] = order  # Latest state wins
+                elif kind == TRADE_EVENT:
+                    trades.append(decode_trade(payload))
+        
+        # Rows are written with INSERT OR REPLACE, so a retry after a partial failure writes the same state
+        if orders:
+            self._apply_order_repository.save_orders(list(orders.values()))
+        if trades:
+            self._apply_trade_repository.save_trades(trades)
+        self._apply_sequence_repository.save_last_id(JOURNAL_SEQUENCE, groups[-1][-1][0])
+    
     def close(self) -> None:
-        """Close the database connection."""
+        """Close the journal and the database connections."""
+        if self.journal:
+            self.journal.close()
+            self._apply_queue.put(None)
+            self._applier.join()
+            self._apply_database.close()
+            self.journal = None
         self.database.close()
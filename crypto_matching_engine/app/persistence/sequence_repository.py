@@ -0,0 +1,72 @@
+"""
+Repository for ID sequence persistence operations.
+"""
+import sqlite3
+import logging
+from typing import Optional
+
+from app.persistence.database import Database
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class SequenceRepository:
+    """Repository for the last issued order and trade ID."""
+    
+    def __init__(self, database: Database):
+        """Initialize with database connection."""
+        self.db = database
+    
+    def save_last_id(self, name: str, last_id: int) -> None:
+        """Save the last ID issued by a sequence."""
+        conn = self.db.connect()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+            INSERT OR REPLACE INTO id_sequences (name, last_id) VALUES (?, ?)
+            ''', (name, last_id))
+            
+            conn.commit()
+            logger.debug("Sequence %s saved at %s", name, last_id)
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Error saving sequence {name}: {e}")
+            raise
+    
+    def get_saved_id(self, name: str) -> Optional[int]:
+        """Get the value saved for a sequence, or None if none was saved."""
+        conn = self.db.connect()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT last_id FROM id_sequences WHERE name = ?', (name,))
+            row = cursor.fetchone()
+            
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Error getting sequence {name}: {e}")
+            raise
+    
+    def get_last_id(self, name: str) -> Optional[int]:
+        """
+        Get the highest ID known to have been issued by a sequence: the saved
+        value, or a higher order or trade ID stored since it was saved.
+        """
+        conn = self.db.connect()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+            SELECT MAX(last_id) FROM (
+                SELECT last_id FROM id_sequences WHERE name = ?
+                UNION ALL SELECT MAX(order_id) FROM orders
+                UNION ALL SELECT MAX(trade_id) FROM trades
+            )
+            ''', (name,))
+            row = cursor.fetchone()
+            
+            return row[0]
+        except sqlite3.Error as e:
+            logger.error(f"Error getting sequence {name}: {e}")
+            raise
@@ -4,7 +4,6 @@ Repository for trade persistence operations.
 import sqlite3
 import logging
 from typing import List, Optional, Dict, Any
-from datetime import datetime
 
 from app.models.trade import Trade
 from app.persistence.database import Database
@@ -36,7 +35,7 @@ class TradeRepository:
                 trade.symbol,
                 trade.price,
                 trade.quantity,
-                trade.timestamp.isoformat(),
+                trade.timestamp,
                 trade.aggressor_side,
                 trade.maker_order_id,
                 trade.taker_order_id,
@@ -47,7 +46,7 @@ class TradeRepository:
             ))
             
             conn.commit()
-            logger.debug(f"Trade saved: {trade.trade_id}")
+            logger.debug("Trade saved: %s", trade.trade_id)
         except sqlite3.Error as e:
             conn.rollback()
             logger.error(f"Error saving trade {trade.trade_id}: {e}")
@@ -71,7 +70,7 @@ class TradeRepository:
                     trade.symbol,
                     trade.price,
                     trade.quantity,
-                    trade.timestamp.isoformat(),
+                    trade.timestamp,
                     trade.aggressor_side,
                     trade.maker_order_id,
                     trade.taker_order_id,
@@ -82,13 +81,13 @@ class TradeRepository:
                 ))
             
             conn.commit()
-            logger.debug(f"Saved {len(trades)} trades")
+            logger.debug("Saved %s trades", len(trades))
         except sqlite3.Error as e:
             conn.rollback()
             logger.error(f"Error saving trades: {e}")
             raise
     
-    def get_trade(self, trade_id: str) -> Optional[Trade]:
+    def get_trade(self, trade_id: int) -> Optional[Trade]:
         """Get a trade by ID."""
         conn = self.db.connect()
         cursor = conn.cursor()
@@ -130,7 +129,7 @@ class TradeRepository:
             symbol=row['symbol'],
             price=row['price'],
             quantity=row['quantity'],
-            timestamp=datetime.fromisoformat(row['timestamp']),
+            timestamp=row['timestamp'],
             aggressor_side=row['aggressor_side'],
             maker_order_id=row['maker_order_id'],
             taker_order_id=row['taker_order_id'],
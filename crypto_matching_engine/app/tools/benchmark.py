@@ -0,0 +1,261 @@
+"""
+Microbenchmarks for the matching engine's hot paths.
+
+Each workload builds a synthetic book, then times one engine call per
+operation with time.perf_counter_ns. Orders are built and books refilled
+outside the timed calls, so the numbers cover the engine code only.
+
+Workloads:
+    deep_book       passive limit orders added across many price levels (OrderBook.add_order)
+    cancel_churn    random cancels in a deep book (OrderBook.cancel_order)
+    market_sweep    market orders sweeping several levels (OrderBook._match_order)
+    fok_storm       fill-or-kill orders, mostly too large to fill (OrderBook._can_fully_fill)
+    pending_stops   trade prices checked against thousands of stops (MatchingEngine._check_triggers)
+
+Usage:
+    python -m app.tools.benchmark
+    python -m app.tools.benchmark --workload market_sweep --ops 50000 --depth 500 --backend dense
+
+Prints JSON with ops/sec and p50/p99/p99.9 latencies in nanoseconds per
+workload, for comparing engine versions on the same machine.
+"""
+import argparse
+import gc
+import itertools
+import json
+import logging
+import platform
+import random
+import sys
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Optional
+
+from app.models.order import Order, OrderType, OrderSide
+from app.core.matching_engine import MatchingEngine, ORDER_BOOK_BACKENDS
+from app.core.order_book import OrderBook
+
+SYMBOL = "BTC-USDT"
+MID = 1_000_000  # Mid price in ticks; bids rest below it and asks above
+
+
+def summarize(latencies: List[int]) -> Dict[str, float]:
+    """Summarize per-operation latencies in nanoseconds."""
+    ordered = sorted(latencies)
+    total_ns = sum(ordered)
+
+    def percentile(fraction: float) -> int:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        "ops": len(ordered),
+        "ops_per_sec": round(len(ordered) * 1e9 / total_ns) if total_ns else None,
+        "p50_ns": percentile(0.5),
+        "p99_ns": percentile(0.99),
+        "p999_ns": percentile(0.999),
+        "max_ns": ordered[-1],
+    }
+
+
+class Workload:
+    """Builds orders and books for a benchmark from a seeded random generator."""
+
+    def __init__(self, seed: int, backend: str):
+        self.rng = random.Random(seed)
+        self.backend = backend
+        self.ids = itertools.count(1)
+
+    def book(self) -> OrderBook:
+        return ORDER_BOOK_BACKENDS[self.backend](SYMBOL)
+
+    def order(self, side: OrderSide, quantity: int, price: Optional[int] = None,
+              order_type: OrderType = OrderType.LIMIT, **fields) -> Order:
+        return Order(symbol=SYMBOL, order_type=order_type, side=side, quantity=quantity, price=price,
+                     order_id=next(self.ids), timestamp=0, **fields)
+
+    def passive_order(self, depth: int) -> Order:
+        """A limit order resting within depth ticks of the mid price, on a random side."""
+        offset = 1 + self.rng.randrange(depth)
+        if self.rng.random() < 0.5:
+            return self.order(OrderSide.BUY, self.rng.randint(1, 100), MID - offset)
+        return self.order(OrderSide.SELL, self.rng.randint(1, 100), MID + offset)
+
+    def ladder(self, book: OrderBook, depth: int, quantity: int = 10) -> None:
+        """Rest one order of the given quantity at each of depth levels on both sides."""
+        for offset in range(1, depth + 1):
+            book.add_order(self.order(OrderSide.BUY, quantity, MID - offset))
+            book.add_order(self.order(OrderSide.SELL, quantity, MID + offset))
+
+
+def deep_book(workload: Workload, ops: int, depth: int, **_) -> List[int]:
+    """Add passive limit orders to a book that grows to ops orders."""
+    book = workload.book()
+    orders = [workload.passive_order(depth) for _ in range(ops)]
+    latencies = []
+    for order in orders:
+        start = perf_counter_ns()
+        book.add_order(order)
+        latencies.append(perf_counter_ns() - start)
+    return latencies
+
+
+def cancel_churn(workload: Workload, ops: int, depth: int, **_) -> List[int]:
+    """Cancel random resting orders, replacing each so the book keeps its size."""
+    book = workload.book()
+    resting = []
+    for _ in range(depth * 4):
+        order = workload.passive_order(depth)
+        book.add_order(order)
+        resting.append(order.order_id)
+
+    rng = workload.rng
+    latencies = []
+    for _ in range(ops):
+        index = rng.randrange(len(resting))
+        order_id = resting[index]
+        start = perf_counter_ns()
+        book.cancel_order(order_id)
+        latencies.append(perf_counter_ns() - start)
+
+        replacement = workload.passive_order(depth)
+        book.add_order(replacement)
+        resting[index] = replacement.order_id
+    return latencies
+
+
+def market_sweep(workload: Workload, ops: int, depth: int, sweep_levels: int = 10, **_) -> List[int]:
+    """Send market orders that each take sweep_levels levels, refilling them afterwards."""
+    book = workload.book()
+    workload.ladder(book, depth)
+    latencies = []
+    for i in range(ops):
+        side = OrderSide.BUY if i % 2 == 0 else OrderSide.SELL
+        order = workload.order(side, 10 * sweep_levels, order_type=OrderType.MARKET)
+        start = perf_counter_ns()
+        book.add_order(order)
+        latencies.append(perf_counter_ns() - start)
+
+        # Put back the levels the sweep took
+        for offset in range(1, sweep_levels + 1):
+            if side == OrderSide.BUY:
+                book.add_order(workload.order(OrderSide.SELL, 10, MID + offset))
+            else:
+                book.add_order(workload.order(OrderSide.BUY, 10, MID - offset))
+    return latencies
+
+
+def fok_storm(workload: Workload, ops: int, depth: int, fill_ratio: float = 0.1, **_) -> List[int]:
+    """Send fill-or-kill orders; most ask for more than the book holds and are killed."""
+    book = workload.book()
+    workload.ladder(book, depth)
+    rng = workload.rng
+    latencies = []
+    for _ in range(ops):
+        side = OrderSide.BUY if rng.random() < 0.5 else OrderSide.SELL
+        sign = 1 if side == OrderSide.BUY else -1
+        if rng.random() < fill_ratio:
+            # Fits in the best level
+            price, quantity = MID + sign, rng.randint(1, 10)
+        else:
+            # More than everything up to a random price
+            levels = 1 + rng.randrange(depth)
+            price, quantity = MID + sign * levels, 10 * levels + 1
+        order = workload.order(side, quantity, price, order_type=OrderType.FOK)
+        start = perf_counter_ns()
+        book.add_order(order)
+        latencies.append(perf_counter_ns() - start)
+
+        # Top the best level back up after a fill
+        if order.filled_quantity:
+            resting_side = OrderSide.SELL if side == OrderSide.BUY else OrderSide.BUY
+            book.add_order(workload.order(resting_side, order.filled_quantity, price))
+    return latencies
+
+
+def pending_stops(workload: Workload, ops: int, stops: int, trigger_every: int = 10, **_) -> List[int]:
+    """
+    Check trade prices against stops pending at every tick around the book.
+    Every trigger_every-th check triggers the nearest stop, which fills as a
+    market order and is placed again.
+    """
+    engine = MatchingEngine()
+    engine.default_order_book_backend = workload.backend
+    # Deep best levels absorb the triggered market orders
+    engine.process_order(workload.order(OrderSide.BUY, 10 ** 12, MID - 1))
+    engine.process_order(workload.order(OrderSide.SELL, 10 ** 12, MID + 1))
+
+    def place_stop(side: OrderSide, stop_price: int) -> None:
+        engine.process_order(workload.order(side, 1, order_type=OrderType.STOP_LOSS, stop_price=stop_price))
+
+    # Buy stops above the book, sell stops below it
+    for offset in range(stops // 2):
+        place_stop(OrderSide.BUY, MID + 2 + offset)
+        place_stop(OrderSide.SELL, MID - 2 - offset)
+
+    latencies = []
+    for i in range(ops):
+        if i % trigger_every:
+            low = high = MID
+        elif i // trigger_every % 2:
+            low = high = MID + 2
+        else:
+            low = high = MID - 2
+        start = perf_counter_ns()
+        engine._check_triggers(SYMBOL, low, high)
+        latencies.append(perf_counter_ns() - start)
+
+        if low != MID:
+            place_stop(OrderSide.BUY if low > MID else OrderSide.SELL, low)
+    return latencies
+
+
+WORKLOADS: Dict[str, Callable[..., List[int]]] = {
+    "deep_book": deep_book,
+    "cancel_churn": cancel_churn,
+    "market_sweep": market_sweep,
+    "fok_storm": fok_storm,
+    "pending_stops": pending_stops,
+}
+
+
+def run(workloads: List[str], ops: int = 10000, depth: int = 1000, stops: int = 5000,
+        seed: int = 42, backend: str = "sorted") -> Dict[str, Dict]:
+    """Run the named workloads and return their summaries."""
+    results = {}
+    for name in workloads:
+        gc.collect()
+        latencies = WORKLOADS[name](Workload(seed, backend), ops=ops, depth=depth, stops=stops)
+        results[name] = summarize(latencies)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.tools.benchmark", description="Benchmark the matching engine.")
+    parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS),
+                        help="workload to run, may be repeated (default: all)")
+    parser.add_argument("--ops", type=int, default=10000, help="timed operations per workload")
+    parser.add_argument("--depth", type=int, default=1000, help="price levels per side")
+    parser.add_argument("--stops", type=int, default=5000, help="pending stop orders for pending_stops")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=sorted(ORDER_BOOK_BACKENDS), default="sorted")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "backend": args.backend,
+        "params": {"ops": args.ops, "depth": args.depth, "stops": args.stops, "seed": args.seed},
+        "workloads": run(args.workload or list(WORKLOADS), args.ops, args.depth, args.stops, args.seed, args.backend),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Deterministic replay of recorded order flow.
+
+Streams the order and cancel commands of a journal file (or a JSON lines
+file) through MatchingEngine.process_order and cancel_order in recorded
+order, without the API, the sequencer or persistence. Timestamps come from
+the recorded orders and trade IDs from a generator driven by those
+timestamps, so the same input always produces the same trades and books.
+
+Usage:
+    python -m app.tools.replay trading_app.journal
+    python -m app.tools.replay trading_app.journal --snapshot trading_app.snapshot --trades-out trades.jsonl
+
+JSON lines input holds one command per line, with prices in ticks and
+quantities in lots:
+    {"type": "order", "order_id": 1, "symbol": "BTC-USDT", "order_type": "limit", "side": "buy",
+     "quantity": 5, "price": 50000, "timestamp": 1700000000000000000}
+    {"type": "cancel", "order_id": 1}
+
+Prints a JSON summary with the command and trade counts, commands per second,
+and SHA-256 hashes of the trades and of the final books.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple, Union
+
+from app.models.order import Order, OrderStatus
+from app.models.trade import Trade
+from app.core.matching_engine import MatchingEngine, ORDER_BOOK_BACKENDS
+from app.core.id_generator import SnowflakeIdGenerator
+from app.persistence.journal import ORDER_COMMAND, CANCEL_COMMAND, decode_record, encode_order, encode_trade, read_records
+from app.persistence.snapshot import load_snapshot
+
+logger = logging.getLogger(__name__)
+
+Command = Tuple[int, int, Union[Order, int]]  # (sequence, ORDER_COMMAND or CANCEL_COMMAND, order or order ID)
+
+
+class ReplayClock:
+    """Clock that stands still at the time of the command being replayed."""
+
+    def __init__(self, start_ns: int = 0):
+        self.now_ns = start_ns
+
+    def __call__(self) -> int:
+        return self.now_ns
+
+    def advance_to(self, timestamp_ns: int) -> None:
+        """Move the clock forward to a recorded timestamp; it never moves back."""
+        if timestamp_ns > self.now_ns:
+            self.now_ns = timestamp_ns
+
+
+class TradeCollector:
+    """
+    Stands in for the persistence manager during a replay, keeping every trade
+    the engine saves, including those of triggered orders.
+    """
+
+    def __init__(self):
+        self.trades: List[Trade] = []
+
+    def record_order_commands(self, orders: List[Order]) -> None:
+        pass
+
+    def record_cancel_command(self, order_id: int) -> None:
+        pass
+
+    def save_batch(self, orders: List[Order], trades: List[Trade]) -> None:
+        self.trades.extend(trades)
+
+    def commit(self) -> None:
+        pass
+
+    def get_order(self, order_id: int) -> Optional[Order]:
+        return None
+
+    def get_trades_by_symbol(self, symbol: str, limit: int = 100) -> List[Trade]:
+        return []
+
+
+def read_commands(path: str, after_sequence: int = 0) -> Iterator[Command]:
+    """Stream the order and cancel commands recorded in a journal or JSON lines file."""
+    if path.endswith(".jsonl"):
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip() or line_number <= after_sequence:
+                    continue
+                command = json.loads(line)
+                if command.pop("type") == "cancel":
+                    yield line_number, CANCEL_COMMAND, command["order_id"]
+                else:
+                    yield line_number, ORDER_COMMAND, Order(**command)
+        return
+
+    for sequence, kind, payload in read_records(path):
+        if sequence > after_sequence and kind in (ORDER_COMMAND, CANCEL_COMMAND):
+            yield sequence, kind, decode_record(kind, payload)
+
+
+def create_engine(backend: str = "sorted", worker_id: int = 0) -> Tuple[MatchingEngine, ReplayClock, TradeCollector]:
+    """Create an engine whose clock and trade IDs are driven by the replayed commands."""
+    clock = ReplayClock()
+    engine = MatchingEngine(id_generator=SnowflakeIdGenerator(worker_id=worker_id, clock=clock), clock=clock)
+    engine.default_order_book_backend = backend
+    collector = TradeCollector()
+    engine.persistence_manager = collector
+    return engine, clock, collector
+
+
+def replay(engine: MatchingEngine, clock: ReplayClock, commands: Iterator[Command]) -> Tuple[int, int]:
+    """Run commands through the engine. Returns the number of orders and cancels replayed."""
+    orders = cancels = 0
+    for _, kind, command in commands:
+        if kind == ORDER_COMMAND:
+            clock.advance_to(command.timestamp)
+            engine.process_order(command)
+            orders += 1
+        else:
+            engine.cancel_order(command)
+            cancels += 1
+    return orders, cancels
+
+
+def book_hash(engine: MatchingEngine) -> str:
+    """
+    Hash the resting orders of every book in priority order and the pending
+    trigger orders, so two runs can be compared with one value.
+    """
+    digest = hashlib.sha256()
+    for symbol in sorted(engine.order_books):
+        order_book = engine.order_books[symbol]
+        for side in (order_book.bids, order_book.asks):
+            for entry in side.values():
+                for order in entry:
+                    digest.update(encode_order(order))
+    for symbol in sorted(engine.pending_trigger_orders):
+        for order in engine.pending_trigger_orders[symbol]:
+            digest.update(encode_order(order))
+    return digest.hexdigest()
+
+
+def trade_hash(trades: List[Trade]) -> str:
+    """Hash a list of trades, including their IDs, timestamps and fees."""
+    digest = hashlib.sha256()
+    for trade in trades:
+        digest.update(encode_trade(trade))
+    return digest.hexdigest()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.tools.replay", description="Replay recorded order flow.")
+    parser.add_argument("paths", nargs="+", help="journal or .jsonl files, replayed one after another")
+    parser.add_argument("--snapshot", help="snapshot to start from; journal commands it covers are skipped")
+    parser.add_argument("--trades-out", help="write the resulting trades to this file as JSON lines")
+    parser.add_argument("--backend", choices=sorted(ORDER_BOOK_BACKENDS), default="sorted",
+                        help="order book backend for new books")
+    parser.add_argument("--worker-id", type=int, default=0, help="worker ID of the trade ID generator (2N+1 for the journal of shard N)")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    engine, clock, collector = create_engine(args.backend, args.worker_id)
+    after_sequence = 0
+    if args.snapshot:
+        after_sequence = load_snapshot(engine, args.snapshot)
+        if after_sequence is None:
+            parser.error(f"no complete snapshot at {args.snapshot}")
+        # Start the clock at the snapshot's newest order or trade
+        for order in engine.all_orders.values():
+            clock.advance_to(order.timestamp)
+        for trade in engine.all_trades:
+            clock.advance_to(trade.timestamp)
+
+    orders = cancels = 0
+    start = time.perf_counter()
+    for path in args.paths:
+        path_orders, path_cancels = replay(engine, clock, read_commands(path, after_sequence))
+        orders += path_orders
+        cancels += path_cancels
+    elapsed = time.perf_counter() - start
+
+    if args.trades_out:
+        with open(args.trades_out, "w") as f:
+            for trade in collector.trades:
+                f.write(json.dumps({name: getattr(trade, name) for name in Trade.__slots__}) + "\n")
+
+    commands = orders + cancels
+    json.dump({
+        "commands": commands,
+        "orders": orders,
+        "cancels": cancels,
+        "trades": len(collector.trades),
+        "resting_orders": sum(len(order_book.orders_by_id) for order_book in engine.order_books.values()),
+        "pending_trigger_orders": sum(len(triggers) for triggers in engine.pending_trigger_orders.values()),
+        "elapsed_seconds": round(elapsed, 6),
+        "commands_per_second": round(commands / elapsed) if elapsed > 0 else None,
+        "trade_hash": trade_hash(collector.trades),
+        "book_hash": book_hash(engine),
+    }, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@ from datetime import datetime
 
 from app.models.order import Order, OrderType, OrderSide, OrderStatus
 from app.core.matching_engine import MatchingEngine
+from app.core.trigger_index import TriggerIndex
 
 
 def test_stop_loss_order():
@@ -14,8 +15,8 @@ def test_stop_loss_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     engine.process_order(buy_order)
     
@@ -24,8 +25,8 @@ def test_stop_loss_order():
         symbol="BTC-USDT",
         order_type=OrderType.STOP_LOSS,
         side=OrderSide.SELL,
-        quantity=0.5,
-        stop_price=49000.0  # Trigger when price falls to or below 49000
+        quantity=5,
+        stop_price=49000  # Trigger when price falls to or below 49000
     )
     
     # Process the stop-loss order
@@ -40,7 +41,7 @@ def test_stop_loss_order():
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.SELL,
-        quantity=1.0
+        quantity=10
     )
     
     # Process the market sell order
@@ -48,7 +49,7 @@ def test_stop_loss_order():
     
     # Check that a trade was executed at 50000
     assert len(trades) == 1
-    assert trades[0].price == 50000.0
+    assert trades[0].price == 50000
     
     # The stop-loss order should still be pending as the price hasn't gone below the trigger
     stop_loss_order_updated = engine.get_order(stop_loss_order.order_id)
@@ -59,8 +60,8 @@ def test_stop_loss_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=48000.0
+        quantity=10,
+        price=48000
     )
     engine.process_order(buy_order2)
     
@@ -69,7 +70,7 @@ def test_stop_loss_order():
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.SELL,
-        quantity=0.5
+        quantity=5
     )
     
     # Process the market sell order
@@ -77,12 +78,12 @@ def test_stop_loss_order():
     
     # Check that a trade was executed at 48000
     assert len(trades) == 1
-    assert trades[0].price == 48000.0
+    assert trades[0].price == 48000
     
     # The stop-loss order should now be triggered and executed
     stop_loss_order_final = engine.get_order(stop_loss_order.order_id)
     assert stop_loss_order_final.status == OrderStatus.FILLED
-    assert stop_loss_order_final.filled_quantity == 0.5
+    assert stop_loss_order_final.filled_quantity == 5
 
 
 def test_stop_limit_order():
@@ -94,8 +95,8 @@ def test_stop_limit_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     engine.process_order(buy_order)
     
@@ -104,9 +105,9 @@ def test_stop_limit_order():
         symbol="BTC-USDT",
         order_type=OrderType.STOP_LIMIT,
         side=OrderSide.BUY,
-        quantity=0.5,
-        stop_price=51000.0,  # Trigger when price rises to or above 51000
-        limit_price=51500.0   # But don't buy above 51500
+        quantity=5,
+        stop_price=51000,  # Trigger when price rises to or above 51000
+        limit_price=51500   # But don't buy above 51500
     )
     
     # Process the stop-limit order
@@ -121,8 +122,8 @@ def test_stop_limit_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=51200.0
+        quantity=10,
+        price=51200
     )
     
     # Process the limit sell order
@@ -133,7 +134,7 @@ def test_stop_limit_order():
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.BUY,
-        quantity=0.5
+        quantity=5
     )
     
     # Process the market buy order
@@ -141,15 +142,15 @@ def test_stop_limit_order():
     
     # Check that a trade was executed at 51200
     assert len(trades) == 1
-    assert trades[0].price == 51200.0
+    assert trades[0].price == 51200
     
     # The stop-limit order should now be triggered and converted to a limit order
     stop_limit_order_final = engine.get_order(stop_limit_order.order_id)
     
     # It should be filled against the remaining sell order
     assert stop_limit_order_final.status == OrderStatus.FILLED
-    assert stop_limit_order_final.filled_quantity == 0.5
-    assert stop_limit_order_final.price == 51500.0  # The limit price
+    assert stop_limit_order_final.filled_quantity == 5
+    assert stop_limit_order_final.price == 51500  # The limit price
 
 
 def test_take_profit_order():
@@ -161,8 +162,8 @@ def test_take_profit_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     engine.process_order(sell_order)
     
@@ -171,8 +172,8 @@ def test_take_profit_order():
         symbol="BTC-USDT",
         order_type=OrderType.TAKE_PROFIT,
         side=OrderSide.BUY,
-        quantity=0.5,
-        stop_price=49000.0  # Trigger when price falls to or below 49000
+        quantity=5,
+        stop_price=49000  # Trigger when price falls to or below 49000
     )
     
     # Process the take-profit order
@@ -187,8 +188,8 @@ def test_take_profit_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=48000.0
+        quantity=10,
+        price=48000
     )
     
     # Process the limit sell order
@@ -199,7 +200,7 @@ def test_take_profit_order():
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.BUY,
-        quantity=0.5
+        quantity=5
     )
     
     # Process the market buy order
@@ -207,12 +208,12 @@ def test_take_profit_order():
     
     # Check that a trade was executed at 48000
     assert len(trades) == 1
-    assert trades[0].price == 48000.0
+    assert trades[0].price == 48000
     
     # The take-profit order should now be triggered and executed
     take_profit_order_final = engine.get_order(take_profit_order.order_id)
     assert take_profit_order_final.status == OrderStatus.FILLED
-    assert take_profit_order_final.filled_quantity == 0.5
+    assert take_profit_order_final.filled_quantity == 5
 
 
 def test_cancel_pending_trigger_order():
@@ -224,8 +225,8 @@ def test_cancel_pending_trigger_order():
         symbol="BTC-USDT",
         order_type=OrderType.STOP_LOSS,
         side=OrderSide.SELL,
-        quantity=1.0,
-        stop_price=49000.0
+        quantity=10,
+        stop_price=49000
     )
     
     # Process the stop-loss order
@@ -244,3 +245,67 @@ def test_cancel_pending_trigger_order():
     
     # Check that the order is no longer in the pending trigger orders
     assert stop_loss_order.order_id not in [o.order_id for o in engine.pending_trigger_orders.get("BTC-USDT", [])]
+
+
+def test_trigger_index_directions():
+    """Test that the stop price index only pops the orders a price range triggers."""
+    index = TriggerIndex()
+    
+    buy_stop = Order(order_id=1, symbol="BTC-USDT", order_type=OrderType.STOP_LOSS,
+                     side=OrderSide.BUY, quantity=1, stop_price=51000)
+    sell_take_profit = Order(order_id=2, symbol="BTC-USDT", order_type=OrderType.TAKE_PROFIT,
+                             side=OrderSide.SELL, quantity=1, stop_price=50500)
+    sell_stop = Order(order_id=3, symbol="BTC-USDT", order_type=OrderType.STOP_LIMIT,
+                      side=OrderSide.SELL, quantity=1, stop_price=49000, limit_price=48900)
+    buy_take_profit = Order(order_id=4, symbol="BTC-USDT", order_type=OrderType.TAKE_PROFIT,
+                            side=OrderSide.BUY, quantity=1, stop_price=49500)
+    for order in (buy_stop, sell_take_profit, sell_stop, buy_take_profit):
+        index.add(order)
+    assert len(index) == 4
+    
+    # Trades between the stop prices trigger nothing
+    assert index.pop_triggered(49600, 50400) == []
+    
+    # A batch trading from 49400 up to 50600 triggers one order on each side
+    triggered = index.pop_triggered(49400, 50600)
+    assert triggered == [sell_take_profit, buy_take_profit]
+    assert 2 not in index and 4 not in index
+    
+    # Canceled orders are removed from their stop price
+    assert index.remove(1) is buy_stop
+    assert index.remove(1) is None
+    assert index.pop_triggered(1, 100000) == [sell_stop]
+    assert len(index) == 0
+
+
+def _trigger_scenario():
+    """Asks at 105 to 107, a buy that trades at 105, then a buy stop at 104, then a buy that trades at 106."""
+    return [
+        Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=1, price=107),
+        Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=1, price=105),
+        Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=1, price=106),
+        Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=1, price=105),
+        Order(symbol="BTC-USDT", order_type=OrderType.STOP_LOSS, side=OrderSide.BUY, quantity=1, stop_price=104),
+        Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=1, price=106),
+    ]
+
+
+@pytest.mark.parametrize("trades_after_stop", [False, True])
+def test_batch_triggers_match_sequential(trades_after_stop):
+    """Test that a trigger order in a batch is only triggered by the trades after it, as when submitted alone."""
+    statuses = []
+    for batched in (False, True):
+        engine = MatchingEngine()
+        orders = _trigger_scenario()
+        if not trades_after_stop:
+            orders = orders[:5]
+        if batched:
+            engine.process_orders(orders)
+        else:
+            for order in orders:
+                engine.process_order(order)
+        statuses.append(engine.get_order(orders[4].order_id).status)
+    
+    # The trade at 105 came before the stop; only the later trade at 106 triggers it, filling at 107
+    expected = OrderStatus.FILLED if trades_after_stop else OrderStatus.PENDING_TRIGGER
+    assert statuses == [expected, expected]
@@ -0,0 +1,36 @@
+"""
+Tests for the matching engine microbenchmarks.
+"""
+import json
+
+import pytest
+
+from app.tools.benchmark import WORKLOADS, main, run, summarize
+
+
+def test_summarize_percentiles():
+    """Test that latency summaries report throughput and percentiles."""
+    summary = summarize(list(range(1, 1001)))
+    assert summary["ops"] == 1000
+    assert (summary["p50_ns"], summary["p99_ns"], summary["p999_ns"], summary["max_ns"]) == (501, 991, 1000, 1000)
+    assert summary["ops_per_sec"] == round(1000 * 1e9 / sum(range(1, 1001)))
+
+
+@pytest.mark.parametrize("backend", ["sorted", "dense"])
+def test_workloads_run(backend):
+    """Test that every workload runs on both order book backends."""
+    results = run(list(WORKLOADS), ops=200, depth=50, stops=100, backend=backend)
+    assert set(results) == set(WORKLOADS)
+    for summary in results.values():
+        assert summary["ops"] == 200
+        assert summary["p50_ns"] <= summary["p99_ns"] <= summary["p999_ns"] <= summary["max_ns"]
+
+
+def test_json_report(tmp_path):
+    """Test that the command line writes a JSON report for the selected workloads."""
+    output = tmp_path / "report.json"
+    assert main(["--workload", "fok_storm", "--workload", "pending_stops", "--ops", "100",
+                 "--depth", "20", "--stops", "50", "--output", str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert list(report["workloads"]) == ["fok_storm", "pending_stops"]
+    assert report["params"]["ops"] == 100
@@ -0,0 +1,123 @@
+import random
+import pytest
+
+from app.models.order import Order, OrderType, OrderSide, OrderStatus, OrderBookEntry
+from app.core.order_book import OrderBook
+from app.core.dense_order_book import DenseOrderBook, PriceLadder
+from app.core.matching_engine import MatchingEngine
+
+
+def test_price_ladder_ordering():
+    """Test that ladder levels iterate best price first on both sides."""
+    bids = PriceLadder(is_bid=True, size=16)
+    asks = PriceLadder(is_bid=False, size=16)
+
+    for price in (100, 103, 101):
+        bids[price] = OrderBookEntry(price=price)
+        asks[price] = OrderBookEntry(price=price)
+
+    assert list(bids) == [103, 101, 100]
+    assert list(asks) == [100, 101, 103]
+    assert next(iter(bids)) == 103
+    assert next(iter(asks)) == 100
+    assert len(bids) == 3
+    assert 101 in bids and 102 not in bids
+
+    # Removing the best level moves the cursor to the next one
+    del bids[103]
+    del asks[100]
+    assert next(iter(bids)) == 101
+    assert next(iter(asks)) == 101
+    assert bids[100].price == 100
+
+    with pytest.raises(KeyError):
+        bids[102]
+
+
+def test_price_ladder_recentering():
+    """Test that the ladder follows the market and keeps far levels in overflow."""
+    asks = PriceLadder(is_bid=False, size=8)
+
+    asks[100] = OrderBookEntry(price=100)
+    asks[106] = OrderBookEntry(price=106)
+    # Behind the window
+    asks[150] = OrderBookEntry(price=150)
+    assert list(asks) == [100, 106, 150]
+
+    # Market moves below the front of the window
+    asks[90] = OrderBookEntry(price=90)
+    assert list(asks) == [90, 100, 106, 150]
+    assert len(asks) == 4
+
+    # Emptying the window pulls overflow levels forward
+    for price in (90, 100, 106):
+        del asks[price]
+    assert list(asks) == [150]
+    assert 150 in asks
+
+    del asks[150]
+    assert not asks
+    assert list(asks) == []
+
+
+def test_engine_selects_backend():
+    """Test that the matching engine creates the configured backend per symbol."""
+    engine = MatchingEngine()
+    engine.set_order_book_backend("BTC-USDT", "dense")
+
+    assert isinstance(engine.get_or_create_order_book("BTC-USDT"), DenseOrderBook)
+    assert type(engine.get_or_create_order_book("ETH-USDT")) is OrderBook
+    assert isinstance(engine.get_or_create_order_book("SOL-USDT", backend="dense"), DenseOrderBook)
+
+    with pytest.raises(ValueError):
+        engine.set_order_book_backend("ETH-USDT", "dense")
+    with pytest.raises(ValueError):
+        engine.set_order_book_backend("XRP-USDT", "unknown")
+
+
+def test_dense_book_matches_sorted_book():
+    """Test that both backends produce the same trades and book for the same flow."""
+    rng = random.Random(42)
+    sorted_book = OrderBook("BTC-USDT")
+    dense_book = DenseOrderBook("BTC-USDT", ladder_size=32)
+    resting_ids = []
+
+    for i in range(2000):
+        action = rng.random()
+        if action < 0.15 and resting_ids:
+            # Cancel a random resting order
+            order_id = resting_ids.pop(rng.randrange(len(resting_ids)))
+            sorted_book.cancel_order(order_id)
+            dense_book.cancel_order(order_id)
+            continue
+
+        # Drift the mid price so the ladder has to recenter
+        mid = 1000 + (i // 100) * 20
+        side = rng.choice([OrderSide.BUY, OrderSide.SELL])
+        order_type = OrderType.MARKET if action > 0.9 else rng.choice([OrderType.LIMIT, OrderType.IOC, OrderType.FOK])
+        fields = dict(
+            order_id=i,
+            symbol="BTC-USDT",
+            order_type=order_type,
+            side=side,
+            quantity=rng.randint(1, 20)
+        )
+        if order_type != OrderType.MARKET:
+            fields["price"] = mid + rng.randint(-40, 40)
+
+        sorted_trades, sorted_order = sorted_book.add_order(Order(**fields))
+        dense_trades, dense_order = dense_book.add_order(Order(**fields))
+
+        assert [(t.price, t.quantity, t.maker_order_id) for t in sorted_trades] == \
+            [(t.price, t.quantity, t.maker_order_id) for t in dense_trades]
+        assert sorted_order.status == dense_order.status
+        if dense_book.get_order(dense_order.order_id) is not None:
+            resting_ids.append(dense_order.order_id)
+
+        assert sorted_book.get_bbo().bid_price == dense_book.get_bbo().bid_price
+        assert sorted_book.get_bbo().ask_price == dense_book.get_bbo().ask_price
+
+    sorted_snapshot = sorted_book.get_order_book_snapshot(depth=1000)
+    dense_snapshot = dense_book.get_order_book_snapshot(depth=1000)
+    assert sorted_snapshot.bids == dense_snapshot.bids
+    assert sorted_snapshot.asks == dense_snapshot.asks
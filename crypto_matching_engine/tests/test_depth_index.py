@@ -0,0 +1,58 @@
+import random
+
+from app.core.depth_index import DepthIndex
+
+
+def _reference(levels, is_bid, quantity):
+    """Walk the levels best price first to get the expected sweep result."""
+    filled = notional = 0
+    worst_price = None
+    for price in sorted(levels, reverse=is_bid):
+        if filled >= quantity:
+            break
+        take = min(levels[price], quantity - filled)
+        filled += take
+        notional += take * price
+        worst_price = price
+    return filled, notional, worst_price
+
+
+def test_available_by_limit_price():
+    """Test cumulative quantity at or better than a limit price on both sides."""
+    asks = DepthIndex(is_bid=False)
+    bids = DepthIndex(is_bid=True)
+    for price, quantity in ((100, 5), (102, 7), (110, 3)):
+        asks.update(price, quantity)
+        bids.update(price, quantity)
+
+    assert asks.available() == 15
+    assert asks.available(99) == 0
+    assert asks.available(100) == 5
+    assert asks.available(105) == 12
+    assert bids.available(102) == 10
+    assert bids.available(111) == 0
+    assert bids.available(1) == 15
+
+    # Removing quantity drops empty nodes
+    asks.update(102, -7)
+    assert asks.available(105) == 5
+    assert asks.total_notional == 5 * 100 + 3 * 110
+
+
+def test_sweep_matches_level_walk():
+    """Test that sweeps agree with walking the price levels directly."""
+    rng = random.Random(7)
+    for is_bid in (True, False):
+        index = DepthIndex(is_bid=is_bid)
+        levels = {}
+        for _ in range(500):
+            price = rng.randint(1, 3000)
+            if price in levels and rng.random() < 0.5:
+                index.update(price, -levels.pop(price))
+            else:
+                quantity = rng.randint(1, 50)
+                index.update(price, quantity)
+                levels[price] = levels.get(price, 0) + quantity
+
+            quantity = rng.randint(1, 400)
+            assert index.sweep(quantity) == _reference(levels, is_bid, quantity)
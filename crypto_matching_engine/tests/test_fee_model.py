@@ -43,13 +43,16 @@ def test_fee_calculation_in_trades():
     # Set custom fee schedule
     engine.set_fee_schedule("BTC-USDT", 0.002, 0.003)
     
+    # Prices in cents and quantities in thousandths
+    engine.set_instrument("BTC-USDT", "0.01", "0.001")
+    
     # Add a limit sell order
     sell_order = Order(
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50000.0
+        quantity=1000,  # 1.0
+        price=5000000  # 50000.00
     )
     engine.process_order(sell_order)
     
@@ -58,7 +61,7 @@ def test_fee_calculation_in_trades():
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.BUY,
-        quantity=1.0
+        quantity=1000  # 1.0
     )
     trades, _ = engine.process_order(buy_order)
     
@@ -67,8 +70,8 @@ def test_fee_calculation_in_trades():
     
     # Check fee calculation in the trade
     trade = trades[0]
-    assert trade.price == 50000.0
-    assert trade.quantity == 1.0
+    assert trade.price == 5000000
+    assert trade.quantity == 1000
     assert trade.maker_fee_rate == 0.002
     assert trade.taker_fee_rate == 0.003
     assert trade.maker_fee == 100.0  # 0.2% of 50000
@@ -82,13 +85,13 @@ def test_default_fee_rates():
     # Set default fee rates
     engine.set_default_fee_rates(0.003, 0.004)
     
-    # Add a limit sell order for a new symbol
+    # Add a limit sell order for a new symbol with the default increments
     sell_order = Order(
         symbol="ETH-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=3000.0
+        quantity=100000000,  # 1.0 at the default lot size of 0.00000001
+        price=300000  # 3000.00 at the default tick size of 0.01
     )
     engine.process_order(sell_order)
     
@@ -97,7 +100,7 @@ def test_default_fee_rates():
         symbol="ETH-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.BUY,
-        quantity=1.0
+        quantity=100000000
     )
     trades, _ = engine.process_order(buy_order)
     
@@ -106,8 +109,8 @@ def test_default_fee_rates():
     
     # Check fee calculation in the trade
     trade = trades[0]
-    assert trade.price == 3000.0
-    assert trade.quantity == 1.0
+    assert trade.price == 300000
+    assert trade.quantity == 100000000
     assert trade.maker_fee_rate == 0.003
     assert trade.taker_fee_rate == 0.004
     assert trade.maker_fee == 9.0   # 0.3% of 3000
@@ -0,0 +1,75 @@
+import pytest
+
+from app.core.id_generator import SnowflakeIdGenerator, EPOCH_MS, MAX_ID, SEQUENCE_MASK, is_valid_id, worker_id_of
+
+
+class FakeClock:
+    """Clock returning a settable time in nanoseconds."""
+
+    def __init__(self, ms: int):
+        self.ms = ms
+
+    def __call__(self) -> int:
+        return self.ms * 1_000_000
+
+
+def test_ids_increase_within_and_across_milliseconds():
+    """Test that IDs increase monotonically and carry the worker ID."""
+    clock = FakeClock(EPOCH_MS + 1000)
+    generator = SnowflakeIdGenerator(worker_id=7, clock=clock)
+
+    ids = [generator.next_id() for _ in range(3)]
+    clock.ms += 1
+    ids.append(generator.next_id())
+
+    assert ids == sorted(ids) and len(set(ids)) == 4
+    assert all(worker_id_of(i) == 7 for i in ids)
+    assert ids[1] - ids[0] == 1
+    assert generator.last_id == ids[-1]
+    assert ids[-1] < 2 ** 63
+
+
+def test_clock_rollback_and_sequence_overflow():
+    """Test that IDs keep increasing when the clock moves back or a millisecond is exhausted."""
+    clock = FakeClock(EPOCH_MS + 5000)
+    generator = SnowflakeIdGenerator(clock=clock)
+    first = generator.next_id()
+
+    clock.ms -= 2000
+    assert generator.next_id() > first
+
+    ids = [generator.next_id() for _ in range(SEQUENCE_MASK + 2)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+
+
+def test_advance_to():
+    """Test that a generator continues after an ID issued before a restart."""
+    clock = FakeClock(EPOCH_MS + 1000)
+    previous = SnowflakeIdGenerator(clock=FakeClock(EPOCH_MS + 9000))
+    last_id = previous.next_id()
+
+    generator = SnowflakeIdGenerator(clock=clock)
+    generator.advance_to(last_id)
+    assert generator.next_id() > last_id
+
+    # Advancing to an older ID has no effect
+    current = generator.last_id
+    generator.advance_to(1)
+    assert generator.last_id == current
+
+
+def test_invalid_worker_id():
+    """Test that worker IDs must fit in the ID layout."""
+    with pytest.raises(ValueError):
+        SnowflakeIdGenerator(worker_id=1024)
+
+
+def test_valid_ids_fit_the_snowflake_layout():
+    """Test that only IDs fitting the 63-bit layout are valid."""
+    generator = SnowflakeIdGenerator(worker_id=1023, clock=FakeClock(EPOCH_MS + 1000))
+
+    assert is_valid_id(generator.next_id())
+    assert is_valid_id(0) and is_valid_id(MAX_ID)
+    assert MAX_ID == 2 ** 63 - 1
+    assert not is_valid_id(2 ** 63)
+    assert not is_valid_id(-1)
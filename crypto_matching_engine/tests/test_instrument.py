@@ -0,0 +1,100 @@
+import pytest
+from decimal import Decimal
+
+from app.models.order import Order, OrderType, OrderSide
+from app.models.instrument import Instrument, InstrumentRegistry
+from app.core.matching_engine import MatchingEngine
+
+
+def test_instrument_conversion():
+    """Test converting between decimals and ticks/lots."""
+    instrument = Instrument(symbol="BTC-USDT", tick_size=Decimal("0.01"), lot_size=Decimal("0.001"))
+    
+    # Decimal values convert to whole ticks and lots without float drift
+    assert instrument.price_to_ticks(50000.1) == 5000010
+    assert instrument.quantity_to_lots(0.3) == 300
+    assert instrument.quantity_to_lots("0.1") + instrument.quantity_to_lots("0.2") == instrument.quantity_to_lots("0.3")
+    
+    # And convert back at the edge
+    assert instrument.ticks_to_price(5000010) == 50000.1
+    assert instrument.lots_to_quantity(300) == 0.3
+    assert instrument.notional(5000000, 1500) == 75000.0
+    
+    # Values off the tick or lot grid are rejected
+    with pytest.raises(ValueError):
+        instrument.price_to_ticks(50000.005)
+    with pytest.raises(ValueError):
+        instrument.quantity_to_lots(0.0005)
+
+
+@pytest.mark.parametrize("value", [float("inf"), "-Infinity", "NaN", "abc", 1e300, 2 ** 63 / 100, 0, -1])
+def test_instrument_conversion_rejects_out_of_range_values(value):
+    """Test that non-finite, non-positive and 64-bit overflowing values are rejected."""
+    instrument = Instrument(symbol="BTC-USDT", tick_size=Decimal("0.01"), lot_size=Decimal("0.001"))
+    
+    with pytest.raises(ValueError):
+        instrument.price_to_ticks(value)
+    with pytest.raises(ValueError):
+        instrument.quantity_to_lots(value)
+    
+    # The largest value that fits is still accepted
+    assert instrument.price_to_ticks(Decimal(2 ** 63 - 1) / 100) == 2 ** 63 - 1
+
+
+def test_instrument_registry():
+    """Test instrument registry defaults and custom instruments."""
+    registry = InstrumentRegistry()
+    
+    # Unknown symbols use the default increments
+    instrument = registry.get_instrument("ETH-USDT")
+    assert instrument.tick_size == Decimal("0.01")
+    assert instrument.lot_size == Decimal("0.00000001")
+    
+    # Custom increments
+    instrument = registry.set_instrument("BTC-USDT", "0.5", "0.0001")
+    assert registry.get_instrument("BTC-USDT").tick_size == Decimal("0.5")
+    assert instrument.lot_size == Decimal("0.0001")
+    
+    # Increments must be positive
+    with pytest.raises(ValueError):
+        registry.set_instrument("BTC-USDT", "0", "0.0001")
+
+
+def test_lookups_do_not_register_instruments():
+    """Test that only order books and set_instrument add symbols to the registry."""
+    engine = MatchingEngine()
+    
+    # Reads of unknown symbols get the defaults without registering them
+    assert engine.get_instrument("JUNK-1").tick_size == Decimal("0.01")
+    engine.get_recent_trades("JUNK-2")
+    engine.get_bbo("JUNK-3")
+    assert engine.instruments.instruments == {}
+    
+    # An order that creates a book registers its symbol's instrument
+    engine.process_order(Order(symbol="ETH-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY,
+                               quantity=1000, price=300000))
+    engine.set_instrument("SOL-USDT", "0.001", "0.01")
+    assert sorted(engine.instruments.instruments) == ["ETH-USDT", "SOL-USDT"]
+
+
+def test_set_instrument_with_open_orders():
+    """Test that increments cannot change while a symbol has open orders."""
+    engine = MatchingEngine()
+    engine.set_instrument("BTC-USDT", "0.01", "0.001")
+    
+    order = Order(
+        symbol="BTC-USDT",
+        order_type=OrderType.LIMIT,
+        side=OrderSide.BUY,
+        quantity=1000,
+        price=5000000
+    )
+    engine.process_order(order)
+    
+    with pytest.raises(ValueError):
+        engine.set_instrument("BTC-USDT", "0.1", "0.001")
+    
+    # Once the book is empty the increments can change
+    engine.cancel_order(order.order_id)
+    instrument = engine.set_instrument("BTC-USDT", "0.1", "0.001")
+    assert instrument.tick_size == Decimal("0.1")
@@ -0,0 +1,223 @@
+"""
+Tests for the write-ahead journal.
+"""
+import sqlite3
+import time
+
+import pytest
+
+from app.models.order import Order, OrderType, OrderSide, OrderStatus
+from app.models.trade import Trade
+from app.core.matching_engine import MatchingEngine
+from app.persistence.journal import (
+    Journal, SYNC, GROUP, ORDER_COMMAND, ORDER_EVENT, TRADE_EVENT, CANCEL_COMMAND, decode_record, read_records
+)
+from app.persistence.persistence_manager import PersistenceManager
+
+
+def _order(order_id, side, quantity, price, **fields):
+    return Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=side, quantity=quantity, price=price,
+                 order_id=order_id, **fields)
+
+
+def test_records_round_trip_and_torn_tail_is_ignored(tmp_path):
+    """Test that records decode to what was written and a torn last record is skipped."""
+    path = str(tmp_path / "engine.journal")
+    stop = Order(symbol="ETH-USDT", order_type=OrderType.STOP_LIMIT, side=OrderSide.SELL, quantity=5,
+                 stop_price=2900, limit_price=2850, order_id=7, timestamp=123)
+    trade = Trade(symbol="BTC-USDT", price=50000, quantity=3, aggressor_side="buy", maker_order_id=1,
+                  taker_order_id=2, trade_id=9, timestamp=456, maker_fee=0.5, taker_fee=1.0,
+                  maker_fee_rate=0.001, taker_fee_rate=0.002)
+
+    journal = Journal(path, durability=SYNC)
+    journal.record_orders(ORDER_COMMAND, [stop])
+    journal.record_trades([trade])
+    journal.record_cancel(7)
+    journal.commit()
+    journal.close()
+    with open(path, "ab") as f:
+        f.write(b"\x30\x00\x00\x00partial")
+
+    records = list(read_records(path))
+    assert [(sequence, kind) for sequence, kind, _ in records] == [(1, ORDER_COMMAND), (2, TRADE_EVENT), (3, CANCEL_COMMAND)]
+    decoded_order, decoded_trade, order_id = [decode_record(kind, payload) for _, kind, payload in records]
+    assert repr(decoded_order) == repr(stop)
+    assert repr(decoded_trade) == repr(trade)
+    assert order_id == 7
+
+
+def test_group_commit(tmp_path):
+    """Test that GROUP mode writes records in groups of group_size, and flush writes a partial group."""
+    groups = []
+    journal = Journal(str(tmp_path / "engine.journal"), durability=GROUP, group_size=4,
+                      group_interval_us=10_000_000, on_commit=groups.append)
+
+    for i in range(3):
+        journal.record_orders(ORDER_EVENT, [_order(i + 1, OrderSide.BUY, 1, 100)])
+        journal.commit()
+    assert groups == []
+
+    journal.record_orders(ORDER_EVENT, [_order(4, OrderSide.BUY, 1, 100)])
+    journal.commit()
+    assert [len(group) for group in groups] == [4]
+
+    journal.record_cancel(1)
+    journal.commit()
+    # The open group is already in the file, so a crash of the process does not lose it
+    assert [sequence for sequence, _, _ in read_records(journal.path)] == [1, 2, 3, 4, 5]
+    journal.flush()
+    assert [len(group) for group in groups] == [4, 1]
+    journal.close()
+
+
+class _FailingFile:
+    """File wrapper whose next write writes only part of the data and then fails."""
+
+    def __init__(self, file):
+        self.file = file
+        self.fail_next_write = True
+
+    def write(self, data):
+        if self.fail_next_write:
+            self.fail_next_write = False
+            self.file.write(data[:len(data) // 2])
+            raise OSError("No space left on device")
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def test_partial_write_is_cut_back_before_retrying(tmp_path):
+    """Test that a write failing partway does not leave partial bytes in front of the retried records."""
+    path = str(tmp_path / "engine.journal")
+    journal = Journal(path, durability=SYNC)
+    journal.record_orders(ORDER_EVENT, [_order(1, OrderSide.BUY, 1, 100)])
+    journal.commit()
+
+    journal._file = _FailingFile(journal._file)
+    journal.record_orders(ORDER_EVENT, [_order(2, OrderSide.BUY, 1, 100)])
+    with pytest.raises(OSError):
+        journal.commit()
+
+    journal.record_orders(ORDER_EVENT, [_order(3, OrderSide.BUY, 1, 100)])
+    journal.commit()
+    journal.close()
+
+    assert [sequence for sequence, _, _ in read_records(path)] == [1, 2, 3]
+
+
+def test_database_is_updated_from_the_journal_and_recovered(tmp_path):
+    """Test that the engine's updates reach SQLite through the journal, including after a crash."""
+    db_path = str(tmp_path / "trading_app.db")
+    journal_path = str(tmp_path / "trading_app.journal")
+    persistence_manager = PersistenceManager(db_path, journal_path=journal_path, durability=GROUP)
+    engine = MatchingEngine()
+    engine.persistence_manager = persistence_manager
+
+    engine.process_order(_order(1, OrderSide.SELL, 10, 50000))
+    engine.process_order(_order(2, OrderSide.BUY, 4, 50000))
+    engine.cancel_order(1)
+
+    assert persistence_manager.get_order(1).status == OrderStatus.CANCELED
+    assert persistence_manager.get_trades_by_symbol("BTC-USDT")[0].quantity == 4
+    persistence_manager.close()
+
+    # Records journaled but never applied, as after a crash
+    journal = Journal(journal_path, durability=SYNC, next_sequence=1000)
+    journal.record_orders(ORDER_EVENT, [_order(3, OrderSide.BUY, 2, 49000)])
+    journal.commit()
+    journal.close()
+
+    recovered = PersistenceManager(db_path, journal_path=journal_path)
+    try:
+        assert recovered.order_repository.get_order(3).remaining_quantity == 2
+        assert list(read_records(journal_path)) == []
+        assert recovered.journal.next_sequence == 1001
+    finally:
+        recovered.close()
+
+
+def test_failed_apply_is_retried_before_later_records(tmp_path, monkeypatch):
+    """Test that records that fail to reach the database are retried and the applied sequence never skips them."""
+    db_path = str(tmp_path / "trading_app.db")
+    journal_path = str(tmp_path / "trading_app.journal")
+    persistence_manager = PersistenceManager(db_path, journal_path=journal_path, durability=SYNC)
+    engine = MatchingEngine()
+    engine.persistence_manager = persistence_manager
+
+    # The database is locked while the first order's records are applied
+    repository = persistence_manager._apply_order_repository
+    save_orders = repository.save_orders
+    locked = [True]
+
+    def locked_save_orders(orders):
+        if locked[0]:
+            raise sqlite3.OperationalError("database is locked")
+        save_orders(orders)
+
+    monkeypatch.setattr(repository, "save_orders", locked_save_orders)
+    engine.process_order(_order(1, OrderSide.SELL, 10, 50000))
+    with pytest.raises(RuntimeError):
+        persistence_manager.wait_applied()
+
+    # Once unlocked, a later order's records are applied together with the retried ones
+    locked[0] = False
+    engine.process_order(_order(2, OrderSide.BUY, 4, 49000))
+    deadline = time.monotonic() + 5
+    while persistence_manager.applied_sequence < persistence_manager.journal.next_sequence - 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    persistence_manager.wait_applied()
+    assert persistence_manager.get_order(1).remaining_quantity == 10
+    assert persistence_manager.get_order(2).remaining_quantity == 4
+    persistence_manager.close()
+
+
+def test_records_unapplied_at_shutdown_are_applied_on_restart(tmp_path, monkeypatch):
+    """Test that records the database never got stay in the journal and are applied on the next start."""
+    db_path = str(tmp_path / "trading_app.db")
+    journal_path = str(tmp_path / "trading_app.journal")
+    persistence_manager = PersistenceManager(db_path, journal_path=journal_path, durability=SYNC)
+    engine = MatchingEngine()
+    engine.persistence_manager = persistence_manager
+
+    def locked_save_orders(orders):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(persistence_manager._apply_order_repository, "save_orders", locked_save_orders)
+    engine.process_order(_order(1, OrderSide.SELL, 10, 50000))
+    with pytest.raises(RuntimeError):
+        engine.save_state()
+    persistence_manager.close()
+    assert persistence_manager.sequence_repository.get_saved_id("journal") == 0
+
+    recovered = PersistenceManager(db_path, journal_path=journal_path)
+    try:
+        assert recovered.order_repository.get_order(1).remaining_quantity == 10
+    finally:
+        recovered.close()
+
+
+def test_reads_only_wait_for_the_records_they_need(tmp_path):
+    """Test that a database read waits for the journal records of what it reads, not for every buffered record."""
+    persistence_manager = PersistenceManager(str(tmp_path / "trading_app.db"),
+                                             journal_path=str(tmp_path / "trading_app.journal"),
+                                             durability=GROUP, group_interval_us=60_000_000)
+    engine = MatchingEngine()
+    engine.persistence_manager = persistence_manager
+    try:
+        engine.process_order(_order(1, OrderSide.SELL, 10, 50000))
+        persistence_manager.wait_applied()
+        engine.process_order(_order(2, OrderSide.BUY, 4, 49000))
+
+        # Order 1 is in the database already, so order 2's records stay buffered
+        assert persistence_manager.get_order(1).remaining_quantity == 10
+        assert persistence_manager.journal.stats()[0] > 0
+
+        # Reading order 2 writes its group and waits for it
+        assert persistence_manager.get_order(2).remaining_quantity == 4
+        assert persistence_manager.journal.stats()[0] == 0
+        assert list(persistence_manager._order_sequences) == [2]
+    finally:
+        persistence_manager.close()
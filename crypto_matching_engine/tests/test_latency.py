@@ -0,0 +1,66 @@
+"""
+Tests for the latency histograms.
+"""
+import pytest
+
+from app.models.order import Order, OrderType, OrderSide
+from app.core.matching_engine import MatchingEngine
+from app.core.latency import LatencyHistogram, LatencyRecorder, MAX_VALUE
+
+
+def test_histogram_percentiles_are_within_bucket_precision():
+    """Test that percentiles are exact for small values and within about 3% above that."""
+    histogram = LatencyHistogram()
+    for value in range(1, 10001):
+        histogram.record(value * 100)
+
+    assert histogram.count == 10000
+    assert histogram.max == 1_000_000
+    for percentile, exact in ((50, 500_000), (99, 990_000), (99.9, 999_000)):
+        assert exact <= histogram.percentile(percentile) <= exact * 1.04
+
+    small = LatencyHistogram()
+    for value in (3, 7, 7, 40):
+        small.record(value)
+    assert (small.percentile(50), small.percentile(75), small.percentile(100)) == (7, 7, 40)
+
+    # Out of range values are clamped
+    small.record(-5)
+    small.record(MAX_VALUE * 4)
+    assert small.max == MAX_VALUE
+
+
+def test_recorder_merges_histograms():
+    """Test that recorders keep histograms by stage and symbol and merge them by adding counts."""
+    first, second = LatencyRecorder(), LatencyRecorder()
+    first.record("match", "BTC-USDT", 1000)
+    second.record("match", "BTC-USDT", 3000)
+    second.record("match", "ETH-USDT", 2000)
+
+    merged = LatencyRecorder()
+    merged.merge(first.copy())
+    merged.merge(second.copy())
+    summary = merged.summary()
+    assert summary["match"]["BTC-USDT"]["count"] == 2
+    assert summary["match"]["BTC-USDT"]["max_ns"] == 3000
+    assert summary["match"]["ETH-USDT"]["count"] == 1
+    assert first.histograms[("match", "BTC-USDT")].count == 1
+
+
+def test_engine_records_stages_per_symbol():
+    """Test that the engine times each stage of order processing when enabled, and nothing otherwise."""
+    engine = MatchingEngine(record_latency=True)
+    engine.process_order(Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=5, price=100))
+    engine.process_order(Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=2, price=100))
+    engine.cancel_order(12345)
+
+    histograms = engine.get_latency_histograms()
+    counts = {key: histogram.count for key, histogram in histograms.items()}
+    assert counts[("validate", "BTC-USDT")] == 2
+    assert counts[("match", "BTC-USDT")] == 2
+    assert counts[("process", "BTC-USDT")] == 2
+    assert counts[("fees", "BTC-USDT")] == 1
+    assert counts[("triggers", "BTC-USDT")] == 1
+    assert counts[("cancel", "*")] == 1
+
+    assert MatchingEngine().get_latency_histograms() == {}
@@ -0,0 +1,46 @@
+import json
+import logging
+
+from app.core.matching_engine import MatchingEngine
+from app.logging_setup import DeferredQueueHandler, audit_enabled, audit_logger, configure_logging, shutdown_logging
+from app.models.order import Order, OrderType, OrderSide
+
+
+def test_queue_logging_and_audit_sink(tmp_path):
+    """Test that logs go through the queue and that orders, trades and cancels are audited as JSON lines."""
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    log_file = tmp_path / "app.log"
+    audit_file = tmp_path / "audit.jsonl"
+
+    try:
+        configure_logging(log_file=str(log_file), level=logging.INFO, audit_file=str(audit_file))
+        assert isinstance(root.handlers[0], DeferredQueueHandler)
+        assert audit_enabled()
+
+        engine = MatchingEngine()
+        engine.process_order(Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL,
+                                   quantity=10, price=50000, order_id=1))
+        engine.process_order(Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY,
+                                   quantity=5, price=50000, order_id=2))
+        engine.cancel_order(1)
+        logging.getLogger("app.test").debug("Per-order details: %s", 1)
+    finally:
+        shutdown_logging()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in saved_handlers:
+            root.addHandler(handler)
+        root.setLevel(saved_level)
+        audit_logger.handlers.clear()
+        audit_logger.setLevel(logging.WARNING)
+
+    events = [json.loads(line) for line in audit_file.read_text().splitlines()]
+    assert [event["event"] for event in events] == ["order", "order", "order", "trade", "cancel"]
+    assert events[3]["maker_order_id"] == 1 and events[3]["taker_order_id"] == 2
+    assert events[4]["status"] == "canceled"
+
+    # DEBUG records are dropped at INFO, INFO records reach the file
+    log_text = log_file.read_text()
+    assert "Matching engine initialized" in log_text
+    assert "Per-order details" not in log_text
@@ -1,3 +1,4 @@
+import time
 import pytest
 from datetime import datetime
 
@@ -14,8 +15,8 @@ def test_process_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     
     # Process the order
@@ -26,14 +27,14 @@ def test_process_order():
     
     # Check that the order was added to the book
     assert updated_sell_order.status == OrderStatus.OPEN
-    assert updated_sell_order.remaining_quantity == 1.0
+    assert updated_sell_order.remaining_quantity == 10
     
     # Create a market buy order
     buy_order = Order(
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.BUY,
-        quantity=0.5
+        quantity=5
     )
     
     # Process the order
@@ -41,21 +42,21 @@ def test_process_order():
     
     # Check that a trade was executed
     assert len(trades) == 1
-    assert trades[0].price == 50000.0
-    assert trades[0].quantity == 0.5
+    assert trades[0].price == 50000
+    assert trades[0].quantity == 5
     assert trades[0].aggressor_side == "buy"
     
     # Check that the buy order was filled
     assert updated_buy_order.status == OrderStatus.FILLED
-    assert updated_buy_order.filled_quantity == 0.5
+    assert updated_buy_order.filled_quantity == 5
     assert updated_buy_order.remaining_quantity == 0
     
     # Check that the sell order was partially filled
     updated_sell_order = engine.get_order(sell_order.order_id)
     assert updated_sell_order is not None
     assert updated_sell_order.status == OrderStatus.PARTIALLY_FILLED
-    assert updated_sell_order.filled_quantity == 0.5
-    assert updated_sell_order.remaining_quantity == 0.5
+    assert updated_sell_order.filled_quantity == 5
+    assert updated_sell_order.remaining_quantity == 5
 
 
 def test_cancel_order():
@@ -67,8 +68,8 @@ def test_cancel_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     
     # Process the order
@@ -98,16 +99,16 @@ def test_get_bbo():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     engine.process_order(buy_order)
     
     # Check the BBO
     bbo = engine.get_bbo("BTC-USDT")
     assert bbo is not None
-    assert bbo.bid_price == 50000.0
-    assert bbo.bid_quantity == 1.0
+    assert bbo.bid_price == 50000
+    assert bbo.bid_quantity == 10
     assert bbo.ask_price is None
     assert bbo.ask_quantity is None
     
@@ -116,18 +117,18 @@ def test_get_bbo():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=2.0,
-        price=50100.0
+        quantity=20,
+        price=50100
     )
     engine.process_order(sell_order)
     
     # Check the updated BBO
     bbo = engine.get_bbo("BTC-USDT")
     assert bbo is not None
-    assert bbo.bid_price == 50000.0
-    assert bbo.bid_quantity == 1.0
-    assert bbo.ask_price == 50100.0
-    assert bbo.ask_quantity == 2.0
+    assert bbo.bid_price == 50000
+    assert bbo.bid_quantity == 10
+    assert bbo.ask_price == 50100
+    assert bbo.ask_quantity == 20
 
 
 def test_get_order_book_snapshot():
@@ -139,8 +140,8 @@ def test_get_order_book_snapshot():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     engine.process_order(buy_order1)
     
@@ -148,8 +149,8 @@ def test_get_order_book_snapshot():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=2.0,
-        price=49900.0
+        quantity=20,
+        price=49900
     )
     engine.process_order(buy_order2)
     
@@ -157,8 +158,8 @@ def test_get_order_book_snapshot():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.5,
-        price=50100.0
+        quantity=15,
+        price=50100
     )
     engine.process_order(sell_order1)
     
@@ -166,8 +167,8 @@ def test_get_order_book_snapshot():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=2.5,
-        price=50200.0
+        quantity=25,
+        price=50200
     )
     engine.process_order(sell_order2)
     
@@ -176,17 +177,17 @@ def test_get_order_book_snapshot():
     
     # Check the bids
     assert len(snapshot.bids) == 2
-    assert snapshot.bids[0][0] == 50000.0  # Price
-    assert snapshot.bids[0][1] == 1.0      # Quantity
-    assert snapshot.bids[1][0] == 49900.0  # Price
-    assert snapshot.bids[1][1] == 2.0      # Quantity
+    assert snapshot.bids[0][0] == 50000  # Price
+    assert snapshot.bids[0][1] == 10      # Quantity
+    assert snapshot.bids[1][0] == 49900  # Price
+    assert snapshot.bids[1][1] == 20      # Quantity
     
     # Check the asks
     assert len(snapshot.asks) == 2
-    assert snapshot.asks[0][0] == 50100.0  # Price
-    assert snapshot.asks[0][1] == 1.5      # Quantity
-    assert snapshot.asks[1][0] == 50200.0  # Price
-    assert snapshot.asks[1][1] == 2.5      # Quantity
+    assert snapshot.asks[0][0] == 50100  # Price
+    assert snapshot.asks[0][1] == 15      # Quantity
+    assert snapshot.asks[1][0] == 50200  # Price
+    assert snapshot.asks[1][1] == 25      # Quantity
 
 
 def test_get_recent_trades():
@@ -198,8 +199,8 @@ def test_get_recent_trades():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=2.0,
-        price=50000.0
+        quantity=20,
+        price=50000
     )
     engine.process_order(sell_order)
     
@@ -208,7 +209,7 @@ def test_get_recent_trades():
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.BUY,
-        quantity=1.0
+        quantity=10
     )
     trades, _ = engine.process_order(buy_order)
     
@@ -221,8 +222,161 @@ def test_get_recent_trades():
     # Check that the trade is in the list
     assert len(recent_trades) == 1
     assert recent_trades[0].symbol == "BTC-USDT"
-    assert recent_trades[0].price == 50000.0
-    assert recent_trades[0].quantity == 1.0
+    assert recent_trades[0].price == 50000
+    assert recent_trades[0].quantity == 10
     assert recent_trades[0].aggressor_side == "buy"
     assert recent_trades[0].maker_order_id == sell_order.order_id
     assert recent_trades[0].taker_order_id == buy_order.order_id
+
+
+def test_reject_non_integer_quantities():
+    """Test that orders with fractional ticks or lots are rejected."""
+    engine = MatchingEngine()
+    
+    # Quantities must be whole lots
+    order = Order(
+        symbol="BTC-USDT",
+        order_type=OrderType.LIMIT,
+        side=OrderSide.BUY,
+        quantity=0.5,
+        price=50000
+    )
+    trades, updated_order = engine.process_order(order)
+    assert len(trades) == 0
+    assert updated_order.status == OrderStatus.REJECTED
+    
+    # Prices must be whole ticks
+    order = Order(
+        symbol="BTC-USDT",
+        order_type=OrderType.LIMIT,
+        side=OrderSide.BUY,
+        quantity=10,
+        price=50000.5
+    )
+    trades, updated_order = engine.process_order(order)
+    assert updated_order.status == OrderStatus.REJECTED
+    assert engine.get_bbo("BTC-USDT") is None
+
+
+def test_process_orders_batch():
+    """Test processing a batch of orders with one BBO refresh and trigger check."""
+    engine = MatchingEngine()
+    
+    # A pending sell stop that the batch's trades will reach
+    stop_order = Order(
+        symbol="BTC-USDT",
+        order_type=OrderType.STOP_LOSS,
+        side=OrderSide.SELL,
+        quantity=5,
+        stop_price=49500
+    )
+    engine.process_order(stop_order)
+    
+    batch = [
+        Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=10, price=50000),
+        Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=10, price=49000),
+        Order(symbol="BTC-USDT", order_type=OrderType.MARKET, side=OrderSide.SELL, quantity=15),
+        Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=1.5, price=49000),
+    ]
+    results = engine.process_orders(batch)
+    
+    # One result per order, in submission order
+    assert [order.order_id for _, order in results] == [order.order_id for order in batch]
+    assert [len(trades) for trades, _ in results] == [0, 0, 2, 0]
+    assert results[2][1].status == OrderStatus.FILLED
+    assert results[3][1].status == OrderStatus.REJECTED
+    
+    # Trades carry the default fee rates (0.1% maker, 0.2% taker) times their notional
+    instrument = engine.get_instrument("BTC-USDT")
+    assert [(trade.price, trade.quantity) for trade in results[2][0]] == [(50000, 10), (49000, 5)]
+    for trade in results[2][0]:
+        notional = instrument.notional(trade.price, trade.quantity)
+        assert notional > 0
+        assert (trade.maker_fee_rate, trade.taker_fee_rate) == (0.001, 0.002)
+        assert trade.maker_fee == pytest.approx(0.001 * notional)
+        assert trade.taker_fee == pytest.approx(0.002 * notional)
+    
+    # The stop triggered after the batch and sold into the remaining bid
+    assert engine.get_order(stop_order.order_id).status == OrderStatus.FILLED
+    assert len(engine.all_trades) == 3
+    
+    # The BBO reflects the book after the triggered order swept the last bid
+    bbo = engine.get_bbo("BTC-USDT")
+    assert bbo.bid_price is None
+    assert bbo.ask_price is None
+
+
+def test_trade_history_is_bounded():
+    """Test that recent trades come newest first from a fixed-size history."""
+    engine = MatchingEngine(trade_history_size=5)
+    
+    # Execute eight trades at increasing prices
+    for i in range(8):
+        engine.process_order(Order(
+            symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=10, price=50000 + i
+        ))
+        engine.process_order(Order(
+            symbol="BTC-USDT", order_type=OrderType.MARKET, side=OrderSide.BUY, quantity=10
+        ))
+    
+    # Only the last five trades are kept
+    assert len(engine.order_books["BTC-USDT"].trades) == 5
+    assert len(engine.all_trades) == 5
+    
+    trades = engine.get_recent_trades("BTC-USDT", limit=3)
+    assert [trade.price for trade in trades] == [50007, 50006, 50005]
+    
+    # Without persistence, larger requests return what is in memory
+    assert len(engine.get_recent_trades("BTC-USDT", limit=100, include_history=True)) == 5
+    assert engine.get_recent_trades("ETH-USDT") == []
+    
+    # Non-positive limits are rejected
+    for limit in (0, -1):
+        with pytest.raises(ValueError):
+            engine.get_recent_trades("BTC-USDT", limit=limit)
+
+
+def test_terminal_orders_are_evicted():
+    """Test that finished orders leave the live set and are evicted least recently used first."""
+    engine = MatchingEngine(terminal_order_cache_size=2)
+    
+    resting = Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=30, price=50000)
+    engine.process_order(resting)
+    
+    takers = []
+    for _ in range(3):
+        taker = Order(symbol="BTC-USDT", order_type=OrderType.MARKET, side=OrderSide.BUY, quantity=10)
+        engine.process_order(taker)
+        takers.append(taker)
+    
+    # The resting order was filled by the last taker and left the live set
+    assert engine.all_orders == {}
+    
+    # Only the two most recently finished orders are cached
+    assert list(engine.terminal_orders) == [takers[2].order_id, resting.order_id]
+    assert engine.get_order(takers[0].order_id) is None
+    
+    # Looking an order up makes it the most recently used
+    assert engine.get_order(takers[2].order_id) is takers[2]
+    canceled = Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=10, price=49000)
+    engine.process_order(canceled)
+    assert canceled.order_id in engine.all_orders
+    engine.cancel_order(canceled.order_id)
+    assert list(engine.terminal_orders) == [takers[2].order_id, canceled.order_id]
+
+
+def test_terminal_orders_expire():
+    """Test that finished orders are evicted after the maximum age."""
+    engine = MatchingEngine(terminal_order_max_age=60)
+    
+    first = Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=10, price=49000)
+    second = Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=10, price=49000)
+    engine.process_orders([first, second])
+    engine.cancel_order(first.order_id)
+    
+    # Age the first order past the limit
+    engine.terminal_orders[first.order_id] = (first, time.monotonic_ns() - 120 * 10 ** 9)
+    
+    # The next retirement evicts it
+    engine.cancel_order(second.order_id)
+    assert list(engine.terminal_orders) == [second.order_id]
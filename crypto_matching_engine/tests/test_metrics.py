@@ -0,0 +1,93 @@
+"""
+Tests for the Prometheus metrics.
+"""
+import pytest
+
+from app.models.order import Order, OrderType, OrderSide, OrderStatus
+from app.core.matching_engine import MatchingEngine
+from app.core.metrics import EngineMetrics, PrometheusText
+from app.persistence.persistence_manager import PersistenceManager
+
+
+def _engine():
+    """An engine with whole-unit ticks and lots, so notionals are easy to check."""
+    engine = MatchingEngine()
+    engine.set_instrument("BTC-USDT", 1, 1)
+    return engine
+
+
+def _order(engine, side, quantity, price=None, order_type=OrderType.LIMIT, **fields):
+    return engine.process_order(Order(symbol="BTC-USDT", order_type=order_type, side=side,
+                                      quantity=quantity, price=price, **fields))[1]
+
+
+def test_engine_counts_orders_trades_and_cancels():
+    """Test that the engine counts orders by type and status, trades and notional, and cancels."""
+    engine = _engine()
+    _order(engine, OrderSide.SELL, 5, 100)
+    _order(engine, OrderSide.SELL, 5, 101)
+    bid = _order(engine, OrderSide.BUY, 2, 99)
+    _order(engine, OrderSide.BUY, 3, 100)
+    _order(engine, OrderSide.SELL, 1, order_type=OrderType.STOP_LOSS, stop_price=90)
+    _order(engine, OrderSide.BUY, 0, 100)
+    engine.cancel_order(bid.order_id)
+    engine.cancel_order(bid.order_id)
+
+    metrics = engine.get_metrics()
+    assert metrics.orders == {
+        (OrderType.LIMIT, OrderStatus.OPEN): 3,
+        (OrderType.LIMIT, OrderStatus.FILLED): 1,
+        (OrderType.LIMIT, OrderStatus.REJECTED): 1,
+        (OrderType.STOP_LOSS, OrderStatus.PENDING_TRIGGER): 1,
+    }
+    assert metrics.trades == {"BTC-USDT": 1}
+    assert metrics.notional == {"BTC-USDT": 300.0}
+    assert metrics.cancels == {"canceled": 1, "not_found": 1}
+    # Two asks, one partly filled, at two levels; the bid was canceled
+    assert metrics.books == {"BTC-USDT": (2, 0, 2)}
+    assert metrics.pending_triggers == {"BTC-USDT": 1}
+    assert metrics.commit_latency is None
+
+    # The copy does not change as the engine goes on
+    _order(engine, OrderSide.BUY, 2, 100)
+    assert metrics.trades == {"BTC-USDT": 1}
+    assert engine.get_metrics().trades == {"BTC-USDT": 2}
+
+
+def test_persistence_metrics(tmp_path):
+    """Test that the journal's queue depth and group write latencies are reported."""
+    engine = _engine()
+    engine.persistence_manager = PersistenceManager(
+        str(tmp_path / "trading_app.db"), journal_path=str(tmp_path / "trading_app.journal"), durability="sync"
+    )
+    _order(engine, OrderSide.SELL, 5, 100)
+    _order(engine, OrderSide.BUY, 5, 100)
+
+    metrics = engine.get_metrics()
+    assert metrics.journal_pending == 0
+    assert metrics.commit_latency.count == 2
+
+    merged = EngineMetrics()
+    merged.merge(metrics)
+    merged.merge(metrics)
+    assert merged.commit_latency.count == 4
+    assert merged.trades == {"BTC-USDT": 2}
+    engine.persistence_manager.close()
+
+
+def test_prometheus_text_format():
+    """Test the exposition format of counters, gauges and summaries."""
+    engine = _engine()
+    _order(engine, OrderSide.SELL, 5, 100)
+    _order(engine, OrderSide.BUY, 2, 100)
+
+    text = PrometheusText()
+    engine.get_metrics().write(text)
+    text.metric("test_gauge", "gauge", "A test gauge.", [({"name": 'a "quoted"\\value'}, 1.5)])
+    lines = text.render().splitlines()
+
+    assert "# TYPE matching_engine_orders_total counter" in lines
+    assert 'matching_engine_orders_total{type="limit",status="filled"} 1' in lines
+    assert 'matching_engine_notional_total{symbol="BTC-USDT"} 200.0' in lines
+    assert 'matching_engine_price_levels{symbol="BTC-USDT",side="ask"} 1' in lines
+    assert 'test_gauge{name="a \\"quoted\\"\\\\value"} 1.5' in lines
@@ -14,8 +14,8 @@ def test_add_limit_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     
     # Add the order to the book
@@ -26,12 +26,12 @@ def test_add_limit_order():
     
     # Check that the order was added to the book
     assert updated_order.status == OrderStatus.OPEN
-    assert updated_order.remaining_quantity == 1.0
+    assert updated_order.remaining_quantity == 10
     
     # Check that the BBO was updated
     bbo = order_book.get_bbo()
-    assert bbo.bid_price == 50000.0
-    assert bbo.bid_quantity == 1.0
+    assert bbo.bid_price == 50000
+    assert bbo.bid_quantity == 10
     assert bbo.ask_price is None
     assert bbo.ask_quantity is None
 
@@ -45,8 +45,8 @@ def test_matching_market_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     trades, _ = order_book.add_order(limit_order)
     assert len(trades) == 0
@@ -56,7 +56,7 @@ def test_matching_market_order():
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.BUY,
-        quantity=0.5
+        quantity=5
     )
     
     # Add the market order to the book
@@ -64,13 +64,13 @@ def test_matching_market_order():
     
     # Check that a trade was executed
     assert len(trades) == 1
-    assert trades[0].price == 50000.0
-    assert trades[0].quantity == 0.5
+    assert trades[0].price == 50000
+    assert trades[0].quantity == 5
     assert trades[0].aggressor_side == "buy"
     
     # Check that the market order was filled
     assert updated_order.status == OrderStatus.FILLED
-    assert updated_order.filled_quantity == 0.5
+    assert updated_order.filled_quantity == 5
     assert updated_order.remaining_quantity == 0
     
     # Check that the limit order was partially filled
@@ -78,15 +78,15 @@ def test_matching_market_order():
     updated_limit_order = order_book.get_order(limit_order_id)
     assert updated_limit_order is not None
     assert updated_limit_order.status == OrderStatus.PARTIALLY_FILLED
-    assert updated_limit_order.filled_quantity == 0.5
-    assert updated_limit_order.remaining_quantity == 0.5
+    assert updated_limit_order.filled_quantity == 5
+    assert updated_limit_order.remaining_quantity == 5
     
     # Check that the BBO was updated
     bbo = order_book.get_bbo()
     assert bbo.bid_price is None
     assert bbo.bid_quantity is None
-    assert bbo.ask_price == 50000.0
-    assert bbo.ask_quantity == 0.5
+    assert bbo.ask_price == 50000
+    assert bbo.ask_quantity == 5
 
 
 def test_price_time_priority():
@@ -98,8 +98,8 @@ def test_price_time_priority():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     trades, _ = order_book.add_order(sell_order1)
     assert len(trades) == 0
@@ -108,8 +108,8 @@ def test_price_time_priority():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50100.0
+        quantity=10,
+        price=50100
     )
     trades, _ = order_book.add_order(sell_order2)
     assert len(trades) == 0
@@ -118,8 +118,8 @@ def test_price_time_priority():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50000.0  # Same price as sell_order1
+        quantity=10,
+        price=50000  # Same price as sell_order1
     )
     trades, _ = order_book.add_order(sell_order3)
     assert len(trades) == 0
@@ -129,7 +129,7 @@ def test_price_time_priority():
         symbol="BTC-USDT",
         order_type=OrderType.MARKET,
         side=OrderSide.BUY,
-        quantity=2.5
+        quantity=25
     )
     
     # Add the market order to the book
@@ -139,23 +139,23 @@ def test_price_time_priority():
     assert len(trades) == 3
     
     # First trade should be against sell_order1 (best price, first in time)
-    assert trades[0].price == 50000.0
-    assert trades[0].quantity == 1.0
+    assert trades[0].price == 50000
+    assert trades[0].quantity == 10
     assert trades[0].maker_order_id == sell_order1.order_id
     
     # Second trade should be against sell_order3 (same price, second in time)
-    assert trades[1].price == 50000.0
-    assert trades[1].quantity == 1.0
+    assert trades[1].price == 50000
+    assert trades[1].quantity == 10
     assert trades[1].maker_order_id == sell_order3.order_id
     
     # Third trade should be against sell_order2 (worst price)
-    assert trades[2].price == 50100.0
-    assert trades[2].quantity == 0.5
+    assert trades[2].price == 50100
+    assert trades[2].quantity == 5
     assert trades[2].maker_order_id == sell_order2.order_id
     
     # Check that the market order was filled
     assert updated_order.status == OrderStatus.FILLED
-    assert updated_order.filled_quantity == 2.5
+    assert updated_order.filled_quantity == 25
     assert updated_order.remaining_quantity == 0
     
     # Check that sell_order1 and sell_order3 were fully filled and removed from the book
@@ -166,8 +166,8 @@ def test_price_time_priority():
     updated_sell_order2 = order_book.get_order(sell_order2.order_id)
     assert updated_sell_order2 is not None
     assert updated_sell_order2.status == OrderStatus.PARTIALLY_FILLED
-    assert updated_sell_order2.filled_quantity == 0.5
-    assert updated_sell_order2.remaining_quantity == 0.5
+    assert updated_sell_order2.filled_quantity == 5
+    assert updated_sell_order2.remaining_quantity == 5
 
 
 def test_ioc_order():
@@ -179,8 +179,8 @@ def test_ioc_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     order_book.add_order(sell_order)
     
@@ -189,8 +189,8 @@ def test_ioc_order():
         symbol="BTC-USDT",
         order_type=OrderType.IOC,
         side=OrderSide.BUY,
-        quantity=2.0,
-        price=50000.0
+        quantity=20,
+        price=50000
     )
     
     # Add the IOC order to the book
@@ -198,12 +198,12 @@ def test_ioc_order():
     
     # Check that a trade was executed for the available quantity
     assert len(trades) == 1
-    assert trades[0].price == 50000.0
-    assert trades[0].quantity == 1.0
+    assert trades[0].price == 50000
+    assert trades[0].quantity == 10
     
     # Check that the IOC order was partially filled and the rest was canceled
     assert updated_order.status == OrderStatus.PARTIALLY_FILLED
-    assert updated_order.filled_quantity == 1.0
+    assert updated_order.filled_quantity == 10
     assert updated_order.remaining_quantity == 0  # Remaining quantity is canceled
     
     # Check that the IOC order is not in the book
@@ -219,8 +219,8 @@ def test_fok_order_success():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     order_book.add_order(sell_order1)
     
@@ -228,8 +228,8 @@ def test_fok_order_success():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=1.0,
-        price=50100.0
+        quantity=10,
+        price=50100
     )
     order_book.add_order(sell_order2)
     
@@ -238,8 +238,8 @@ def test_fok_order_success():
         symbol="BTC-USDT",
         order_type=OrderType.FOK,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50100.0
+        quantity=10,
+        price=50100
     )
     
     # Add the FOK order to the book
@@ -247,12 +247,12 @@ def test_fok_order_success():
     
     # Check that a trade was executed
     assert len(trades) == 1
-    assert trades[0].price == 50000.0  # Should match at the best price
-    assert trades[0].quantity == 1.0
+    assert trades[0].price == 50000  # Should match at the best price
+    assert trades[0].quantity == 10
     
     # Check that the FOK order was fully filled
     assert updated_order.status == OrderStatus.FILLED
-    assert updated_order.filled_quantity == 1.0
+    assert updated_order.filled_quantity == 10
     assert updated_order.remaining_quantity == 0
 
 
@@ -265,8 +265,8 @@ def test_fok_order_failure():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=0.5,
-        price=50000.0
+        quantity=5,
+        price=50000
     )
     order_book.add_order(sell_order)
     
@@ -275,8 +275,8 @@ def test_fok_order_failure():
         symbol="BTC-USDT",
         order_type=OrderType.FOK,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     
     # Add the FOK order to the book
@@ -288,7 +288,7 @@ def test_fok_order_failure():
     # Check that the FOK order was canceled
     assert updated_order.status == OrderStatus.CANCELED
     assert updated_order.filled_quantity == 0
-    assert updated_order.remaining_quantity == 1.0
+    assert updated_order.remaining_quantity == 10
     
     # Check that the FOK order is not in the book
     assert order_book.get_order(fok_order.order_id) is None
@@ -298,7 +298,7 @@ def test_fok_order_failure():
     assert updated_sell_order is not None
     assert updated_sell_order.status == OrderStatus.OPEN
     assert updated_sell_order.filled_quantity == 0
-    assert updated_sell_order.remaining_quantity == 0.5
+    assert updated_sell_order.remaining_quantity == 5
 
 
 def test_cancel_order():
@@ -310,8 +310,8 @@ def test_cancel_order():
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     order_book.add_order(buy_order)
     
@@ -329,3 +329,161 @@ def test_cancel_order():
     bbo = order_book.get_bbo()
     assert bbo.bid_price is None
     assert bbo.bid_quantity is None
+
+
+def test_cancel_preserves_time_priority():
+    """Test that canceling from the middle of a price level keeps FIFO order and level totals."""
+    order_book = OrderBook("BTC-USDT")
+    
+    # Add three limit sell orders at the same price
+    sell_orders = []
+    for quantity in (10, 20, 30):
+        sell_order = Order(
+            symbol="BTC-USDT",
+            order_type=OrderType.LIMIT,
+            side=OrderSide.SELL,
+            quantity=quantity,
+            price=50000
+        )
+        order_book.add_order(sell_order)
+        sell_orders.append(sell_order)
+    
+    # Cancel the middle order
+    order_book.cancel_order(sell_orders[1].order_id)
+    
+    # Check that the level total and queue were updated
+    price_level = order_book.asks[50000]
+    assert price_level.total_quantity == 40
+    assert [o.order_id for o in price_level] == [sell_orders[0].order_id, sell_orders[2].order_id]
+    
+    # Sweep the level with a market buy order
+    market_order = Order(
+        symbol="BTC-USDT",
+        order_type=OrderType.MARKET,
+        side=OrderSide.BUY,
+        quantity=20
+    )
+    trades, _ = order_book.add_order(market_order)
+    
+    # First order is filled first, then the third order
+    assert len(trades) == 2
+    assert trades[0].maker_order_id == sell_orders[0].order_id
+    assert trades[0].quantity == 10
+    assert trades[1].maker_order_id == sell_orders[2].order_id
+    assert trades[1].quantity == 10
+    
+    # Check that the level total tracks the partial fill
+    assert price_level.total_quantity == 20
+    assert len(price_level) == 1
+    assert order_book.get_bbo().ask_quantity == 20
+    
+    # Cancel the last order and check that the level is removed
+    order_book.cancel_order(sell_orders[2].order_id)
+    assert 50000 not in order_book.asks
+    assert order_book.get_bbo().ask_price is None
+
+
+def test_fok_respects_limit_price():
+    """Test that a FOK order only counts liquidity at its limit price or better."""
+    order_book = OrderBook("BTC-USDT")
+    
+    # Add sell orders at two price levels
+    for price in (50000, 50100):
+        order_book.add_order(Order(
+            symbol="BTC-USDT",
+            order_type=OrderType.LIMIT,
+            side=OrderSide.SELL,
+            quantity=5,
+            price=price
+        ))
+    
+    # Enough quantity rests in the book, but not at or below the limit price
+    fok_order = Order(
+        symbol="BTC-USDT",
+        order_type=OrderType.FOK,
+        side=OrderSide.BUY,
+        quantity=8,
+        price=50000
+    )
+    trades, updated_order = order_book.add_order(fok_order)
+    assert len(trades) == 0
+    assert updated_order.status == OrderStatus.CANCELED
+    
+    # With a wider limit the order fills across both levels
+    fok_order = Order(
+        symbol="BTC-USDT",
+        order_type=OrderType.FOK,
+        side=OrderSide.BUY,
+        quantity=8,
+        price=50100
+    )
+    trades, updated_order = order_book.add_order(fok_order)
+    assert [(t.price, t.quantity) for t in trades] == [(50000, 5), (50100, 3)]
+    assert updated_order.status == OrderStatus.FILLED
+    assert order_book.ask_depth.total_quantity == 2
+
+
+def test_get_quote():
+    """Test estimating the cost of a market order from the depth index."""
+    order_book = OrderBook("BTC-USDT")
+    
+    for price, quantity in ((50000, 5), (50100, 10), (50200, 10)):
+        order_book.add_order(Order(
+            symbol="BTC-USDT",
+            order_type=OrderType.LIMIT,
+            side=OrderSide.SELL,
+            quantity=quantity,
+            price=price
+        ))
+    
+    # Buying 10 takes all of the first level and half of the second
+    filled, notional, worst_price = order_book.get_quote(OrderSide.BUY, 10)
+    assert filled == 10
+    assert notional == 5 * 50000 + 5 * 50100
+    assert worst_price == 50100
+    
+    # The book is too thin for 30
+    filled, notional, worst_price = order_book.get_quote(OrderSide.BUY, 30)
+    assert filled == 25
+    assert worst_price == 50200
+    
+    # No bids to sell into
+    assert order_book.get_quote(OrderSide.SELL, 1) == (0, 0, None)
+
+
+def test_level_changes():
+    """Test that every price level change is recorded with the book's next sequence number."""
+    order_book = OrderBook("BTC-USDT")
+    
+    def order(side, quantity, price=None, order_type=OrderType.LIMIT):
+        return order_book.add_order(Order(symbol="BTC-USDT", order_type=order_type, side=side, quantity=quantity, price=price))[1]
+    
+    order(OrderSide.SELL, 5, 50100)
+    order(OrderSide.SELL, 3, 50100)
+    order(OrderSide.SELL, 4, 50200)
+    bid = order(OrderSide.BUY, 2, 49900)
+    assert order_book.get_level_changes(0) == [
+        (1, OrderSide.SELL, 50100, 5),
+        (2, OrderSide.SELL, 50100, 8),
+        (3, OrderSide.SELL, 50200, 4),
+        (4, OrderSide.BUY, 49900, 2),
+    ]
+    
+    # A sweep records one change per level it takes from
+    order(OrderSide.BUY, 10, 50200)
+    order_book.cancel_order(bid.order_id)
+    assert order_book.get_level_changes(4) == [
+        (5, OrderSide.SELL, 50100, 0),
+        (6, OrderSide.SELL, 50200, 2),
+        (7, OrderSide.BUY, 49900, 0),
+    ]
+    assert order_book.get_level_changes(7) == []
+    
+    # Snapshots are tagged with the last change they include
+    snapshot = order_book.get_order_book_snapshot(None)
+    assert snapshot.sequence == 7
+    assert snapshot.asks == [(50200, 2)] and snapshot.bids == []
+    
+    # Changes older than the history kept need a new snapshot
+    order_book.level_changes.clear()
+    assert order_book.get_level_changes(6) is None
@@ -2,6 +2,8 @@
 Tests for the persistence layer.
 """
 import os
+import time
+import sqlite3
 import pytest
 from datetime import datetime
 
@@ -9,7 +11,8 @@ from app.models.order import Order, OrderType, OrderSide, OrderStatus
 from app.models.trade import Trade
 from app.models.fee import FeeSchedule
 from app.core.matching_engine import MatchingEngine
-from app.persistence.database import Database
+from app.core.id_generator import SnowflakeIdGenerator, TIMESTAMP_SHIFT
+from app.persistence.database import Database, SCHEMA_VERSION
 from app.persistence.order_repository import OrderRepository
 from app.persistence.trade_repository import TradeRepository
 from app.persistence.fee_repository import FeeRepository
@@ -63,23 +66,67 @@ def persistence_manager(test_db_path):
     pm.close()
 
 
+def test_database_schema_version(tmp_path):
+    """Test that empty tables of the earlier text and decimal schema are recreated, and full ones refused."""
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE orders (order_id TEXT PRIMARY KEY, quantity REAL NOT NULL, timestamp TEXT NOT NULL)")
+    conn.execute("CREATE TABLE trades (trade_id TEXT PRIMARY KEY, quantity REAL NOT NULL, timestamp TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+    
+    db = Database(db_path)
+    conn = db.connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    columns = {row["name"]: row["type"] for row in conn.execute("PRAGMA table_info(orders)")}
+    assert columns["order_id"] == "INTEGER" and columns["timestamp"] == "INTEGER"
+    db.close()
+    
+    # Opening the current schema again keeps its rows
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO id_sequences (name, last_id) VALUES ('orders', 1)")
+    conn.commit()
+    conn.close()
+    db = Database(db_path)
+    assert db.connect().execute("SELECT last_id FROM id_sequences").fetchone()[0] == 1
+    db.close()
+    
+    # Rows in the earlier schema cannot be converted, so the database is refused
+    legacy_path = str(tmp_path / "legacy_with_rows.db")
+    conn = sqlite3.connect(legacy_path)
+    conn.execute("CREATE TABLE orders (order_id TEXT PRIMARY KEY, quantity REAL NOT NULL, timestamp TEXT NOT NULL)")
+    conn.execute("INSERT INTO orders VALUES ('6f1c', 0.5, '2024-01-01T00:00:00')")
+    conn.commit()
+    conn.close()
+    with pytest.raises(RuntimeError):
+        Database(legacy_path)
+    
+    # As is a database written by a newer version
+    newer_path = str(tmp_path / "newer.db")
+    conn = sqlite3.connect(newer_path)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    conn.close()
+    with pytest.raises(RuntimeError):
+        Database(newer_path)
+
+
 def test_order_repository(order_repository):
     """Test order repository operations."""
     # Create a test order
     order = Order(
-        order_id="test-order-1",
+        order_id=1001,
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     
     # Save the order
     order_repository.save_order(order)
     
     # Retrieve the order
-    retrieved_order = order_repository.get_order("test-order-1")
+    retrieved_order = order_repository.get_order(1001)
     
     # Check that the retrieved order matches the original
     assert retrieved_order is not None
@@ -93,43 +140,43 @@ def test_order_repository(order_repository):
     
     # Update the order
     order.status = OrderStatus.PARTIALLY_FILLED
-    order.filled_quantity = 0.5
-    order.remaining_quantity = 0.5
+    order.filled_quantity = 5
+    order.remaining_quantity = 5
     order_repository.save_order(order)
     
     # Retrieve the updated order
-    updated_order = order_repository.get_order("test-order-1")
+    updated_order = order_repository.get_order(1001)
     assert updated_order.status == OrderStatus.PARTIALLY_FILLED
-    assert updated_order.filled_quantity == 0.5
-    assert updated_order.remaining_quantity == 0.5
+    assert updated_order.filled_quantity == 5
+    assert updated_order.remaining_quantity == 5
     
     # Test get_orders_by_symbol
     orders = order_repository.get_orders_by_symbol("BTC-USDT")
     assert len(orders) == 1
-    assert orders[0].order_id == "test-order-1"
+    assert orders[0].order_id == 1001
     
     # Test get_open_orders_by_symbol
     open_orders = order_repository.get_open_orders_by_symbol("BTC-USDT")
     assert len(open_orders) == 1
-    assert open_orders[0].order_id == "test-order-1"
+    assert open_orders[0].order_id == 1001
     
     # Test delete_order
-    order_repository.delete_order("test-order-1")
-    assert order_repository.get_order("test-order-1") is None
+    order_repository.delete_order(1001)
+    assert order_repository.get_order(1001) is None
 
 
 def test_trade_repository(trade_repository):
     """Test trade repository operations."""
     # Create a test trade
     trade = Trade(
-        trade_id="test-trade-1",
+        trade_id=2001,
         symbol="BTC-USDT",
-        price=50000.0,
-        quantity=1.0,
-        timestamp=datetime.utcnow(),
+        price=50000,
+        quantity=10,
+        timestamp=time.time_ns(),
         aggressor_side="buy",
-        maker_order_id="maker-order-1",
-        taker_order_id="taker-order-1",
+        maker_order_id=1002,
+        taker_order_id=1003,
         maker_fee=50.0,
         taker_fee=100.0,
         maker_fee_rate=0.001,
@@ -140,7 +187,7 @@ def test_trade_repository(trade_repository):
     trade_repository.save_trade(trade)
     
     # Retrieve the trade
-    retrieved_trade = trade_repository.get_trade("test-trade-1")
+    retrieved_trade = trade_repository.get_trade(2001)
     
     # Check that the retrieved trade matches the original
     assert retrieved_trade is not None
@@ -159,7 +206,7 @@ def test_trade_repository(trade_repository):
     # Test get_trades_by_symbol
     trades = trade_repository.get_trades_by_symbol("BTC-USDT")
     assert len(trades) == 1
-    assert trades[0].trade_id == "test-trade-1"
+    assert trades[0].trade_id == 2001
 
 
 def test_fee_repository(fee_repository):
@@ -203,37 +250,38 @@ def test_persistence_manager(persistence_manager):
     engine = MatchingEngine()
     engine.persistence_manager = persistence_manager
     
-    # Set custom fee schedule
+    # Set custom fee schedule and increments
     engine.set_fee_schedule("BTC-USDT", 0.0005, 0.001)
+    engine.set_instrument("BTC-USDT", "0.5", "0.0001")
     
     # Add some orders
     buy_order = Order(
-        order_id="test-buy-order",
+        order_id=1001,
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.BUY,
-        quantity=1.0,
-        price=50000.0
+        quantity=10,
+        price=50000
     )
     engine.process_order(buy_order)
     
     sell_order = Order(
-        order_id="test-sell-order",
+        order_id=1002,
         symbol="BTC-USDT",
         order_type=OrderType.LIMIT,
         side=OrderSide.SELL,
-        quantity=0.5,
-        price=50100.0
+        quantity=5,
+        price=50100
     )
     engine.process_order(sell_order)
     
     stop_order = Order(
-        order_id="test-stop-order",
+        order_id=1003,
         symbol="BTC-USDT",
         order_type=OrderType.STOP_LOSS,
         side=OrderSide.SELL,
-        quantity=0.5,
-        stop_price=49000.0
+        quantity=5,
+        stop_price=49000
     )
     engine.process_order(stop_order)
     
@@ -249,23 +297,100 @@ def test_persistence_manager(persistence_manager):
     
     # Check that the state was loaded correctly
     assert "BTC-USDT" in new_engine.order_books
-    assert "test-buy-order" in new_engine.all_orders
-    assert "test-sell-order" in new_engine.all_orders
-    assert "test-stop-order" in new_engine.all_orders
+    assert 1001 in new_engine.all_orders
+    assert 1002 in new_engine.all_orders
+    assert 1003 in new_engine.all_orders
     
     # Check that the fee schedule was loaded correctly
     fee_schedule = new_engine.fee_model.get_fee_schedule("BTC-USDT")
     assert fee_schedule.maker_rate == 0.0005
     assert fee_schedule.taker_rate == 0.001
     
+    # Check that the increments were loaded correctly
+    instrument = new_engine.get_instrument("BTC-USDT")
+    assert str(instrument.tick_size) == "0.5"
+    assert str(instrument.lot_size) == "0.0001"
+    
     # Check that the pending trigger orders were loaded correctly
     assert "BTC-USDT" in new_engine.pending_trigger_orders
     assert len(new_engine.pending_trigger_orders["BTC-USDT"]) == 1
-    assert new_engine.pending_trigger_orders["BTC-USDT"][0].order_id == "test-stop-order"
+    assert 1003 in new_engine.pending_trigger_orders["BTC-USDT"]
     
     # Check that the order book was loaded correctly
     order_book = new_engine.order_books["BTC-USDT"]
     assert len(order_book.bids) == 1
     assert len(order_book.asks) == 1
-    assert next(iter(order_book.bids)) == 50000.0
-    assert next(iter(order_book.asks)) == 50100.0
+    assert next(iter(order_book.bids)) == 50000
+    assert next(iter(order_book.asks)) == 50100
+
+
+def test_batch_persists_filled_resting_orders(persistence_manager):
+    """Test that a batch saves its orders, trades and the resting orders it filled."""
+    engine = MatchingEngine()
+    engine.persistence_manager = persistence_manager
+    
+    engine.process_orders([
+        Order(order_id=1001, symbol="BTC-USDT", order_type=OrderType.LIMIT,
+              side=OrderSide.SELL, quantity=10, price=50000),
+        Order(order_id=1002, symbol="BTC-USDT", order_type=OrderType.MARKET,
+              side=OrderSide.BUY, quantity=4),
+    ])
+    
+    maker = persistence_manager.order_repository.get_order(1001)
+    assert maker.status == OrderStatus.PARTIALLY_FILLED
+    assert maker.remaining_quantity == 6
+    assert persistence_manager.order_repository.get_order(1002).status == OrderStatus.FILLED
+    assert len(persistence_manager.trade_repository.get_trades_by_symbol("BTC-USDT")) == 1
+
+
+def test_recent_trades_fall_back_to_history(persistence_manager):
+    """Test that trades older than the in-memory history are read from the database on request."""
+    engine = MatchingEngine(trade_history_size=2)
+    engine.persistence_manager = persistence_manager
+    
+    for i in range(4):
+        engine.process_orders([
+            Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=10, price=50000 + i),
+            Order(symbol="BTC-USDT", order_type=OrderType.MARKET, side=OrderSide.BUY, quantity=10),
+        ])
+    
+    assert len(engine.get_recent_trades("BTC-USDT", limit=10)) == 2
+    trades = engine.get_recent_trades("BTC-USDT", limit=10, include_history=True)
+    assert [trade.price for trade in trades] == [50003, 50002, 50001, 50000]
+
+
+def test_evicted_orders_are_read_from_database(persistence_manager):
+    """Test that orders evicted from memory are still found through the repository."""
+    engine = MatchingEngine(terminal_order_cache_size=1)
+    engine.persistence_manager = persistence_manager
+    
+    for order_id in (1001, 1002):
+        engine.process_order(Order(order_id=order_id, symbol="BTC-USDT", order_type=OrderType.LIMIT,
+                                   side=OrderSide.BUY, quantity=10, price=49000))
+        engine.cancel_order(order_id)
+    
+    assert 1001 not in engine.terminal_orders
+    
+    order = engine.get_order(1001)
+    assert order is not None
+    assert order.status == OrderStatus.CANCELED
+    
+    # The order is cached again after the lookup
+    assert list(engine.terminal_orders) == [1001]
+
+
+def test_id_sequence_survives_restart(persistence_manager):
+    """Test that IDs issued after a restart are greater than those issued before it."""
+    engine = MatchingEngine(id_generator=SnowflakeIdGenerator())
+    engine.persistence_manager = persistence_manager
+    
+    # Issue an ID far in the future, as if the clock had moved back since
+    engine.id_generator.advance_to(engine.id_generator.next_id() + (10 ** 6 << TIMESTAMP_SHIFT))
+    order = Order(order_id=engine.id_generator.next_id(), symbol="BTC-USDT", order_type=OrderType.LIMIT,
+                  side=OrderSide.BUY, quantity=10, price=49000)
+    engine.process_order(order)
+    persistence_manager.save_engine_state(engine)
+    
+    new_engine = MatchingEngine(id_generator=SnowflakeIdGenerator())
+    persistence_manager.load_engine_state(new_engine)
+    assert new_engine.id_generator.next_id() > order.order_id
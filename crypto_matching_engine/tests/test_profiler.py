@@ -0,0 +1,64 @@
+"""
+Tests for the sampling profiler.
+"""
+import threading
+import time
+
+import pytest
+
+from app.models.order import Order, OrderType, OrderSide
+from app.core.order_book import OrderBook
+from app.core.profiler import SamplingProfiler
+
+
+def _match_orders(stop):
+    """Keep crossing orders in a book until stopped."""
+    order_book = OrderBook("BTC-USDT")
+    while not stop.is_set():
+        order_book.add_order(Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=1, price=100))
+        order_book.add_order(Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY, quantity=1, price=100))
+
+
+def test_profiler_samples_named_threads(tmp_path):
+    """Test that only the named threads are sampled and their stacks are written in collapsed form."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_match_orders, args=(stop,), name="test-matching")
+    worker.start()
+    profiler = SamplingProfiler(output_dir=str(tmp_path))
+    try:
+        profiler.start(0.3, interval=0.001, thread_names=["test-matching"])
+        with pytest.raises(RuntimeError):
+            profiler.start(1)
+        time.sleep(0.2)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    status = profiler.status()
+    assert not status["running"]
+    assert status["samples"] > 0
+    assert status["threads"] == {"test-matching": status["samples"]}
+    assert sum(category["samples"] for category in status["categories"].values()) == status["samples"]
+    assert "matching" in status["categories"]
+
+    lines = profiler.collapsed().splitlines()
+    assert all(line.startswith("test-matching;") for line in lines)
+    assert any("OrderBook._match_order (app/core/order_book.py)" in line for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == status["samples"]
+    with open(status["output_path"]) as f:
+        assert f.read() == profiler.collapsed()
+
+
+def test_profiler_stops_after_its_duration():
+    """Test that a run ends by itself once its duration is up."""
+    profiler = SamplingProfiler()
+    profiler.start(0.05, interval=0.001)
+    deadline = time.monotonic() + 5
+    while profiler.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    status = profiler.status()
+    assert not status["running"]
+    assert status["elapsed_seconds"] >= 0.05
+    assert status["output_path"] is None
@@ -0,0 +1,90 @@
+"""
+Tests for the order flow replay tool.
+"""
+import json
+
+import pytest
+
+from app.models.order import Order, OrderType, OrderSide
+from app.core.matching_engine import MatchingEngine
+from app.persistence.persistence_manager import PersistenceManager
+from app.tools.replay import book_hash, main
+
+
+def _record_flow(tmp_path, snapshot=False):
+    """Run some orders, cancels and a triggered stop through an engine with a journal."""
+    persistence_manager = PersistenceManager(
+        str(tmp_path / "trading_app.db"),
+        journal_path=str(tmp_path / "trading_app.journal"),
+        snapshot_path=str(tmp_path / "trading_app.snapshot") if snapshot else None
+    )
+    engine = MatchingEngine()
+    engine.persistence_manager = persistence_manager
+
+    def order(side, quantity, price, order_type=OrderType.LIMIT, **fields):
+        return engine.process_order(Order(symbol="BTC-USDT", order_type=order_type, side=side,
+                                          quantity=quantity, price=price, **fields))[1]
+
+    for price in (50000, 50100, 50200):
+        order(OrderSide.SELL, 5, price)
+    bid = order(OrderSide.BUY, 3, 49900)
+    order(OrderSide.BUY, 2, None, order_type=OrderType.STOP_LOSS, stop_price=50000)
+    if snapshot:
+        engine.save_state()
+    order(OrderSide.BUY, 6, 50000, order_type=OrderType.IOC)
+    engine.cancel_order(bid.order_id)
+    order(OrderSide.BUY, 1, 49800)
+    persistence_manager.close()
+    return engine
+
+
+def _run(capsys, *args):
+    assert main(list(args)) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+def test_replay_is_repeatable_and_rebuilds_the_books(tmp_path, capsys):
+    """Test that replaying a journal twice gives identical results matching the recorded engine."""
+    engine = _record_flow(tmp_path)
+    journal_path = str(tmp_path / "trading_app.journal")
+
+    first = _run(capsys, journal_path, "--trades-out", str(tmp_path / "first.jsonl"))
+    second = _run(capsys, journal_path, "--trades-out", str(tmp_path / "second.jsonl"))
+
+    assert first["commands"] == 8 and first["cancels"] == 1
+    # The IOC fills 5 at 50000 and the triggered stop buys 2 more at 50100
+    assert first["trades"] == 2
+    assert first["book_hash"] == book_hash(engine)
+    assert (first["trade_hash"], first["book_hash"]) == (second["trade_hash"], second["book_hash"])
+    assert (tmp_path / "first.jsonl").read_bytes() == (tmp_path / "second.jsonl").read_bytes()
+
+
+def test_replay_from_snapshot(tmp_path, capsys):
+    """Test that replaying from a snapshot runs only the journal commands written after it."""
+    engine = _record_flow(tmp_path, snapshot=True)
+
+    result = _run(capsys, str(tmp_path / "trading_app.journal"), "--snapshot", str(tmp_path / "trading_app.snapshot"))
+
+    assert result["commands"] == 3
+    assert result["book_hash"] == book_hash(engine)
+
+
+def test_replay_json_lines(tmp_path, capsys):
+    """Test that hand-written JSON lines commands can be replayed."""
+    path = tmp_path / "flow.jsonl"
+    commands = [
+        {"type": "order", "order_id": 1, "symbol": "BTC-USDT", "order_type": "limit", "side": "sell",
+         "quantity": 5, "price": 50000, "timestamp": 1_700_000_000_000_000_000},
+        {"type": "order", "order_id": 2, "symbol": "BTC-USDT", "order_type": "limit", "side": "sell",
+         "quantity": 5, "price": 50000, "timestamp": 1_700_000_000_000_000_001},
+        {"type": "cancel", "order_id": 1},
+        {"type": "order", "order_id": 3, "symbol": "BTC-USDT", "order_type": "market", "side": "buy",
+         "quantity": 2, "timestamp": 1_700_000_000_000_000_002},
+    ]
+    path.write_text("\n".join(json.dumps(command) for command in commands) + "\n")
+
+    result = _run(capsys, str(path), "--trades-out", str(tmp_path / "trades.jsonl"))
+
+    assert (result["orders"], result["cancels"], result["trades"], result["resting_orders"]) == (3, 1, 1, 1)
+    trade = json.loads((tmp_path / "trades.jsonl").read_text())
+    assert (trade["maker_order_id"], trade["taker_order_id"], trade["timestamp"]) == (2, 3, 1_700_000_000_000_000_002)
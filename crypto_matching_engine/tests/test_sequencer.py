@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.matching_engine import MatchingEngine
+from app.core.sequencer import Sequencer, ShardedSequencer
+from app.models.order import Order, OrderType, OrderSide, OrderStatus
+
+
+def test_commands_run_in_arrival_order_on_one_thread():
+    """Test that submitted commands run one at a time, in order, off the event loop thread."""
+    engine = MatchingEngine()
+    sequencer = Sequencer(engine)
+    threads = []
+    engine.get_symbols = lambda: threads.append(threading.current_thread().name) or []
+
+    async def submit_all():
+        sell = Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL,
+                     quantity=10, price=50000, order_id=1)
+        buy = Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY,
+                    quantity=10, price=50000, order_id=2)
+        # Queued together: the sell rests, the cancel removes it, the buy finds nothing to match
+        return await asyncio.gather(
+            sequencer.submit("process_order", sell),
+            sequencer.submit("cancel_order", 1),
+            sequencer.submit("process_order", buy),
+            sequencer.submit("get_symbols"),
+        )
+
+    try:
+        (_, sell), canceled, (trades, buy), _ = asyncio.run(submit_all())
+    finally:
+        sequencer.stop()
+
+    assert canceled.status == OrderStatus.CANCELED
+    assert trades == [] and buy.status == OrderStatus.OPEN
+    assert threads == ["matching-sequencer"]
+
+
+def test_exceptions_reach_the_caller_and_stop_drains_the_queue():
+    """Test that engine exceptions are raised to the caller and stop runs queued commands first."""
+    engine = MatchingEngine()
+    sequencer = Sequencer(engine)
+
+    with pytest.raises(ValueError):
+        sequencer.call("set_order_book_backend", "BTC-USDT", "unknown")
+
+    futures = [sequencer._enqueue("get_or_create_order_book", (f"SYM-{i}",)) for i in range(100)]
+    sequencer.stop()
+
+    assert all(future.done() for future in futures)
+    assert len(engine.get_symbols()) == 100
+    with pytest.raises(RuntimeError):
+        sequencer.call("get_symbols")
+
+
+class _TwoShardEngine:
+    """Engine whose work calls run in the shard given as their argument, and shard 0's wait to be released."""
+    num_shards = 2
+
+    def __init__(self):
+        self.released = threading.Event()
+
+    def shard_for_call(self, method, args):
+        return args[0] if method == "work" else None
+
+    def work(self, shard):
+        if shard == 0:
+            assert self.released.wait(5)
+        return threading.current_thread().name
+
+    def release(self):
+        self.released.set()
+        return threading.current_thread().name
+
+
+def test_sharded_sequencer_runs_shards_in_parallel():
+    """Test that a call for one shard does not wait behind a slow call for another."""
+    engine = _TwoShardEngine()
+    sequencer = ShardedSequencer(engine)
+
+    async def submit_all():
+        slow = asyncio.ensure_future(sequencer.submit("work", 0))
+        fast = await sequencer.submit("work", 1)
+        assert not slow.done()
+        return fast, await sequencer.submit("release"), await slow
+
+    try:
+        threads = asyncio.run(submit_all())
+    finally:
+        sequencer.stop()
+
+    assert threads == ("matching-sequencer-1", "matching-sequencer", "matching-sequencer-0")
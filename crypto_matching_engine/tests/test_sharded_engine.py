@@ -0,0 +1,150 @@
+import pytest
+
+from app.core.id_generator import worker_id_of
+from app.core.publisher import EventBuffer
+from app.core.sequencer import ShardedSequencer
+from app.core.sharded_engine import ShardedMatchingEngine, shard_db_path
+from app.models.order import Order, OrderType, OrderSide, OrderStatus
+
+
+@pytest.fixture
+def sharded_engine():
+    engine = ShardedMatchingEngine(2, symbol_shards={"BTC-USDT": 0, "ETH-USDT": 1})
+    yield engine
+    engine.close()
+
+
+def _limit(engine, symbol, side, quantity, price):
+    return Order(symbol=symbol, order_type=OrderType.LIMIT, side=side, quantity=quantity, price=price,
+                 order_id=engine.next_order_id(symbol))
+
+
+def test_orders_are_matched_in_their_symbol_shard(sharded_engine):
+    """Test that a batch is split across shards and results come back in submission order."""
+    engine = sharded_engine
+    orders = [
+        _limit(engine, "BTC-USDT", OrderSide.SELL, 10, 50000),
+        _limit(engine, "ETH-USDT", OrderSide.SELL, 20, 3000),
+        _limit(engine, "BTC-USDT", OrderSide.BUY, 4, 50000),
+        _limit(engine, "ETH-USDT", OrderSide.BUY, 20, 3000),
+    ]
+    assert [worker_id_of(order.order_id) for order in orders] == [0, 2, 0, 2]
+
+    results = engine.process_orders(orders)
+
+    # Trade IDs use the odd worker ID after their shard's order IDs, so they never equal an order ID
+    assert [worker_id_of(trades[0].trade_id) for trades, _ in results if trades] == [1, 3]
+    assert engine.get_order(results[2][0][0].trade_id) is None
+
+    assert [updated.order_id for _, updated in results] == [order.order_id for order in orders]
+    assert len(results[2][0]) == 1 and results[2][0][0].quantity == 4
+    assert results[3][1].status == OrderStatus.FILLED
+    assert engine.get_bbo("BTC-USDT").ask_quantity == 6
+    assert engine.get_bbo("ETH-USDT").ask_price is None
+    assert sorted(engine.get_symbols()) == ["BTC-USDT", "ETH-USDT"]
+    assert engine.get_recent_trades("ETH-USDT")[0].price == 3000
+
+    # Metrics from both shards are merged
+    metrics = engine.get_metrics()
+    assert metrics.trades == {"BTC-USDT": 1, "ETH-USDT": 1}
+    assert metrics.books == {"BTC-USDT": (1, 0, 1), "ETH-USDT": (0, 0, 0)}
+
+
+def test_cancels_and_lookups_are_routed_by_order_id(sharded_engine):
+    """Test that cancels and order lookups reach the shard that issued the order ID."""
+    engine = sharded_engine
+    order = _limit(engine, "ETH-USDT", OrderSide.BUY, 5, 2900)
+    engine.process_order(order)
+
+    assert engine.get_order(order.order_id).status == OrderStatus.OPEN
+    assert engine.cancel_order(order.order_id).status == OrderStatus.CANCELED
+    assert engine.get_order(order.order_id).status == OrderStatus.CANCELED
+    assert engine.cancel_order(order.order_id) is None
+
+
+def test_shard_market_data_is_published_by_the_router(sharded_engine):
+    """Test that market data events published in the shards come back with the replies."""
+    engine = sharded_engine
+    engine.publisher = EventBuffer()
+    engine.process_orders([
+        _limit(engine, "BTC-USDT", OrderSide.SELL, 10, 50000),
+        _limit(engine, "ETH-USDT", OrderSide.SELL, 20, 3000),
+    ])
+    engine.process_order(_limit(engine, "BTC-USDT", OrderSide.BUY, 4, 50000))
+    engine.publish_snapshots(["ETH-USDT"])
+
+    events = engine.publisher.drain()
+    assert [(kind, symbol) for kind, symbol, _ in events] == [
+        ("instrument", "BTC-USDT"), ("order_book", "BTC-USDT"), ("bbo", "BTC-USDT"),
+        ("instrument", "ETH-USDT"), ("order_book", "ETH-USDT"), ("bbo", "ETH-USDT"),
+        ("trades", "BTC-USDT"), ("order_book", "BTC-USDT"), ("bbo", "BTC-USDT"),
+        ("snapshot", "ETH-USDT"),
+    ]
+    assert events[0][2] == engine.get_instrument("BTC-USDT")
+    assert events[6][2][0].quantity == 4
+    assert events[9][2][1].asks == [(3000, 20)]
+
+
+def test_shard_errors_and_configuration(sharded_engine):
+    """Test that shard exceptions reach the caller and per-shard settings are applied."""
+    engine = sharded_engine
+    engine.set_instrument("BTC-USDT", "0.5", "0.001")
+    assert str(engine.get_instrument("BTC-USDT").tick_size) == "0.5"
+
+    engine.process_order(_limit(engine, "BTC-USDT", OrderSide.BUY, 5, 100))
+    with pytest.raises(ValueError):
+        engine.set_instrument("BTC-USDT", "1", "0.001")
+
+    # Lookups of symbols without a book get the defaults and are not cached by the router
+    assert str(engine.get_instrument("JUNK-1").tick_size) == "0.01"
+    assert "JUNK-1" not in engine.instruments
+    assert "BTC-USDT" in engine.instruments
+
+    engine.set_default_fee_rates(0.002, 0.003)
+    assert engine.get_fee_schedule("ETH-USDT")["taker_rate"] == 0.003
+    assert shard_db_path("data/trading_app.db", 1) == "data/trading_app.shard1.db"
+
+
+def test_shard_state_survives_restart(tmp_path):
+    """Test that each shard saves to and reloads from its own database."""
+    db_path = str(tmp_path / "trading_app.db")
+    engine = ShardedMatchingEngine(2, symbol_shards={"BTC-USDT": 0, "ETH-USDT": 1}, db_path=db_path)
+    try:
+        order = _limit(engine, "ETH-USDT", OrderSide.SELL, 7, 3100)
+        engine.process_order(order)
+        engine.save_state()
+    finally:
+        engine.close()
+
+    restarted = ShardedMatchingEngine(2, symbol_shards={"BTC-USDT": 0, "ETH-USDT": 1}, db_path=db_path)
+    try:
+        restarted.load_state()
+        assert restarted.get_bbo("ETH-USDT").ask_quantity == 7
+        assert restarted.get_order(order.order_id).remaining_quantity == 7
+        assert restarted.next_order_id("ETH-USDT") > order.order_id
+    finally:
+        restarted.close()
+    assert (tmp_path / "trading_app.shard1.db").exists()
+
+
+def test_calls_are_sequenced_by_the_shard_they_touch(sharded_engine):
+    """Test that calls are routed to their shard's sequencer, and calls spanning shards to the shared one."""
+    engine = sharded_engine
+    btc = _limit(engine, "BTC-USDT", OrderSide.SELL, 10, 50000)
+    eth = _limit(engine, "ETH-USDT", OrderSide.SELL, 20, 3000)
+    assert engine.shard_for_call("process_order", (btc,)) == 0
+    assert engine.shard_for_call("cancel_order", (eth.order_id,)) == 1
+    assert engine.shard_for_call("get_bbo", ("ETH-USDT",)) == 1
+    assert engine.shard_for_call("process_orders", ([btc],)) == 0
+    assert engine.shard_for_call("process_orders", ([btc, eth],)) is None
+    assert engine.shard_for_call("publish_snapshots", (["ETH-USDT"],)) == 1
+    assert engine.shard_for_call("publish_snapshots", (None,)) is None
+    assert engine.shard_for_call("get_metrics", ()) is None
+
+    sequencer = ShardedSequencer(engine)
+    try:
+        assert sequencer.call("process_order", btc)[1].status == OrderStatus.OPEN
+        assert sequencer.call("process_orders", [eth])[0][1].status == OrderStatus.OPEN
+        assert sorted(sequencer.call("get_symbols")) == ["BTC-USDT", "ETH-USDT"]
+    finally:
+        sequencer.stop()
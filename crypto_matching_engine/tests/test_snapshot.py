@@ -0,0 +1,106 @@
+"""
+Tests for binary engine snapshots and journal tail replay.
+"""
+import pytest
+
+from app.models.order import Order, OrderType, OrderSide, OrderStatus
+from app.core.matching_engine import MatchingEngine
+from app.persistence.journal import read_records
+from app.persistence.persistence_manager import PersistenceManager
+from app.persistence.snapshot import load_snapshot, write_snapshot
+
+
+def _order(side, quantity, price, symbol="BTC-USDT", order_type=OrderType.LIMIT, **fields):
+    return Order(symbol=symbol, order_type=order_type, side=side, quantity=quantity, price=price, **fields)
+
+
+def _book_state(engine, symbol):
+    """Resting (order ID, remaining quantity) pairs of each level, in priority order."""
+    order_book = engine.order_books[symbol]
+    return [
+        [(price, [(order.order_id, order.remaining_quantity) for order in entry]) for price, entry in side.items()]
+        for side in (order_book.bids, order_book.asks)
+    ]
+
+
+def _persistent_engine(tmp_path):
+    persistence_manager = PersistenceManager(
+        str(tmp_path / "trading_app.db"),
+        journal_path=str(tmp_path / "trading_app.journal"),
+        snapshot_path=str(tmp_path / "trading_app.snapshot")
+    )
+    engine = MatchingEngine()
+    engine.persistence_manager = persistence_manager
+    return engine
+
+
+def test_snapshot_round_trip(tmp_path):
+    """Test that a snapshot restores books in priority order, triggers, trades, instruments and fees."""
+    path = str(tmp_path / "engine.snapshot")
+    engine = MatchingEngine()
+    engine.set_order_book_backend("ETH-USDT", "dense")
+    engine.set_instrument("ETH-USDT", "0.5", "0.001")
+    engine.set_fee_schedule("BTC-USDT", 0.0005, 0.001)
+    engine.set_default_fee_rates(0.002, 0.003)
+    for price in (50000, 50100, 50000):
+        engine.process_order(_order(OrderSide.SELL, 5, price))
+    engine.process_order(_order(OrderSide.BUY, 7, 50000))
+    engine.process_order(_order(OrderSide.BUY, 3, 49900))
+    engine.process_order(_order(OrderSide.BUY, 2, 6000, symbol="ETH-USDT"))
+    stop = engine.process_order(_order(OrderSide.SELL, 1, None, order_type=OrderType.STOP_LOSS, stop_price=49000))[1]
+
+    write_snapshot(engine, path, sequence=42)
+    restored = MatchingEngine()
+    assert load_snapshot(restored, path) == 42
+
+    for symbol in ("BTC-USDT", "ETH-USDT"):
+        assert _book_state(restored, symbol) == _book_state(engine, symbol)
+        restored_bbo, bbo = restored.get_bbo(symbol), engine.get_bbo(symbol)
+        assert (restored_bbo.bid_price, restored_bbo.bid_quantity, restored_bbo.ask_price, restored_bbo.ask_quantity) == \
+            (bbo.bid_price, bbo.bid_quantity, bbo.ask_price, bbo.ask_quantity)
+    assert type(restored.order_books["ETH-USDT"]) is type(engine.order_books["ETH-USDT"])
+    assert stop.order_id in restored.pending_trigger_orders["BTC-USDT"]
+    assert [trade.trade_id for trade in restored.all_trades] == [trade.trade_id for trade in engine.all_trades]
+    assert restored.get_instrument("ETH-USDT") == engine.get_instrument("ETH-USDT")
+    assert restored.get_fee_schedule("BTC-USDT") == engine.get_fee_schedule("BTC-USDT")
+    assert restored.fee_model.default_taker_rate == 0.003
+    assert restored.id_generator.last_id >= engine.id_generator.last_id
+
+    # A snapshot cut short is ignored
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 3)
+    assert load_snapshot(MatchingEngine(), path) is None
+
+
+def test_restart_replays_journal_tail_after_snapshot(tmp_path):
+    """Test that a restart loads the snapshot and replays the updates journaled after it."""
+    engine = _persistent_engine(tmp_path)
+    first = engine.process_order(_order(OrderSide.SELL, 10, 50000))[1]
+    second = engine.process_order(_order(OrderSide.SELL, 10, 50000))[1]
+    doomed = engine.process_order(_order(OrderSide.BUY, 5, 49000))[1]
+    stop = engine.process_order(_order(OrderSide.BUY, 4, None, order_type=OrderType.STOP_LIMIT,
+                                       stop_price=50000, limit_price=50100))[1]
+    engine.save_state()
+    assert list(read_records(str(tmp_path / "trading_app.journal"))) == []
+
+    # Updates after the snapshot: fills that trigger the stop, a cancel and a new order
+    engine.process_order(_order(OrderSide.BUY, 12, 50000))
+    engine.cancel_order(doomed.order_id)
+    engine.process_order(_order(OrderSide.BUY, 6, 48000))
+    expected_books = _book_state(engine, "BTC-USDT")
+    expected_trades = [trade.trade_id for trade in engine.all_trades]
+    last_id = engine.id_generator.last_id
+    engine.persistence_manager.close()
+
+    restarted = _persistent_engine(tmp_path)
+    try:
+        restarted.load_state()
+        assert _book_state(restarted, "BTC-USDT") == expected_books
+        assert restarted.get_order(first.order_id).status == OrderStatus.FILLED
+        assert restarted.get_order(second.order_id).remaining_quantity == 4
+        assert restarted.get_order(doomed.order_id).status == OrderStatus.CANCELED
+        assert stop.order_id not in restarted.pending_trigger_orders["BTC-USDT"]
+        assert [trade.trade_id for trade in restarted.all_trades] == expected_trades
+        assert restarted.id_generator.next_id() > last_id
+    finally:
+        restarted.persistence_manager.close()
@@ -0,0 +1,358 @@
+"""
+Tests for the WebSocket market data feeds.
+"""
+import asyncio
+import json
+from collections import deque
+
+import pytest
+from pydantic.json import pydantic_encoder
+
+from app.models.order import Order, OrderType, OrderSide
+from app.models.instrument import Instrument
+from app.models.market_data import BBO, BBOView, OrderBookUpdate, OrderBookView, OrderBookDeltaView
+from app.models.trade import Trade, TradeView
+from app.core.matching_engine import MatchingEngine
+from app.api.websocket import ConnectionManager
+
+
+class FakeWebSocket:
+    """Collects the messages sent to a client."""
+
+    def __init__(self):
+        self.messages = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.messages.append(json.loads(text))
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+
+
+class StalledWebSocket(FakeWebSocket):
+    """A client whose sends wait until it is released."""
+
+    def __init__(self):
+        super().__init__()
+        self.released = asyncio.Event()
+
+    async def send_text(self, text):
+        await self.released.wait()
+        await super().send_text(text)
+
+
+class BrokenWebSocket(FakeWebSocket):
+    """A client whose connection is gone."""
+
+    async def send_text(self, text):
+        raise ConnectionResetError("Connection reset by peer")
+
+
+def _engine():
+    """An engine with whole-unit ticks and lots, so prices in messages match the ticks."""
+    engine = MatchingEngine()
+    engine.set_instrument("BTC-USDT", 1, 1)
+    return engine
+
+
+async def _settle(seconds=0.01):
+    """Give the broadcast task time to send what the engine published."""
+    await asyncio.sleep(seconds)
+
+
+def _order(engine, side, quantity, price):
+    return engine.process_order(Order(symbol="BTC-USDT", order_type=OrderType.LIMIT, side=side,
+                                      quantity=quantity, price=price))[1]
+
+
+def test_order_book_feed_sends_snapshot_then_deltas():
+    """Test that clients get a sequenced snapshot first and then only the levels that changed, as they change."""
+    engine = _engine()
+    manager = ConnectionManager(engine)
+    _order(engine, OrderSide.SELL, 5, 101)
+    _order(engine, OrderSide.BUY, 2, 99)
+
+    async def run():
+        first = FakeWebSocket()
+        await manager.connect(first, "order_book")
+        await _settle()
+        
+        _order(engine, OrderSide.BUY, 1, 101)
+        _order(engine, OrderSide.SELL, 3, 102)
+        await _settle()
+        second = FakeWebSocket()
+        await manager.connect(second, "order_book")
+        await _settle()
+        await manager.stop_broadcasting()
+        return first.messages, second.messages
+
+    first, second = asyncio.run(run())
+
+    assert [message["type"] for message in first] == ["order_book", "order_book_delta", "order_book_delta"]
+    snapshot = first[0]["data"]
+    assert (snapshot["sequence"], snapshot["asks"], snapshot["bids"]) == (2, [[101, 5]], [[99, 2]])
+    deltas = [(m["data"]["prev_sequence"], m["data"]["sequence"], m["data"]["asks"]) for m in first[1:]]
+    assert deltas == [(2, 3, [[101, 4]]), (3, 4, [[102, 3]])]
+
+    # The later client starts from a snapshot at the same point
+    assert [message["type"] for message in second] == ["order_book"]
+    assert second[0]["data"]["sequence"] == 4
+    assert second[0]["data"]["asks"] == [[101, 4], [102, 3]]
+
+
+def test_order_book_feed_resends_snapshot_after_missed_changes():
+    """Test that clients get a new snapshot when the changes since the last publication are no longer kept."""
+    engine = _engine()
+    manager = ConnectionManager(engine)
+    _order(engine, OrderSide.SELL, 5, 101)
+
+    async def run():
+        client = FakeWebSocket()
+        await manager.connect(client, "order_book")
+        await _settle()
+        _order(engine, OrderSide.SELL, 1, 102)
+        await _settle()
+        # Keep one change, then make two in one call: take the ask at 101 and rest the rest at 101
+        engine.order_books["BTC-USDT"].level_changes = deque(maxlen=1)
+        _order(engine, OrderSide.BUY, 7, 101)
+        await _settle()
+        await manager.stop_broadcasting()
+        return client.messages
+
+    messages = asyncio.run(run())
+
+    assert [message["type"] for message in messages] == ["order_book", "order_book_delta", "order_book"]
+    assert messages[2]["data"]["sequence"] == 4
+    assert (messages[2]["data"]["asks"], messages[2]["data"]["bids"]) == ([[102, 1]], [[101, 2]])
+
+
+def test_trades_and_bbo_are_pushed_as_they_happen():
+    """Test that trades and BBO changes reach subscribers of their symbol only, and unchanged BBOs are not resent."""
+    engine = _engine()
+    engine.set_instrument("ETH-USDT", 1, 1)
+    manager = ConnectionManager(engine)
+    _order(engine, OrderSide.SELL, 5, 101)
+
+    async def run():
+        trades_client, bbo_client, other_client = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(trades_client, "trades")
+        await manager.connect(bbo_client, "bbo")
+        await manager.connect(other_client, "bbo")
+        await manager.subscribe(other_client, "ETH-USDT")
+        await _settle()
+        
+        _order(engine, OrderSide.BUY, 2, 101)
+        _order(engine, OrderSide.BUY, 1, 90)  # Below the best bid
+        _order(engine, OrderSide.BUY, 1, 90)  # Only changes the book below the best bid
+        await _settle()
+        await manager.stop_broadcasting()
+        return trades_client.messages, bbo_client.messages, other_client.messages
+
+    trades_messages, bbo_messages, other_messages = asyncio.run(run())
+
+    assert [message["type"] for message in trades_messages] == ["trades"]
+    assert [(t["price"], t["quantity"]) for t in trades_messages[0]["data"]] == [(101, 2)]
+
+    bbos = [(m["data"]["bid_price"], m["data"]["bid_quantity"], m["data"]["ask_quantity"]) for m in bbo_messages]
+    assert bbos == [(None, None, 5), (None, None, 3), (90, 1, 3), (90, 2, 3)]
+
+    # Only the subscription reply; ETH-USDT never traded
+    assert [message["type"] for message in other_messages] == ["subscription"]
+
+
+def test_instrument_changes_reach_the_feed_without_engine_calls():
+    """Test that broadcasts convert ticks with the instruments the engine publishes, not by calling it from the loop."""
+    engine = _engine()
+    manager = ConnectionManager(engine)
+    order = _order(engine, OrderSide.SELL, 5, 101)
+
+    def get_instrument(symbol):
+        raise AssertionError("get_instrument called from the event loop")
+
+    async def run():
+        client = FakeWebSocket()
+        await manager.connect(client, "bbo")
+        await _settle()
+        engine.get_instrument = get_instrument
+        
+        engine.cancel_order(order.order_id)
+        engine.set_instrument("BTC-USDT", "0.5", 1)
+        _order(engine, OrderSide.SELL, 5, 201)
+        await _settle()
+        await manager.stop_broadcasting()
+        return client.messages
+
+    messages = asyncio.run(run())
+
+    assert [message["data"]["ask_price"] for message in messages] == [101, None, 100.5]
+
+
+def test_conflated_channel_sends_latest_update_per_interval():
+    """Test that a conflated channel merges the updates of a symbol and sends them once per interval."""
+    engine = _engine()
+    manager = ConnectionManager(engine, conflation={"bbo": 0.05, "order_book": 0.05})
+    _order(engine, OrderSide.SELL, 5, 101)
+
+    async def run():
+        bbo_client, book_client = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(bbo_client, "bbo")
+        await manager.connect(book_client, "order_book")
+        await _settle()
+        for price in (95, 96, 97):
+            _order(engine, OrderSide.BUY, 1, price)
+        await _settle(0.1)
+        await manager.stop_broadcasting()
+        return bbo_client.messages, book_client.messages
+
+    bbo_messages, book_messages = asyncio.run(run())
+
+    assert [message["type"] for message in bbo_messages] == ["bbo", "bbo"]
+    assert bbo_messages[1]["data"]["bid_price"] == 97
+    assert [message["type"] for message in book_messages] == ["order_book", "order_book_delta"]
+    delta = book_messages[1]["data"]
+    assert (delta["prev_sequence"], delta["sequence"]) == (1, 4)
+    assert delta["bids"] == [[95, 1], [96, 1], [97, 1]]
+
+
+def test_unknown_conflation_channel_is_rejected():
+    """Test that conflation settings must name a channel."""
+    with pytest.raises(ValueError):
+        ConnectionManager(_engine(), conflation={"quotes": 0.1})
+
+
+def test_each_update_is_encoded_once_for_all_clients():
+    """Test that every client of a channel gets the same text, serialized once per update."""
+    engine = _engine()
+    manager = ConnectionManager(engine)
+    _order(engine, OrderSide.SELL, 5, 101)
+
+    async def run():
+        clients = [FakeWebSocket() for _ in range(3)]
+        for client in clients:
+            await manager.connect(client, "trades")
+        _order(engine, OrderSide.BUY, 2, 101)
+        _order(engine, OrderSide.BUY, 1, 101)
+        await _settle()
+        await manager.stop_broadcasting()
+        return clients
+
+    clients = asyncio.run(run())
+
+    assert manager.messages_encoded["trades"] == 2
+    assert manager.messages_sent["trades"] == 6
+    assert all(client.messages == clients[0].messages for client in clients)
+
+
+def test_json_fields_match_the_api_views():
+    """Test that messages built without pydantic have the same JSON as the views."""
+    instrument = Instrument(symbol="BTC-USDT", tick_size="0.01", lot_size="0.001")
+    bbo = BBO(symbol="BTC-USDT", bid_price=5000000, bid_quantity=1500, timestamp=1_700_000_000_123_456_789)
+    update = OrderBookUpdate(symbol="BTC-USDT", sequence=7, asks=[(5000100, 2000)], bids=[(5000000, 1500)],
+                             timestamp=1_700_000_000_000_000_000)
+    trade = Trade(symbol="BTC-USDT", price=5000000, quantity=250, aggressor_side=OrderSide.BUY,
+                  maker_order_id=11, taker_order_id=12, trade_id=13, timestamp=1_700_000_000_000_001_000,
+                  maker_fee=0.125, taker_fee=0, maker_fee_rate=0.001, taker_fee_rate=0.002)
+    changes = [(8, OrderSide.SELL, 5000100, 1000), (9, OrderSide.BUY, 4999900, 300), (10, OrderSide.SELL, 5000100, 0)]
+
+    def view_json(view):
+        return json.loads(json.dumps(view.dict(), default=pydantic_encoder))
+
+    assert BBOView.json_from_bbo(bbo, instrument) == view_json(BBOView.from_bbo(bbo, instrument))
+    assert json.loads(json.dumps(OrderBookView.json_from_update(update, instrument))) == \
+        view_json(OrderBookView.from_update(update, instrument))
+    assert TradeView.json_from_trade(trade, instrument) == view_json(TradeView.from_trade(trade, instrument))
+
+    delta = json.loads(json.dumps(OrderBookDeltaView.json_from_changes("BTC-USDT", 7, changes, instrument)))
+    expected = view_json(OrderBookDeltaView.from_changes("BTC-USDT", 7, changes, instrument))
+    assert delta.pop("timestamp") and expected.pop("timestamp")
+    assert delta == expected
+
+
+def test_stalled_client_does_not_delay_others_and_gets_latest_bbo():
+    """Test that a stalled client's full queue keeps only the latest BBO while other clients get every update."""
+    engine = _engine()
+    manager = ConnectionManager(engine, max_queue=2)
+    _order(engine, OrderSide.SELL, 5, 101)
+
+    async def run():
+        stalled, fast = StalledWebSocket(), FakeWebSocket()
+        await manager.connect(stalled, "bbo")
+        await manager.connect(fast, "bbo")
+        await _settle()
+        for price in (95, 96, 97, 98):
+            _order(engine, OrderSide.BUY, 1, price)
+            await _settle()
+        fast_count = len(fast.messages)
+        stalled.released.set()
+        await _settle()
+        await manager.stop_broadcasting()
+        return stalled.messages, fast_count
+
+    stalled_messages, fast_count = asyncio.run(run())
+
+    assert fast_count == 5
+    # The snapshot was being sent; of the four updates, 95 and 96 were queued and 97 then 98 replaced 96
+    assert [message["data"]["bid_price"] for message in stalled_messages] == [None, 95, 98]
+    assert manager.messages_dropped["bbo"] == 0
+
+
+def test_slow_order_book_client_resyncs_from_snapshot():
+    """Test that an order book client that overflows drops its queued deltas and catches up from a snapshot."""
+    engine = _engine()
+    manager = ConnectionManager(engine, max_queue=1)
+    _order(engine, OrderSide.SELL, 5, 101)
+
+    async def run():
+        client = StalledWebSocket()
+        await manager.connect(client, "order_book")
+        await _settle()
+        for price in (102, 103, 104):
+            _order(engine, OrderSide.SELL, 1, price)
+        await _settle()
+        client.released.set()
+        await _settle()
+        await manager.stop_broadcasting()
+        return client.messages
+
+    messages = asyncio.run(run())
+
+    assert [message["type"] for message in messages] == ["order_book", "order_book"]
+    assert messages[1]["data"]["sequence"] == 4
+    assert messages[1]["data"]["asks"] == [[101, 5], [102, 1], [103, 1], [104, 1]]
+    assert manager.messages_dropped["order_book"] == 1
+
+
+def test_slow_and_broken_clients_are_dropped():
+    """Test that overflowing trades clients, clients full for too long and failed sends are disconnected at once."""
+    # The bbo client's queue holds one symbol's BBO, so the other symbol's updates overflow it
+    engine = _engine()
+    engine.set_instrument("ETH-USDT", 1, 1)
+    manager = ConnectionManager(engine, max_queue=1, slow_client_timeout=0)
+    _order(engine, OrderSide.SELL, 100, 101)
+    engine.process_order(Order(symbol="ETH-USDT", order_type=OrderType.LIMIT, side=OrderSide.SELL, quantity=100, price=51))
+
+    async def run():
+        trades_client, bbo_client, broken = StalledWebSocket(), StalledWebSocket(), BrokenWebSocket()
+        await manager.connect(broken, "order_book")
+        await _settle()
+        await manager.connect(trades_client, "trades")
+        await manager.connect(bbo_client, "bbo")
+        await _settle()
+        for _ in range(3):
+            _order(engine, OrderSide.BUY, 1, 101)
+            engine.process_order(Order(symbol="ETH-USDT", order_type=OrderType.LIMIT, side=OrderSide.BUY,
+                                       quantity=1, price=51))
+        await _settle()
+        return trades_client, bbo_client, broken
+
+    trades_client, bbo_client, broken = asyncio.run(run())
+
+    assert manager.clients_dropped == {"queue_full": 1, "slow": 1, "send_failed": 1}
+    for client in (trades_client, bbo_client, broken):
+        assert not any(client in connections for connections in manager.active_connections.values())
+        assert client not in manager.symbol_subscriptions and client not in manager.clients
+    assert (trades_client.closed, bbo_client.closed) == (1008, 1008)